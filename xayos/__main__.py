@@ -1,3 +1,5 @@
+# Imported first, so that the startup profile times the other imports
+from . import startup
 from .main import main
 
 if __name__ == "__main__":
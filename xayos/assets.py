@@ -0,0 +1,110 @@
+"""
+Packaged resources.
+
+Fonts, images and data files are read through importlib.resources, so that they are
+found both in the source tree and in the single-file archive built by xayos.build.
+Large files are memory-mapped: the file itself in the source tree, or its bytes in
+the archive, where the build stores resources uncompressed. Files written by the
+shell (saved texts, profiles) go to an output directory next to the package, or
+next to the archive.
+"""
+
+import logging
+import mmap
+import os
+import struct
+from importlib.resources import as_file, files
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+# Local file header of a zip member, followed by its name and extra field
+ZIP_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+
+def resource(*parts):
+    return files(__package__).joinpath(*parts)
+
+
+def exists(*parts):
+    return resource(*parts).is_file()
+
+
+def read_bytes(*parts):
+    return resource(*parts).read_bytes()
+
+
+def path(*parts):
+    """
+    Context manager giving a file system path of a resource, for APIs that only
+    open files by name. Resources in an archive are extracted to a temporary file.
+    """
+    return as_file(resource(*parts))
+
+
+def list_files(directory, suffix):
+    """
+    Names of the files of a resource directory with the given suffix, without it.
+    """
+    return sorted(
+        entry.name[: -len(suffix)]
+        for entry in resource(directory).iterdir()
+        if entry.name.endswith(suffix)
+    )
+
+
+def map_file(path, offset=0, length=0):
+    """
+    Private, writable mapping of part of a file (all of it by default).
+    """
+    # Mappings start on a page boundary
+    start = offset - offset % mmap.ALLOCATIONGRANULARITY
+    with open(path, "rb") as f:
+        size = length + offset - start if length else 0
+        data = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_COPY, offset=start)
+    if start == offset and not length:
+        return data
+    return memoryview(data)[offset - start : offset - start + (length or len(data))]
+
+
+def map_resource(*parts):
+    """
+    Writable buffer of a resource, mapped in memory if possible, read otherwise.
+    """
+    entry = resource(*parts)
+    if isinstance(entry, Path):
+        return map_file(entry)
+    archive = getattr(entry, "root", None)
+    if archive is not None:
+        info = archive.getinfo(entry.at)
+        if info.compress_type == 0:
+            with open(archive.filename, "rb") as f:
+                f.seek(info.header_offset)
+                header = ZIP_LOCAL_HEADER.unpack(f.read(ZIP_LOCAL_HEADER.size))
+            name_length, extra_length = header[-2:]
+            offset = (
+                info.header_offset + ZIP_LOCAL_HEADER.size + name_length + extra_length
+            )
+            return map_file(archive.filename, offset, info.file_size)
+    log.debug("Resource %s is not mappable, reading it", "/".join(parts))
+    return bytearray(entry.read_bytes())
+
+
+def output_path(*parts):
+    """
+    Writable path for files saved by the shell.
+    """
+    here = Path(__file__).parent
+    # In an archive, the package directory is the archive itself
+    archive = getattr(__loader__, "archive", None)
+    base = Path(archive).parent if archive and not here.is_dir() else here
+    return base.joinpath("out", *parts)
+
+
+def cache_path(*parts):
+    """
+    Path in the cache directory of the user, for the profiles and traces that the
+    shell writes for itself.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base).joinpath("xayos", *parts)
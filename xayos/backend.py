@@ -0,0 +1,135 @@
+import logging
+import time
+
+import sdl2
+import sdl2.ext
+
+from . import colors
+from .commands import CommandBuffer
+from .compositor import Compositor
+from .textures import TextureCache
+
+log = logging.getLogger(__name__)
+
+# Name of the OpenGL 3.3 core backend for the --backend option, any other name is
+# passed on to SDL as a render driver (e.g. 'opengl', 'software')
+GL_BACKEND = "gl33"
+
+
+class SDLBackend:
+    """
+    Draws the frame command buffer through an SDL renderer and SDL_gfx.
+    """
+
+    name = "sdl"
+
+    def __init__(
+        self,
+        window,
+        font_loader,
+        logical_size,
+        renderer_backend=-1,
+        renderer_flags=0,
+        compositor=True,
+        textures=None,
+    ):
+        self.renderer = sdl2.ext.Renderer(
+            window, backend=renderer_backend, flags=renderer_flags
+        )
+        self.textures = textures if textures is not None else TextureCache()
+        self.commands = CommandBuffer(font_loader, logical_size, self.textures)
+        sdl2.SDL_RenderSetLogicalSize(self.renderer.sdlrenderer, *logical_size)
+        info = sdl2.render.SDL_RendererInfo()
+        sdl2.SDL_GetRendererInfo(self.renderer.sdlrenderer, info)
+        log.info(f"Renderer: {info.name.decode()}")
+        # Redraw only the damaged parts of the frame, if render targets are supported
+        self.compositor = None
+        # When the last frame was drawn, before presenting it (which may wait for
+        # vsync), as perf_counter_ns()
+        self.drawn_ns = 0
+        if compositor and info.flags & sdl2.SDL_RENDERER_TARGETTEXTURE:
+            self.compositor = Compositor(self.renderer, logical_size)
+        elif compositor:
+            log.warning("Render targets not supported, redrawing every frame")
+
+    def begin_frame(self):
+        self.commands.reset()
+        self.commands.clear(colors.BLACK)
+
+    def draw_starfield(self, starfield):
+        starfield.draw(self.commands)
+
+    def draw_text_line(self, text_line):
+        text_line.render(self.commands)
+
+    def release_owner(self, owner):
+        self.commands.release_owner(owner)
+
+    def present(self):
+        """
+        Draw and present the frame. Returns False if it was skipped, unchanged.
+        """
+        if self.compositor:
+            if not self.compositor.compose(self.commands):
+                return False
+        else:
+            self.commands.execute(self.renderer)
+        self.drawn_ns = time.perf_counter_ns()
+        self.renderer.present()
+        return True
+
+    def invalidate(self):
+        if self.compositor:
+            self.compositor.invalidate()
+
+    def set_render_scale(self, scale):
+        """
+        Draw frames at a fraction of the logical size, scaled up to the window.
+        Only frames composited in a render target can be scaled.
+        """
+        if self.compositor:
+            self.compositor.set_scale(scale)
+
+    def destroy(self):
+        if self.compositor:
+            log.info(f"Compositor: {self.compositor.summary()}")
+            self.compositor.destroy()
+        log.info(f"Texture cache: {self.textures.summary()}")
+        self.textures.clear()
+        self.renderer.destroy()
+
+
+def create_backend(
+    window,
+    font_loader,
+    logical_size,
+    renderer_backend=-1,
+    renderer_flags=0,
+    vsync=False,
+    compositor=True,
+    texture_budget=32 << 20,
+    texture_cap=None,
+):
+    if renderer_backend == GL_BACKEND:
+        try:
+            from .glbackend import GLBackend
+
+            return GLBackend(
+                window,
+                font_loader,
+                logical_size,
+                vsync=vsync,
+                textures=TextureCache(texture_budget, texture_cap),
+            )
+        except Exception:
+            log.exception("OpenGL 3.3 backend not available, using the SDL renderer")
+        renderer_backend = -1
+    return SDLBackend(
+        window,
+        font_loader,
+        logical_size,
+        renderer_backend,
+        renderer_flags,
+        compositor,
+        TextureCache(texture_budget, texture_cap),
+    )
@@ -0,0 +1,116 @@
+"""
+Single-file distribution.
+
+Builds a zipapp of the shell, with the bytecode of its modules compiled ahead of
+time and all of its resources, so that starting it opens one archive instead of
+looking up dozens of modules and data files:
+
+    python -m xayos.build -o dist/xayos.pyz
+    python dist/xayos.pyz
+
+Everything is stored uncompressed, so that modules load without inflating them and
+resources are memory-mapped from the archive (see xayos.assets). Dependencies
+(pysdl2, PyOpenGL, numpy...) are not bundled, they are shared libraries that have
+to be installed.
+"""
+
+import argparse
+import py_compile
+import shutil
+import sys
+import tempfile
+import zipapp
+from pathlib import Path
+
+HERE = Path(__file__).parent
+PACKAGE = HERE.name
+DIST_PATH = HERE.parent / "dist" / f"{PACKAGE}.pyz"
+
+# Generated files and the output of the shell are left out
+EXCLUDED = {"__pycache__", "out"}
+EXCLUDED_SUFFIXES = {".pyc", ".pyo"}
+
+MAIN = f"""\
+# Imported first, so that the startup profile times the other imports
+from {PACKAGE} import startup
+from {PACKAGE}.main import main
+
+main()
+"""
+
+
+def package_files(package_path=HERE):
+    for path in sorted(package_path.rglob("*")):
+        relative = path.relative_to(package_path)
+        if EXCLUDED.intersection(relative.parts) or path.suffix in EXCLUDED_SUFFIXES:
+            continue
+        if path.is_file():
+            yield path, relative
+
+
+def stage(staging_path, optimize=-1):
+    """
+    Copy the resources of the package, and the bytecode of its modules instead of
+    their source, to a directory laid out as the archive. Returns the number of
+    modules and resources.
+    """
+    modules = resources = 0
+    target = staging_path / PACKAGE
+    for path, relative in package_files():
+        output = target / relative
+        output.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == ".py":
+            # Unchecked hash-based bytecode is loaded without its source
+            py_compile.compile(
+                str(path),
+                cfile=str(output.with_suffix(".pyc")),
+                dfile=f"{PACKAGE}/{relative.as_posix()}",
+                doraise=True,
+                optimize=optimize,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+            )
+            modules += 1
+        else:
+            shutil.copyfile(path, output)
+            resources += 1
+    (staging_path / "__main__.py").write_text(MAIN)
+    return modules, resources
+
+
+def build(output=DIST_PATH, interpreter="/usr/bin/env python3", optimize=-1):
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory() as staging:
+        modules, resources = stage(Path(staging), optimize)
+        zipapp.create_archive(staging, output, interpreter=interpreter)
+    return modules, resources
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a single-file zipapp")
+    parser.add_argument("-o", "--output", type=Path, default=DIST_PATH)
+    parser.add_argument(
+        "-p",
+        "--python",
+        default="/usr/bin/env python3",
+        help="Interpreter of the shebang line, which must be the one it is built with",
+    )
+    parser.add_argument(
+        "-O",
+        "--optimize",
+        type=int,
+        choices=(-1, 0, 1, 2),
+        default=-1,
+        help="Bytecode optimization level (2 strips asserts and docstrings)",
+    )
+    args = parser.parse_args()
+    modules, resources = build(args.output, args.python, args.optimize)
+    size = args.output.stat().st_size / 1024
+    print(
+        f"Built {args.output}: {modules} modules, {resources} resources, {size:.0f} KiB",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
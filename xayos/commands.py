@@ -0,0 +1,473 @@
+"""
+Frame command buffer.
+
+Widgets record their draw calls here instead of calling SDL and SDL_gfx right
+away. At the end of the frame the commands are sorted and executed in batches:
+offscreen targets (widget surfaces) first, then the screen, layer by layer. Within
+a layer commands are grouped by kind and state (font, color, texture), so that
+fonts are set once, points and lines of the same color go out together and each
+texture is drawn in one go. Sprites, cells of a texture atlas each tinted with a
+color, are drawn as textured quads, with a single call per batch.
+
+Textures of copies are kept in a texture cache between frames. Those of widget
+surfaces belong to the application that recorded them (the owner of the buffer at
+that time), are pinned until it is unloaded and only updated in place when the
+surface is redrawn.
+
+Commands of the same layer must not depend on each other's drawing order, except
+for their kind: clears, then surface blits, then shapes, then text and copies. A
+widget that has to cover what was drawn before it opens a new layer.
+"""
+
+import ctypes
+import itertools
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+import sdl2
+from sdl2 import sdlgfx
+
+from .textures import TextureCache
+
+log = logging.getLogger(__name__)
+
+# Kinds of command, in execution order within a layer
+KIND_CLEAR = 0
+KIND_BLIT = 1
+KIND_SHAPE = 2
+KIND_TEXT = 3
+
+# Operations, which also separate the state keys of commands of the same kind
+OP_CLEAR = 0
+OP_BLIT = 1
+OP_POINTS = 2
+OP_LINE = 3
+OP_RECT = 4
+OP_BOX = 5
+OP_TEXT = 6
+OP_COPY = 7
+OP_COPY_SURFACE = 8
+OP_SPRITES = 9
+
+# Target index of the screen, executed after all offscreen targets
+SCREEN = 1 << 16
+
+# Vertices of SDL_RenderGeometry (SDL_Vertex)
+SDL_VERTEX = np.dtype(
+    [("position", np.float32, 2), ("color", np.uint8, 4), ("tex_coord", np.float32, 2)]
+)
+# Corners of a quad, as (x, y), and its two triangles, which share the diagonal from
+# the top left corner: the software renderer copies such pairs as rectangles, rather
+# than sampling their texture off by a fraction of a texel
+QUAD_CORNERS = np.array([(0, 0), (1, 0), (0, 1), (1, 1)], np.float32)
+QUAD_INDICES = np.array([0, 1, 3, 0, 3, 2], np.int32)
+
+
+def rgba(color):
+    if len(color) == 3:
+        return (*color, 255)
+    return tuple(color)
+
+
+def rect_from_corners(x1, y1, x2, y2):
+    return (min(x1, x2), min(y1, y2), abs(x2 - x1) + 1, abs(y2 - y1) + 1)
+
+
+def rects_intersect(a, b):
+    return (
+        a[0] < b[0] + b[2]
+        and b[0] < a[0] + a[2]
+        and a[1] < b[1] + b[3]
+        and b[1] < a[1] + a[3]
+    )
+
+
+def surface_address(surface):
+    if isinstance(surface, sdl2.SDL_Surface):
+        return ctypes.addressof(surface)
+    return ctypes.addressof(surface.contents)
+
+
+def batch_key(command):
+    return command[:4]
+
+
+def source_batch_key(command):
+    return command[:4] + command[6:]
+
+
+def draw_sprites(sdlrenderer, texture, size, sprites):
+    """
+    Draw sprites of a texture atlas, all of the given size, as textured quads in a
+    single call. Each sprite is (atlas x, atlas y, x, y, r, g, b, a).
+    """
+    width, height = ctypes.c_int(), ctypes.c_int()
+    sdl2.SDL_QueryTexture(texture, None, None, width, height)
+    sprites = np.asarray(sprites, np.float32)
+    count = len(sprites)
+    corners = QUAD_CORNERS * size
+    vertices = np.empty((count, 4), SDL_VERTEX)
+    vertices["position"] = sprites[:, None, 2:4] + corners
+    vertices["tex_coord"] = sprites[:, None, 0:2] + corners
+    vertices["tex_coord"] /= (width.value, height.value)
+    vertices["color"] = sprites[:, None, 4:8]
+    indices = np.arange(0, count * 4, 4, dtype=np.int32)[:, None] + QUAD_INDICES
+    sdl2.SDL_RenderGeometry(
+        sdlrenderer,
+        texture,
+        vertices.ctypes.data_as(ctypes.POINTER(sdl2.SDL_Vertex)),
+        count * 4,
+        indices.ctypes.data_as(ctypes.POINTER(ctypes.c_int)),
+        count * 6,
+    )
+    # The software renderer tints its copies with the color mod of the texture
+    sdl2.SDL_SetTextureColorMod(texture, 255, 255, 255)
+    sdl2.SDL_SetTextureAlphaMod(texture, 255)
+
+
+def create_surface_texture(sdlrenderer, surface):
+    """
+    Texture in the pixel format of a surface, so that it can be updated from it.
+    """
+    texture = sdl2.SDL_CreateTexture(
+        sdlrenderer,
+        surface.contents.format.contents.format,
+        sdl2.SDL_TEXTUREACCESS_STATIC,
+        surface.contents.w,
+        surface.contents.h,
+    )
+    sdl2.SDL_SetTextureBlendMode(texture, sdl2.SDL_BLENDMODE_BLEND)
+    update_surface_texture(texture, surface)
+    return texture
+
+
+def update_surface_texture(texture, surface):
+    sdl2.SDL_UpdateTexture(texture, None, surface.contents.pixels, surface.contents.pitch)
+
+
+class CommandBuffer:
+    def __init__(self, font_loader, logical_size, textures=None):
+        self.font_loader = font_loader
+        self.logical_size = logical_size
+        self.textures = textures if textures is not None else TextureCache()
+        # Application the recorded textures belong to, None for the shell
+        self.owner = None
+        # Widget or application drawing, for the draw call statistics
+        self.source = None
+        self.instrumentation = None
+        self.commands = []
+        self.layer = 0
+        self.target = SCREEN
+        # Offscreen renderers, in order of first use in this frame
+        self.targets = []
+        self.target_indexes = {}
+        # Times each widget surface was redrawn, by address, and the version each
+        # of their textures was last updated with, by cache key
+        self.surface_versions = Counter()
+        self.texture_versions = {}
+        # Statistics of the last execution
+        self.executed = 0
+        self.batches = 0
+
+    def reset(self):
+        self.commands.clear()
+        self.layer = 0
+        self.target = SCREEN
+        self.targets.clear()
+        self.target_indexes.clear()
+
+    def release_owner(self, owner):
+        """
+        Destroy the textures of an owner, and forget the versions of the surfaces
+        that no longer have one.
+        """
+        self.textures.release_owner(owner)
+        entries = self.textures.entries
+        self.texture_versions = {
+            key: version
+            for key, version in self.texture_versions.items()
+            if key in entries
+        }
+        addresses = {key[1] for key in self.texture_versions}
+        for address in set(self.surface_versions) - addresses:
+            del self.surface_versions[address]
+
+    def next_layer(self):
+        self.layer += 1
+
+    @contextmanager
+    def drawing(self, source, owner=None):
+        """
+        Record the commands of the block on behalf of a source (a widget or an
+        application), whose textures belong to owner.
+        """
+        previous = self.source, self.owner
+        self.source, self.owner = source, owner
+        try:
+            yield self
+        finally:
+            self.source, self.owner = previous
+
+    @contextmanager
+    def offscreen(self, renderer):
+        """
+        Record the commands of the block into an offscreen renderer (a widget
+        surface), which is drawn before anything on the screen.
+        """
+        index = self.target_indexes.get(id(renderer))
+        if index is None:
+            index = self.target_indexes[id(renderer)] = len(self.targets)
+            self.targets.append(renderer)
+        previous, self.target = self.target, index
+        try:
+            yield self
+        finally:
+            self.target = previous
+
+    def record(self, kind, state, args):
+        self.commands.append(
+            (self.target, self.layer, kind, state, len(self.commands), args, self.source)
+        )
+
+    def clear(self, color):
+        self.record(KIND_CLEAR, (OP_CLEAR, rgba(color)), None)
+
+    def blit_surface(self, source, surface):
+        self.record(KIND_BLIT, (OP_BLIT,), (source, surface))
+
+    def draw_point(self, points, color=(255, 255, 255)):
+        self.record(KIND_SHAPE, (OP_POINTS, rgba(color)), points)
+
+    def draw_line(self, line, color):
+        self.record(KIND_SHAPE, (OP_LINE, rgba(color)), line)
+
+    def draw_rect(self, rect, color):
+        self.record(KIND_SHAPE, (OP_RECT, rgba(color)), rect)
+
+    def box(self, x1, y1, x2, y2, color):
+        self.record(KIND_SHAPE, (OP_BOX, rgba(color)), (x1, y1, x2, y2))
+
+    def text(self, font_name, x, y, text, color):
+        """
+        Draw a bytes string in an SDL_gfx font, or a Unicode string through the
+        font loader.
+        """
+        self.record(KIND_TEXT, (OP_TEXT, font_name, rgba(color)), (x, y, text))
+
+    def copy(self, source, rect):
+        """
+        Copy the texture of a source to a rectangle. The source provides a
+        content_key() for the texture cache and create_texture(sdlrenderer), so
+        that it can be replayed on any renderer.
+        """
+        self.record(KIND_TEXT, (OP_COPY, id(source)), (source, rect, self.owner))
+
+    def discard(self, content_key):
+        """
+        Destroy the textures of a copy source content that is no longer drawn, on
+        every renderer.
+        """
+        keys = [key for key in self.textures.entries if key[1:] == (content_key,)]
+        for key in keys:
+            self.textures.remove(key)
+
+    def copy_surface(self, surface, rect):
+        address = ctypes.addressof(surface.contents)
+        self.record(KIND_TEXT, (OP_COPY_SURFACE, address), (surface, rect, self.owner))
+
+    def copy_sprites(self, source, size, sprites):
+        """
+        Copy square cells of size pixels of the texture of a source (see copy), each
+        tinted with a color: sprites are (atlas x, atlas y, x, y, r, g, b, a).
+        """
+        if sprites:
+            state = (OP_SPRITES, id(source), size)
+            self.record(KIND_TEXT, state, (source, sprites, self.owner))
+
+    def execute(self, renderer):
+        """
+        Execute the recorded commands, with the screen commands drawn on renderer.
+        The buffer is kept, so it can be executed again on another renderer.
+        """
+        self.sort()
+        self.execute_offscreen()
+        self.execute_screen(renderer)
+
+    def sort(self):
+        self.commands.sort(key=lambda command: command[:5])
+        self.executed = 0
+        self.batches = 0
+
+    def offscreen_commands(self):
+        return [command for command in self.commands if command[0] != SCREEN]
+
+    def screen_commands(self):
+        return [command for command in self.commands if command[0] == SCREEN]
+
+    def execute_offscreen(self, targets=None):
+        """
+        Execute the commands of the offscreen targets, or only of the given target
+        indexes. Expects the buffer to be sorted.
+        """
+        for target, commands in itertools.groupby(
+            self.offscreen_commands(), key=lambda command: command[0]
+        ):
+            if targets is None or target in targets:
+                renderer = self.targets[target]
+                self.execute_commands(renderer, commands)
+                sdl2.SDL_RenderFlush(renderer.sdlrenderer)
+                self.surface_versions[surface_address(renderer.rendertarget)] += 1
+
+    def execute_screen(self, renderer, clip=None):
+        """
+        Execute the screen commands. With a clip rectangle, set on the renderer by
+        the caller, only the commands that intersect it are executed. Expects the
+        buffer to be sorted.
+        """
+        commands = self.screen_commands()
+        if clip:
+            commands = [
+                command
+                for command in commands
+                if rects_intersect(self.bounds(command), clip)
+            ]
+        self.execute_commands(renderer, commands, clip)
+
+    def execute_commands(self, renderer, commands, clip=None):
+        instrumentation = self.instrumentation
+        if instrumentation:
+            # Batches are split by source, to which their draw calls are counted
+            renderer = instrumentation.wrap(renderer)
+            key = source_batch_key
+        else:
+            key = batch_key
+        for batch, group in itertools.groupby(commands, key=key):
+            if instrumentation:
+                instrumentation.stats.source = batch[4]
+            args = [command[5] for command in group]
+            self.execute_batch(renderer, batch[3], args, clip)
+            self.executed += len(args)
+            self.batches += 1
+        if instrumentation:
+            instrumentation.stats.source = None
+
+    def bounds(self, command):
+        """
+        Rectangle (x, y, w, h) of the screen that a command draws to.
+        """
+        state, args = command[3], command[5]
+        op = state[0]
+        if op == OP_POINTS:
+            xs = [point[0] for point in args]
+            ys = [point[1] for point in args]
+            if not xs:
+                return (0, 0, 0, 0)
+            return rect_from_corners(min(xs), min(ys), max(xs), max(ys))
+        elif op in (OP_LINE, OP_BOX):
+            return rect_from_corners(*args)
+        elif op == OP_RECT:
+            return tuple(args)
+        elif op == OP_TEXT:
+            x, y, text = args
+            font_name = state[1]
+            if font_name not in self.font_loader.font_data:
+                self.font_loader.load_font(font_name)
+            width, height = self.font_loader.get_font_size(font_name)
+            return (x, y, width * len(text), height)
+        elif op in (OP_COPY, OP_COPY_SURFACE):
+            return tuple(args[1])
+        elif op == OP_SPRITES:
+            size = state[2]
+            xs = [sprite[2] for sprite in args[1]]
+            ys = [sprite[3] for sprite in args[1]]
+            return rect_from_corners(
+                min(xs), min(ys), max(xs) + size - 1, max(ys) + size - 1
+            )
+        # Clears and blits cover the whole target
+        return (0, 0, *self.logical_size)
+
+    def execute_batch(self, renderer, state, args, clip=None):
+        op = state[0]
+        sdlrenderer = renderer.sdlrenderer
+        if op == OP_CLEAR:
+            if clip:
+                # SDL_RenderClear ignores the clip rectangle
+                sdl2.SDL_SetRenderDrawBlendMode(sdlrenderer, sdl2.SDL_BLENDMODE_NONE)
+                sdl2.SDL_SetRenderDrawColor(sdlrenderer, *state[1])
+                sdl2.SDL_RenderFillRect(sdlrenderer, sdl2.SDL_Rect(*clip))
+            else:
+                renderer.clear(state[1])
+        elif op == OP_BLIT:
+            for source, surface in args:
+                sdl2.SDL_BlitSurface(source, None, surface, None)
+        elif op == OP_POINTS:
+            renderer.draw_point([point for points in args for point in points], state[1])
+        elif op == OP_LINE:
+            sdl2.SDL_SetRenderDrawColor(sdlrenderer, *state[1])
+            for x1, y1, x2, y2 in args:
+                sdl2.SDL_RenderDrawLine(sdlrenderer, x1, y1, x2, y2)
+        elif op == OP_RECT:
+            renderer.draw_rect(args, state[1])
+        elif op == OP_BOX:
+            for x1, y1, x2, y2 in args:
+                sdlgfx.boxRGBA(sdlrenderer, x1, y1, x2, y2, *state[1])
+        elif op == OP_TEXT:
+            _, font_name, color = state
+            # Unicode strings may switch glyph pages, draw them all in one go
+            texts = [item for item in args if isinstance(item[2], str)]
+            if texts:
+                self.font_loader.draw_texts(sdlrenderer, font_name, texts, color)
+            font_set = False
+            for x, y, text in args:
+                if isinstance(text, str):
+                    continue
+                if not font_set:
+                    self.font_loader.set_font(font_name)
+                    font_set = True
+                sdlgfx.stringRGBA(sdlrenderer, x, y, text, *color)
+        elif op == OP_COPY:
+            source, _, owner = args[0]
+            texture = self.source_texture(sdlrenderer, source, owner)
+            for _, rect, _ in args:
+                sdl2.SDL_RenderCopy(sdlrenderer, texture, None, sdl2.SDL_Rect(*rect))
+        elif op == OP_SPRITES:
+            source, _, owner = args[0]
+            texture = self.source_texture(sdlrenderer, source, owner)
+            sprites = [sprite for _, batch, _ in args for sprite in batch]
+            draw_sprites(sdlrenderer, texture, state[2], sprites)
+        elif op == OP_COPY_SURFACE:
+            surface, _, owner = args[0]
+            address = surface_address(surface)
+            # A new surface may be allocated where a freed one was
+            surface_format = surface.contents.format.contents.format
+            key = (
+                ctypes.addressof(sdlrenderer.contents),
+                address,
+                surface.contents.w,
+                surface.contents.h,
+                surface_format,
+            )
+            version = self.surface_versions[address]
+            texture = self.textures.get(key)
+            if texture is None:
+                texture = create_surface_texture(sdlrenderer, surface)
+                self.textures.add(key, texture, owner, pinned=True)
+            elif self.texture_versions.get(key) != version:
+                update_surface_texture(texture, surface)
+            self.texture_versions[key] = version
+            for _, rect, _ in args:
+                sdl2.SDL_RenderCopy(sdlrenderer, texture, None, sdl2.SDL_Rect(*rect))
+
+    def source_texture(self, sdlrenderer, source, owner):
+        """
+        Texture of a copy source, from the texture cache or created for it.
+        """
+        # Textures belong to a renderer, so a replay on another one builds its own
+        key = (ctypes.addressof(sdlrenderer.contents), source.content_key())
+        texture = self.textures.get(key)
+        if texture is None:
+            texture = source.create_texture(sdlrenderer)
+            self.textures.add(key, texture, owner)
+        return texture
@@ -0,0 +1,247 @@
+"""
+Dirty rectangle presentation for the SDL backend.
+
+The composited frame is kept in a target texture between frames. Each frame, the
+commands of the frame command buffer are compared with the ones of the previous
+frame: the screen rectangles of the commands that appeared or disappeared are the
+damage, and only those rectangles are redrawn, with all the layers that intersect
+them in z-order. Widget surfaces are only redrawn when their own commands change.
+A frame without damage is not drawn nor presented at all.
+
+Layers are not kept in textures of their own: SDL2 renderers, the software one in
+particular, cannot blend premultiplied layers back together without darkening
+their translucent pixels.
+
+The composition texture may be smaller than the logical size of the frame, with
+the commands scaled down into it and the texture scaled back up to the window, to
+draw fewer pixels. Partial redraws would leave seams at the edges of the damage
+rectangles, which fall between pixels, so scaled frames are redrawn whole.
+"""
+
+import ctypes
+import itertools
+import logging
+from collections import Counter
+
+import sdl2
+from sdl2.ext import raise_sdl_err
+
+from .commands import (
+    OP_BLIT,
+    OP_CLEAR,
+    OP_COPY,
+    OP_COPY_SURFACE,
+    OP_POINTS,
+    OP_SPRITES,
+    rects_intersect,
+    surface_address,
+)
+
+log = logging.getLogger(__name__)
+
+
+def union_rect(a, b):
+    x1, y1 = min(a[0], b[0]), min(a[1], b[1])
+    x2, y2 = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+    return (x1, y1, x2 - x1, y2 - y1)
+
+
+def clip_rect(rect, width, height):
+    x1, y1 = max(rect[0], 0), max(rect[1], 0)
+    x2, y2 = min(rect[0] + rect[2], width), min(rect[1] + rect[3], height)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return (x1, y1, x2 - x1, y2 - y1)
+
+
+def merge_rects(rects, max_rects):
+    """
+    Merge overlapping rectangles, falling back to their bounding box when too many
+    are left.
+    """
+    merged = []
+    for rect in rects:
+        overlapping = True
+        while overlapping:
+            overlapping = False
+            for i, other in enumerate(merged):
+                if rects_intersect(rect, other):
+                    rect = union_rect(rect, merged.pop(i))
+                    overlapping = True
+                    break
+        merged.append(rect)
+    if len(merged) > max_rects:
+        bounds = merged[0]
+        for rect in merged[1:]:
+            bounds = union_rect(bounds, rect)
+        return [bounds]
+    return merged
+
+
+def command_key(command, surface_keys):
+    """
+    Key of a command that identifies what it draws, to compare frames.
+    """
+    target, layer, kind, state, _, args, _ = command
+    op = state[0]
+    if op == OP_CLEAR:
+        key = None
+    elif op == OP_BLIT:
+        key = tuple(surface_address(surface) for surface in args)
+    elif op == OP_POINTS:
+        key = tuple(args)
+    elif op == OP_COPY:
+        source, rect, _ = args
+        key = (source.content_key(), tuple(rect))
+    elif op == OP_SPRITES:
+        source, sprites, _ = args
+        key = (source.content_key(), tuple(sprites))
+    elif op == OP_COPY_SURFACE:
+        surface, rect, _ = args
+        address = surface_address(surface)
+        key = (surface_keys.get(address, address), tuple(rect))
+    else:
+        key = tuple(args)
+    return (layer, state, key)
+
+
+class OffscreenTargets:
+    """
+    Commands of the offscreen targets (widget surfaces) of the last frame, so that
+    only the targets whose commands changed are redrawn.
+    """
+
+    def __init__(self):
+        self.target_keys = {}
+
+    def update(self, commands):
+        """
+        Find the offscreen targets whose commands changed. Returns their indexes and
+        the command keys of every target surface, by surface address.
+        """
+        target_keys = {}
+        surface_keys = {}
+        changed = set()
+        for index, group in itertools.groupby(
+            commands.offscreen_commands(), key=lambda command: command[0]
+        ):
+            renderer = commands.targets[index]
+            keys = tuple(command_key(command, {}) for command in group)
+            identity = (id(renderer), ctypes.addressof(renderer.sdlrenderer.contents))
+            target_keys[identity] = keys
+            if self.target_keys.get(identity) != keys:
+                changed.add(index)
+            surface_keys[surface_address(renderer.rendertarget)] = keys
+        self.target_keys = target_keys
+        return changed, surface_keys
+
+
+class Compositor:
+    max_rects = 8
+
+    def __init__(self, renderer, logical_size):
+        self.renderer = renderer
+        self.width, self.height = logical_size
+        self.scale = 1.0
+        self.texture = self.create_texture()
+        # Screen commands of the last frame, by key, with their count
+        self.items = Counter()
+        self.item_commands = {}
+        self.targets = OffscreenTargets()
+        self.full_damage = True
+        # Statistics
+        self.presented = 0
+        self.skipped = 0
+        self.damaged_pixels = 0
+
+    def create_texture(self):
+        texture = sdl2.SDL_CreateTexture(
+            self.renderer.sdlrenderer,
+            sdl2.SDL_PIXELFORMAT_ARGB8888,
+            sdl2.SDL_TEXTUREACCESS_TARGET,
+            max(round(self.width * self.scale), 1),
+            max(round(self.height * self.scale), 1),
+        )
+        if not texture:
+            raise_sdl_err("creating the composition texture")
+        return texture
+
+    def set_scale(self, scale):
+        """
+        Compose frames at a fraction of the logical size.
+        """
+        if scale == self.scale:
+            return
+        texture = self.texture
+        self.scale = scale
+        self.texture = self.create_texture()
+        sdl2.SDL_DestroyTexture(texture)
+        self.full_damage = True
+
+    def invalidate(self):
+        """
+        Redraw the whole frame, e.g. when the window was exposed or render targets
+        were lost.
+        """
+        self.full_damage = True
+
+    def update_damage(self, commands, surface_keys):
+        items = Counter()
+        item_commands = {}
+        for command in commands.screen_commands():
+            key = command_key(command, surface_keys)
+            items[key] += 1
+            item_commands.setdefault(key, command)
+        if self.full_damage:
+            self.full_damage = False
+            damage = [(0, 0, self.width, self.height)]
+        elif self.scale != 1 and items != self.items:
+            damage = [(0, 0, self.width, self.height)]
+        else:
+            damage = []
+            for key in (items - self.items) + (self.items - items):
+                command = item_commands.get(key) or self.item_commands[key]
+                rect = clip_rect(commands.bounds(command), self.width, self.height)
+                if rect:
+                    damage.append(rect)
+        self.items = items
+        self.item_commands = item_commands
+        return merge_rects(damage, self.max_rects)
+
+    def compose(self, commands):
+        """
+        Redraw the damaged rectangles of the frame, and copy it to the window, to be
+        presented. Returns False if nothing changed and the frame was skipped.
+        """
+        commands.sort()
+        changed_targets, surface_keys = self.targets.update(commands)
+        damage = self.update_damage(commands, surface_keys)
+        if not damage:
+            self.skipped += 1
+            return False
+        commands.execute_offscreen(changed_targets)
+        sdlrenderer = self.renderer.sdlrenderer
+        sdl2.SDL_SetRenderTarget(sdlrenderer, self.texture)
+        # The scale is reset when the render target changes
+        if self.scale != 1:
+            sdl2.SDL_RenderSetScale(sdlrenderer, self.scale, self.scale)
+        for rect in damage:
+            sdl2.SDL_RenderSetClipRect(sdlrenderer, sdl2.SDL_Rect(*rect))
+            commands.execute_screen(self.renderer, clip=rect)
+            self.damaged_pixels += rect[2] * rect[3] * self.scale**2
+        sdl2.SDL_RenderSetClipRect(sdlrenderer, None)
+        sdl2.SDL_SetRenderTarget(sdlrenderer, None)
+        sdl2.SDL_RenderCopy(sdlrenderer, self.texture, None, None)
+        self.presented += 1
+        return True
+
+    def summary(self):
+        frames = self.presented + self.skipped
+        damage = self.damaged_pixels / (frames * self.width * self.height or 1)
+        return (
+            f"{self.presented} frames presented, {self.skipped} skipped, "
+            f"{damage:.1%} of the screen redrawn on average"
+        )
+
+    def destroy(self):
+        sdl2.SDL_DestroyTexture(self.texture)
@@ -0,0 +1,50 @@
+import logging
+
+import sdl2
+
+log = logging.getLogger(__name__)
+
+
+class EventPump:
+    """
+    Drains the SDL event queue into a preallocated array of events and dispatches
+    each one to the handler registered for its type. Events without a handler are
+    dropped. No Python objects are allocated for the events themselves: the array
+    and the views into it are created once and reused every frame.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.events = (sdl2.SDL_Event * capacity)()
+        # Views share the memory of the array, so they always see the latest events
+        self.views = [self.events[i] for i in range(capacity)]
+        self.handlers = {}
+
+    def register(self, event_type, handler):
+        self.handlers[event_type] = handler
+
+    def register_all(self, handlers):
+        self.handlers.update(handlers)
+
+    def pump(self):
+        sdl2.SDL_PumpEvents()
+        handlers = self.handlers
+        views = self.views
+        count = self.capacity
+        # Keep draining while the array comes back full
+        while count == self.capacity:
+            count = sdl2.SDL_PeepEvents(
+                self.events,
+                self.capacity,
+                sdl2.SDL_GETEVENT,
+                sdl2.SDL_FIRSTEVENT,
+                sdl2.SDL_LASTEVENT,
+            )
+            if count < 0:
+                log.error("Failed to read events: %s", sdl2.SDL_GetError().decode())
+                return
+            for i in range(count):
+                event = views[i]
+                handler = handlers.get(event.type)
+                if handler is not None:
+                    handler(event)
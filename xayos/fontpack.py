@@ -0,0 +1,157 @@
+"""
+Packed bundle of the SDL_gfx bitmap fonts.
+
+All fonts live in a single file with an index, which is memory-mapped once and
+handed out as zero-copy slices. Rebuild it after adding or changing fonts:
+
+    python -m xayos.fontpack
+
+BDF fonts in the fonts directory are converted with bdfparser. Raw SDL_gfx .fnt
+bitmaps are packed as they are, with the size taken from their name (e.g. 9x18B).
+"""
+
+import argparse
+import ctypes
+import logging
+import re
+import struct
+import sys
+from pathlib import Path
+
+from . import assets
+from .glyphs import rasterize_page
+
+log = logging.getLogger(__name__)
+
+HERE = Path(__file__).parent
+FONT_PATH = HERE / "fonts"
+PACK_PATH = FONT_PATH / "fonts.pack"
+PACK_RESOURCE = ("fonts", "fonts.pack")
+
+# File header: magic, format version and number of fonts
+HEADER = struct.Struct("<4sHH")
+MAGIC = b"XFNT"
+VERSION = 1
+# Index entry: name, cell width and height, ascent, number of glyphs, data offset
+# and data length. Glyph n of a font starts at offset + n * glyph_size.
+ENTRY = struct.Struct("<16sHHHHII")
+GLYPH_COUNT = 256
+
+
+class PackedFont:
+    __slots__ = ["name", "width", "height", "ascent", "glyph_count", "offset", "length"]
+
+    def __init__(self, name, width, height, ascent, glyph_count, offset, length):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.ascent = ascent
+        self.glyph_count = glyph_count
+        self.offset = offset
+        self.length = length
+
+    @property
+    def glyph_size(self):
+        return (self.width + 7) // 8 * self.height
+
+
+class FontPack:
+    def __init__(self, path=None):
+        # A private mapping is writable, which ctypes needs to share its memory
+        if path is None:
+            self.path = "/".join(PACK_RESOURCE)
+            self.data = assets.map_resource(*PACK_RESOURCE)
+        else:
+            self.path = Path(path)
+            self.data = assets.map_file(self.path)
+        magic, version, count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a supported font pack: {self.path}")
+        self.fonts = {}
+        for i in range(count):
+            name, *fields = ENTRY.unpack_from(self.data, HEADER.size + i * ENTRY.size)
+            name = name.rstrip(b"\0").decode()
+            self.fonts[name] = PackedFont(name, *fields)
+        log.debug(f"Mapped {count} fonts from {self.path}")
+
+    def __contains__(self, font_name):
+        return font_name in self.fonts
+
+    def names(self):
+        return self.fonts.keys()
+
+    def get(self, font_name):
+        return self.fonts[font_name]
+
+    def font_data(self, font_name):
+        """
+        Return the glyph data of a font as a ctypes array that shares the memory of
+        the mapped file.
+        """
+        font = self.fonts[font_name]
+        return (ctypes.c_char * font.length).from_buffer(self.data, font.offset)
+
+
+def convert_fnt(path):
+    m = re.match(r"(\d+)x(\d+)", path.stem)
+    if not m:
+        raise ValueError(f"Cannot infer the font size from its name: {path}")
+    width, height = map(int, m.groups())
+    return width, height, height, path.read_bytes()
+
+
+def convert_bdf(path):
+    from bdfparser import Font
+
+    font = Font(str(path))
+    width, height = font.headers["fbbx"], font.headers["fbby"]
+    ascent = int(font.props.get("font_ascent", height + font.headers["fbbyoff"]))
+    return width, height, ascent, rasterize_page(font, 0, width, height)
+
+
+def find_sources(font_path=FONT_PATH):
+    sources = {path.stem: path for path in font_path.glob("*.fnt")}
+    # BDF sources take precedence over hand-converted bitmaps with the same name
+    sources.update({path.stem: path for path in font_path.glob("*.bdf")})
+    return sources
+
+
+def build_pack(sources, output=PACK_PATH):
+    fonts = []
+    for name, path in sorted(sources.items()):
+        if len(name.encode()) > 16:
+            raise ValueError(f"Font name too long for the pack index: {name}")
+        convert = convert_bdf if path.suffix == ".bdf" else convert_fnt
+        width, height, ascent, data = convert(path)
+        fonts.append((name, width, height, ascent, data))
+    # Sort by cell size, as FontLoader lists them
+    fonts.sort(key=lambda font: (font[1], font[2], font[0]))
+    offset = HEADER.size + len(fonts) * ENTRY.size
+    with open(output, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(fonts)))
+        for name, width, height, ascent, data in fonts:
+            entry = (name.encode(), width, height, ascent, GLYPH_COUNT, offset, len(data))
+            f.write(ENTRY.pack(*entry))
+            offset += len(data)
+        for *_, data in fonts:
+            f.write(data)
+    return len(fonts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the packed font bundle")
+    parser.add_argument(
+        "sources", nargs="*", type=Path, help="BDF or .fnt files (default: fonts dir)"
+    )
+    parser.add_argument("-o", "--output", type=Path, default=PACK_PATH)
+    args = parser.parse_args()
+    if args.sources:
+        sources = {path.stem: path for path in args.sources}
+    else:
+        sources = find_sources()
+    count = build_pack(sources, args.output)
+    print(f"Packed {count} fonts into {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,64 @@
-import ctypes
 import logging
 import re
-from pathlib import Path
 
 from sdl2 import sdlgfx
 
-HERE = Path(__file__).parent
-FONT_PATH = HERE / "fonts"
+from . import assets
+from .fontpack import PACK_RESOURCE, FontPack
+from .glyphs import GlyphPages
+from .trace import traced
 
 log = logging.getLogger(__name__)
 
 
 class FontLoader:
-    def __init__(self):
+    def __init__(self, pack_path=None, glyph_budget_bytes=1 << 20):
         # {font_name: (width, height, font_data)}
         self.font_data = {
             "8x8": (8, 8, None),
         }
         self.current_font = None
+        # Fonts are served from the packed bundle, the .fnt files are a fallback
+        self.font_pack = None
+        # By default, the pack is a resource of the package
+        if pack_path is None:
+            found = assets.exists(*PACK_RESOURCE)
+        else:
+            found = pack_path.exists()
+        if found:
+            self.font_pack = FontPack(pack_path)
+        else:
+            log.warning(
+                f"Font pack {pack_path or '/'.join(PACK_RESOURCE)} not found, "
+                "loading fonts one by one"
+            )
+        # Unicode glyphs, for the fonts that have a BDF source: {font_name: pages}
+        self.glyph_pages = {}
+        self.glyph_budget_bytes = glyph_budget_bytes
 
     def available_fonts(self):
         return self.font_data.keys()
 
     def load_all_fonts(self):
-        log.info(f"Loading all fonts from {FONT_PATH}")
-        for font_file in FONT_PATH.glob("*.fnt"):
-            self.load_font(font_file.stem)
+        if self.font_pack:
+            for font_name in self.font_pack.names():
+                self.load_font(font_name)
+        else:
+            log.info("Loading all fonts one by one")
+            for font_name in assets.list_files("fonts", ".fnt"):
+                self.load_font(font_name)
         fonts = sorted(self.font_data.items(), key=lambda x: (x[1][0], x[1][1]))
         self.font_data = dict(fonts)
 
+    @traced("fonts")
     def load_font(self, font_name, width=None, height=None):
         log.debug(f"Loading font {font_name}")
+        if self.font_pack and font_name in self.font_pack:
+            font = self.font_pack.get(font_name)
+            font_data = self.font_pack.font_data(font_name)
+            self.font_data[font_name] = (font.width, font.height, font_data)
+            return
+
         if width is None and height is None:
             m = re.match(r"(\d+)x(\d+)", font_name)
             if m:
@@ -39,8 +67,7 @@ class FontLoader:
         if width is None or height is None:
             raise ValueError("Width and height must be provided")
 
-        with open(FONT_PATH / f"{font_name}.fnt", "rb") as f:
-            font_data = f.read()
+        font_data = assets.read_bytes("fonts", f"{font_name}.fnt")
 
         self.font_data[font_name] = (width, height, font_data)
 
@@ -61,3 +88,33 @@ class FontLoader:
         if font_name not in self.font_data:
             raise ValueError(f"Font {font_name} not loaded")
         return self.font_data[font_name][:2]
+
+    def get_glyph_pages(self, font_name):
+        if font_name not in self.glyph_pages:
+            source = ("fonts", f"{font_name}.bdf")
+            pages = None
+            if assets.exists(*source):
+                with assets.path(*source) as path:
+                    pages = GlyphPages(path, budget_bytes=self.glyph_budget_bytes)
+            self.glyph_pages[font_name] = pages
+        return self.glyph_pages[font_name]
+
+    def draw_text(self, sdlrenderer, font_name, x, y, text, color):
+        self.draw_texts(sdlrenderer, font_name, [(x, y, text)], color)
+
+    def draw_texts(self, sdlrenderer, font_name, texts, color):
+        """
+        Draw Unicode strings. Fonts with a BDF source render any glyph they have,
+        the other ones are limited to Latin-1.
+        """
+        glyph_pages = self.get_glyph_pages(font_name)
+        if glyph_pages:
+            glyph_pages.draw_texts(sdlrenderer, texts, color)
+            # The SDL_gfx font now points to a glyph page
+            self.current_font = None
+            return
+        self.set_font(font_name)
+        for x, y, text in texts:
+            sdlgfx.stringRGBA(
+                sdlrenderer, x, y, text.encode("latin-1", "replace"), *color
+            )
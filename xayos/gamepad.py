@@ -36,12 +36,43 @@ BUTTON_TRIGGERRIGHT = 101
 log = logging.getLogger(__name__)
 
 
+class InputSnapshot:
+    """
+    Consolidated input state of a single frame.
+
+    The changes attribute lists the (button, state, timestamp) changes of the frame,
+    in the order they happened, with the SDL timestamp of the originating event. The
+    axes attribute maps each axis to its latest value, as motion events are
+    coalesced. The snapshot is reused from frame to frame, so it must not be kept
+    around.
+    """
+
+    __slots__ = ["frame", "changes", "axes", "buttons"]
+
+    def __init__(self, axes, buttons):
+        self.frame = 0
+        self.changes = []
+        self.axes = axes
+        self.buttons = buttons
+
+
 class GamepadHandler:
 
-    def __init__(self, on_input=None):
+    def __init__(self, on_input=None, on_snapshot=None):
         # self.controller = None
         # self.controller_id = None
+        # Triggers are pressed above the first threshold and released below the
+        # second one, so that noise around a single threshold does not chatter
         self.trigger_threshold = 32767 // 2
+        self.trigger_release_threshold = 32767 // 3
+        self.trigger_buttons = {
+            AXIS_TRIGGERLEFT: BUTTON_TRIGGERLEFT,
+            AXIS_TRIGGERRIGHT: BUTTON_TRIGGERRIGHT,
+        }
+        self.trigger_states = {
+            AXIS_TRIGGERLEFT: False,
+            AXIS_TRIGGERRIGHT: False,
+        }
         self.axis_states = {
             AXIS_LEFTX: 0,
             AXIS_LEFTY: 0,
@@ -96,7 +127,36 @@ class GamepadHandler:
             sdl2.SDLK_SPACE: BUTTON_A,
             sdl2.SDLK_BACKSPACE: BUTTON_B,
         }
+        # Dispatch table indexed by event type, also used by the shell event pump
+        self.event_handlers = {
+            sdl2.SDL_CONTROLLERAXISMOTION: lambda e: self.handle_axis_motion(e.caxis),
+            sdl2.SDL_CONTROLLERBUTTONDOWN: lambda e: self.handle_button_down(e.cbutton),
+            sdl2.SDL_CONTROLLERBUTTONUP: lambda e: self.handle_button_up(e.cbutton),
+            sdl2.SDL_CONTROLLERDEVICEADDED: lambda e: self.handle_device_added(e.cdevice),
+            sdl2.SDL_CONTROLLERDEVICEREMOVED: lambda e: self.handle_device_removed(
+                e.cdevice
+            ),
+            sdl2.SDL_CONTROLLERDEVICEREMAPPED: lambda e: self.handle_device_remapped(
+                e.cdevice
+            ),
+            sdl2.SDL_CONTROLLERTOUCHPADDOWN: lambda e: self.handle_touchpad_down(
+                e.ctouchpad
+            ),
+            sdl2.SDL_CONTROLLERTOUCHPADMOTION: lambda e: self.handle_touchpad_motion(
+                e.ctouchpad
+            ),
+            sdl2.SDL_CONTROLLERTOUCHPADUP: lambda e: self.handle_touchpad_up(e.ctouchpad),
+            sdl2.SDL_CONTROLLERSENSORUPDATE: lambda e: self.handle_sensor_update(
+                e.csensor
+            ),
+            sdl2.SDL_KEYDOWN: lambda e: self.handle_key_down(e.key),
+            sdl2.SDL_KEYUP: lambda e: self.handle_key_up(e.key),
+        }
+        # Button changes are queued as events arrive and dispatched once per frame
+        self.pending_changes = []
+        self.snapshot = InputSnapshot(self.axis_states, self.button_states)
         self.on_input = on_input
+        self.on_snapshot = on_snapshot
 
     def set_callbacks(self, on_input=None):
         if on_input:
@@ -113,61 +173,32 @@ class GamepadHandler:
         return [button for button, state in self.button_states.items() if state]
 
     def handle_event(self, event):
-        match event.type:
-            case sdl2.SDL_CONTROLLERAXISMOTION:
-                self.handle_axis_motion(event.caxis)
-            case sdl2.SDL_CONTROLLERBUTTONDOWN:
-                self.handle_button_down(event.cbutton)
-            case sdl2.SDL_CONTROLLERBUTTONUP:
-                self.handle_button_up(event.cbutton)
-            case sdl2.SDL_CONTROLLERDEVICEADDED:
-                self.handle_device_added(event.cdevice)
-            case sdl2.SDL_CONTROLLERDEVICEREMOVED:
-                self.handle_device_removed(event.cdevice)
-            case sdl2.SDL_CONTROLLERDEVICEREMAPPED:
-                self.handle_device_remapped(event.cdevice)
-            case sdl2.SDL_CONTROLLERTOUCHPADDOWN:
-                self.handle_touchpad_down(event.ctouchpad)
-            case sdl2.SDL_CONTROLLERTOUCHPADMOTION:
-                self.handle_touchpad_motion(event.ctouchpad)
-            case sdl2.SDL_CONTROLLERTOUCHPADUP:
-                self.handle_touchpad_up(event.ctouchpad)
-            case sdl2.SDL_CONTROLLERSENSORUPDATE:
-                self.handle_sensor_update(event.csensor)
-            case sdl2.SDL_KEYDOWN:
-                self.handle_key_down(event.key)
-            case sdl2.SDL_KEYUP:
-                self.handle_key_up(event.key)
-            case _:
-                pass
+        handler = self.event_handlers.get(event.type)
+        if handler is not None:
+            handler(event)
 
     def handle_axis_motion(self, caxis):
         if caxis.axis not in self.axis_states:
-            log.debug(f"Unknown axis motion: {caxis.axis} (value: {caxis.value})")
+            log.debug("Unknown axis motion: %s (value: %s)", caxis.axis, caxis.value)
             return
         # log.debug(f"Axis motion: {caxis.axis} (value: {caxis.value})")
+        # Only the latest value of each axis is kept until the next frame
         self.axis_states[caxis.axis] = caxis.value
-        if caxis.axis in (AXIS_TRIGGERLEFT, AXIS_TRIGGERRIGHT):
-            self.handle_trigger(caxis.axis, caxis.value)
-
-    def handle_trigger(self, axis, value):
-        if axis == AXIS_TRIGGERLEFT:
-            button = BUTTON_TRIGGERLEFT
-        elif axis == AXIS_TRIGGERRIGHT:
-            button = BUTTON_TRIGGERRIGHT
+        if caxis.axis in self.trigger_states:
+            self.handle_trigger(caxis.axis, caxis.value, caxis.timestamp)
+
+    def handle_trigger(self, axis, value, timestamp=0):
+        pressed = self.trigger_states[axis]
+        if not pressed and value >= self.trigger_threshold:
+            pressed = True
+        elif pressed and value < self.trigger_release_threshold:
+            pressed = False
         else:
-            log.debug(f"Unknown trigger axis: {axis}")
             return
-        if value >= self.trigger_threshold:
-            log.debug(f"Trigger pressed: {button}")
-            self.button_states[button] = True
-            if self.on_input:
-                self.on_input(button, True)
-        else:
-            log.debug(f"Trigger released: {button}")
-            self.button_states[button] = False
-            if self.on_input:
-                self.on_input(button, False)
+        self.trigger_states[axis] = pressed
+        button = self.trigger_buttons[axis]
+        log.debug("Trigger %s: %s", "pressed" if pressed else "released", button)
+        self.set_button(button, pressed, timestamp)
 
     def handle_button_down(self, cbutton):
         assert cbutton.state == sdl2.SDL_PRESSED
@@ -177,9 +208,7 @@ class GamepadHandler:
             )
             return
         # log.debug(f"Button pressed: {cbutton.button} (which: {cbutton.which})")
-        self.button_states[cbutton.button] = True
-        if self.on_input:
-            self.on_input(cbutton.button, True)
+        self.set_button(cbutton.button, True, cbutton.timestamp)
 
     def handle_button_up(self, cbutton):
         assert cbutton.state == sdl2.SDL_RELEASED
@@ -189,9 +218,30 @@ class GamepadHandler:
             )
             return
         # log.debug(f"Button released: {cbutton.button} (which: {cbutton.which})")
-        self.button_states[cbutton.button] = False
-        if self.on_input:
-            self.on_input(cbutton.button, False)
+        self.set_button(cbutton.button, False, cbutton.timestamp)
+
+    def set_button(self, button, state, timestamp=0):
+        self.pending_changes.append((button, state, timestamp))
+
+    def flush(self):
+        """
+        Dispatch the input changes queued since the last frame, in order, and then
+        deliver the frame snapshot. Button states are updated as each change is
+        dispatched, so that callbacks see the state at the time of the change.
+        """
+        snapshot = self.snapshot
+        changes = self.pending_changes
+        self.pending_changes = snapshot.changes
+        self.pending_changes.clear()
+        snapshot.changes = changes
+        snapshot.frame += 1
+        for button, state, timestamp in changes:
+            self.button_states[button] = state
+            if self.on_input:
+                self.on_input(button, state, timestamp)
+        if self.on_snapshot:
+            self.on_snapshot(snapshot)
+        return snapshot
 
     def handle_device_added(self, cdevice):
         pass
@@ -216,28 +266,16 @@ class GamepadHandler:
 
     # This is to simulate the gamepad with the keyboard
 
-    def generate_button_event(self, button, state, which=0):
-        event = sdl2.SDL_Event()
-        event.type = (
-            sdl2.SDL_CONTROLLERBUTTONDOWN if state else sdl2.SDL_CONTROLLERBUTTONUP
-        )
-        event.cbutton.which = which
-        event.cbutton.button = button
-        event.cbutton.state = state
-        return event
-
     def handle_key_down(self, key):
         if key.repeat:
             return
-        log.debug(f"Key down: {key.keysym.sym}")
-        if key.keysym.sym in self.key_button_mapping:
-            button = self.key_button_mapping[key.keysym.sym]
-            event = self.generate_button_event(button, True)
-            self.handle_event(event)
+        log.debug("Key down: %s", key.keysym.sym)
+        button = self.key_button_mapping.get(key.keysym.sym)
+        if button is not None:
+            self.set_button(button, True, key.timestamp)
 
     def handle_key_up(self, key):
-        log.debug(f"Key up: {key.keysym.sym}")
-        if key.keysym.sym in self.key_button_mapping:
-            button = self.key_button_mapping[key.keysym.sym]
-            event = self.generate_button_event(button, False)
-            self.handle_event(event)
+        log.debug("Key up: %s", key.keysym.sym)
+        button = self.key_button_mapping.get(key.keysym.sym)
+        if button is not None:
+            self.set_button(button, False, key.timestamp)
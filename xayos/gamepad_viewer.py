@@ -1,11 +1,6 @@
-from pathlib import Path
 import logging
 
-import sdl2
-import sdl2.ext
-from sdl2.ext import Renderer
-
-from . import colors
+from . import assets, colors
 from .gamepad import (
     BUTTON_A,
     BUTTON_B,
@@ -25,9 +20,13 @@ from .gamepad import (
     BUTTON_TRIGGERLEFT,
     BUTTON_TRIGGERRIGHT,
 )
-
-HERE = Path(__file__).parent
-RESOURCES_PATH = HERE / "resources"
+from .tracking import (
+    create_renderer,
+    create_surface,
+    destroy_renderer,
+    free_surface,
+    load_image,
+)
 
 log = logging.getLogger(__name__)
 
@@ -37,11 +36,10 @@ class GamepadViewer:
         self.gamepad_state = gamepad_state
         self.scale = scale
         # Load png image
-        self.img_surface = sdl2.ext.load_img(str(RESOURCES_PATH / "ds4.png"))
+        self.img_surface = load_image(assets.read_bytes("resources", "ds4.png"))
         # Create a surface 45x30
-        self.drawing_surface = sdl2.SDL_CreateRGBSurface(
-            0, 45, 30, 32, 0xFF000000, 0x00FF0000, 0x0000FF00, 0x000000FF
-        )
+        self.drawing_surface = create_surface(45, 30)
+        self.surface_renderer = create_renderer(self.drawing_surface)
         self.a_pos = [(34, 12)]
         self.b_pos = [(36, 10)]
         self.x_pos = [(32, 10)]
@@ -75,63 +73,62 @@ class GamepadViewer:
             # (33, 3)
         ]
 
-    def draw_button_states(self, surface_renderer):
+    def draw_button_states(self, commands):
         buttons_pressed = self.gamepad_state.buttons_pressed()
         if BUTTON_A in buttons_pressed:
-            surface_renderer.draw_point(self.a_pos, colors.DODGER_BLUE)
+            commands.draw_point(self.a_pos, colors.DODGER_BLUE)
         if BUTTON_B in buttons_pressed:
-            surface_renderer.draw_point(self.b_pos, colors.RED)
+            commands.draw_point(self.b_pos, colors.RED)
         if BUTTON_X in buttons_pressed:
-            surface_renderer.draw_point(self.x_pos, colors.PURPLE_3)
+            commands.draw_point(self.x_pos, colors.PURPLE_3)
         if BUTTON_Y in buttons_pressed:
-            surface_renderer.draw_point(self.y_pos, colors.GREEN)
+            commands.draw_point(self.y_pos, colors.GREEN)
         if BUTTON_DPAD_RIGHT in buttons_pressed:
-            surface_renderer.draw_point(self.dpad_r_pos, colors.YELLOW)
+            commands.draw_point(self.dpad_r_pos, colors.YELLOW)
         if BUTTON_DPAD_DOWN in buttons_pressed:
-            surface_renderer.draw_point(self.dpad_d_pos, colors.YELLOW)
+            commands.draw_point(self.dpad_d_pos, colors.YELLOW)
         if BUTTON_DPAD_LEFT in buttons_pressed:
-            surface_renderer.draw_point(self.dpad_l_pos, colors.YELLOW)
+            commands.draw_point(self.dpad_l_pos, colors.YELLOW)
         if BUTTON_DPAD_UP in buttons_pressed:
-            surface_renderer.draw_point(self.dpad_u_pos, colors.YELLOW)
+            commands.draw_point(self.dpad_u_pos, colors.YELLOW)
 
         if BUTTON_START in buttons_pressed:
-            surface_renderer.draw_point(self.start_pos, colors.LIGHT_GREY_2)
+            commands.draw_point(self.start_pos, colors.LIGHT_GREY_2)
         if BUTTON_BACK in buttons_pressed:
-            surface_renderer.draw_point(self.back_pos, colors.LIGHT_GREY_2)
+            commands.draw_point(self.back_pos, colors.LIGHT_GREY_2)
         if BUTTON_GUIDE in buttons_pressed:
-            surface_renderer.draw_point(self.guide_pos, colors.LIGHT_GREY_2)
+            commands.draw_point(self.guide_pos, colors.LIGHT_GREY_2)
 
         if BUTTON_LEFTSTICK in buttons_pressed:
-            surface_renderer.draw_point(self.left_stick_pos, colors.LIGHT_GREY_2)
+            commands.draw_point(self.left_stick_pos, colors.LIGHT_GREY_2)
         if BUTTON_RIGHTSTICK in buttons_pressed:
-            surface_renderer.draw_point(self.right_stick_pos, colors.LIGHT_GREY_2)
+            commands.draw_point(self.right_stick_pos, colors.LIGHT_GREY_2)
         if BUTTON_LEFTSHOULDER in buttons_pressed:
-            surface_renderer.draw_point(self.left_shoulder_pos, colors.LIGHT_GREY_2)
+            commands.draw_point(self.left_shoulder_pos, colors.LIGHT_GREY_2)
         if BUTTON_RIGHTSHOULDER in buttons_pressed:
-            surface_renderer.draw_point(self.right_shoulder_pos, colors.LIGHT_GREY_2)
+            commands.draw_point(self.right_shoulder_pos, colors.LIGHT_GREY_2)
 
         if BUTTON_TRIGGERLEFT in buttons_pressed:
-            surface_renderer.draw_point(self.left_trigger_pos, colors.ORANGE)
+            commands.draw_point(self.left_trigger_pos, colors.ORANGE)
         if BUTTON_TRIGGERRIGHT in buttons_pressed:
-            surface_renderer.draw_point(self.right_trigger_pos, colors.ORANGE)
-
-    def render(self, renderer):
-        surface_renderer = Renderer(self.drawing_surface)
-        surface_renderer.clear(colors.TRANSPARENT)
-        sdl2.SDL_BlitSurface(self.img_surface, None, self.drawing_surface, None)
-
-        self.draw_button_states(surface_renderer)
-        screen_width, screen_height = renderer.logical_size
+            commands.draw_point(self.right_trigger_pos, colors.ORANGE)
 
-        # Create a texture
-        texture = sdl2.ext.Texture(renderer, self.drawing_surface)
+    def render(self, commands):
+        with commands.offscreen(self.surface_renderer):
+            commands.clear(colors.TRANSPARENT)
+            commands.blit_surface(self.img_surface, self.drawing_surface)
+            self.draw_button_states(commands)
+        screen_width, screen_height = commands.logical_size
 
         # Render the image
-        rect = sdl2.SDL_Rect()
-        rect.w, rect.h = texture.size
-        rect.w *= self.scale
-        rect.h *= self.scale
-        rect.x = screen_width - rect.w - 10
-        rect.y = screen_height - rect.h - 30
+        surface = self.drawing_surface.contents
+        width = surface.w * self.scale
+        height = surface.h * self.scale
+        x = screen_width - width - 10
+        y = screen_height - height - 30
+        commands.copy_surface(self.drawing_surface, (x, y, width, height))
 
-        sdl2.SDL_RenderCopy(renderer.sdlrenderer, texture.tx, None, rect)
+    def destroy(self):
+        destroy_renderer(self.surface_renderer)
+        free_surface(self.drawing_surface)
+        free_surface(self.img_surface)
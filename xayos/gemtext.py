@@ -1,6 +1,8 @@
 import io
 from dataclasses import dataclass
 
+from .trace import traced
+
 
 @dataclass
 class GemtextToken:
@@ -26,6 +28,7 @@ class GemtextParser:
     See https://geminiprotocol.net/docs/gemtext.gmi for the specification.
     """
 
+    @traced("gemtext")
     def parse(self, gemtext):
         """
         Parse the given Gemtext string into a list of tokens.
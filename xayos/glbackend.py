@@ -0,0 +1,629 @@
+"""
+OpenGL 3.3 core render backend.
+
+The frame command buffer is executed in OpenGL, batch by batch, with a single
+shader: points and lines as such, clears, boxes and rectangles as flat colored
+quads, text and text lines as quads of per-font glyph atlases (one per page for
+Unicode glyphs), sprites as quads of their atlas and copies of widget surfaces as
+textured quads.
+
+Widget surfaces are still drawn in software, with SDL and SDL_gfx, but only when
+their commands change, and only then uploaded again to their texture.
+
+On a headless machine it runs on Mesa's software rasterizer (llvmpipe), through
+an EGL context that PyOpenGL must be told about:
+
+    export SDL_VIDEODRIVER=offscreen PYOPENGL_PLATFORM=egl LIBGL_ALWAYS_SOFTWARE=1
+    python -m xayos --backend gl33
+"""
+
+import ctypes
+import itertools
+import logging
+import time
+
+import numpy as np
+import sdl2
+import sdl2.ext
+from OpenGL import GL as gl
+from sdl2 import sdlgfx
+from sdl2.ext import raise_sdl_err
+
+from . import colors
+from .commands import (
+    OP_BLIT,
+    OP_BOX,
+    OP_CLEAR,
+    OP_COPY,
+    OP_COPY_SURFACE,
+    OP_LINE,
+    OP_POINTS,
+    OP_RECT,
+    OP_SPRITES,
+    OP_TEXT,
+    CommandBuffer,
+    batch_key,
+    rect_from_corners,
+    surface_address,
+)
+from .compositor import OffscreenTargets
+from .text import TextLine
+from .textures import TextureCache
+from .tracking import release_renderer
+
+log = logging.getLogger(__name__)
+
+VERTEX_SHADER = """
+#version 330 core
+layout(location = 0) in vec2 position;
+layout(location = 1) in vec2 uv;
+layout(location = 2) in vec4 color;
+uniform vec2 viewport;
+out vec2 v_uv;
+out vec4 v_color;
+
+void main() {
+    // Logical pixel coordinates, with the origin at the top left corner
+    vec2 ndc = position / viewport * 2.0 - 1.0;
+    gl_Position = vec4(ndc.x, -ndc.y, 0.0, 1.0);
+    v_uv = uv;
+    v_color = color;
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 330 core
+in vec2 v_uv;
+in vec4 v_color;
+uniform sampler2D tex;
+uniform int mode;
+out vec4 frag_color;
+
+void main() {
+    if (mode == 0) {
+        // Flat colored points, lines and quads
+        frag_color = v_color;
+    } else if (mode == 1) {
+        // RGBA texture
+        frag_color = texture(tex, v_uv) * v_color;
+    } else {
+        // Glyph atlas, with the coverage in the red channel
+        frag_color = vec4(v_color.rgb, v_color.a * texture(tex, v_uv).r);
+    }
+}
+"""
+
+MODE_FLAT = 0
+MODE_TEXTURE = 1
+MODE_GLYPHS = 2
+
+# Vertex layout: x, y, u, v, r, g, b, a
+VERTEX_FLOATS = 8
+VERTEX_STRIDE = VERTEX_FLOATS * 4
+
+# Two triangles per quad: corner offsets in cells, as (x, y)
+QUAD_CORNERS = np.array([(0, 0), (1, 0), (0, 1), (0, 1), (1, 0), (1, 1)], np.float32)
+
+# Upload formats of the surface pixel formats, other ones are converted first
+SURFACE_FORMATS = {
+    sdl2.SDL_PIXELFORMAT_RGBA8888: (gl.GL_RGBA, gl.GL_UNSIGNED_INT_8_8_8_8),
+    sdl2.SDL_PIXELFORMAT_ARGB8888: (gl.GL_BGRA, gl.GL_UNSIGNED_INT_8_8_8_8_REV),
+}
+
+
+def compile_program(vertex_source, fragment_source):
+    shaders = []
+    for shader_type, source in (
+        (gl.GL_VERTEX_SHADER, vertex_source),
+        (gl.GL_FRAGMENT_SHADER, fragment_source),
+    ):
+        shader = gl.glCreateShader(shader_type)
+        gl.glShaderSource(shader, source)
+        gl.glCompileShader(shader)
+        if not gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS):
+            raise RuntimeError(f"Shader error: {gl.glGetShaderInfoLog(shader).decode()}")
+        shaders.append(shader)
+    program = gl.glCreateProgram()
+    for shader in shaders:
+        gl.glAttachShader(program, shader)
+    gl.glLinkProgram(program)
+    if not gl.glGetProgramiv(program, gl.GL_LINK_STATUS):
+        raise RuntimeError(f"Program error: {gl.glGetProgramInfoLog(program).decode()}")
+    for shader in shaders:
+        gl.glDeleteShader(shader)
+    return program
+
+
+def build_glyph_atlas(font_data, width, height):
+    """
+    Lay out the 256 glyphs of SDL_gfx font data in a 16x16 grid of cells, one byte
+    of coverage per pixel.
+    """
+    row_bytes = (width + 7) // 8
+    glyphs = np.frombuffer(bytes(font_data), np.uint8).reshape(256, height, row_bytes)
+    pixels = np.unpackbits(glyphs, axis=2)[:, :, :width]
+    grid = pixels.reshape(16, 16, height, width).transpose(0, 2, 1, 3)
+    return np.ascontiguousarray(grid.reshape(16 * height, 16 * width) * 255)
+
+
+def render_glyph_atlas(font_loader, font_name, width, height):
+    """
+    Glyph atlas of a font without data to build it from (the built-in SDL_gfx font),
+    drawn glyph by glyph with SDL_gfx.
+    """
+    surface = sdl2.SDL_CreateRGBSurface(
+        0, 16 * width, 16 * height, 32, 0xFF000000, 0x00FF0000, 0x0000FF00, 0xFF
+    )
+    if not surface:
+        raise_sdl_err("creating a glyph atlas surface")
+    renderer = sdl2.ext.Renderer(surface)
+    renderer.clear((0, 0, 0, 0))
+    font_loader.set_font(font_name)
+    for code in range(256):
+        x, y = code % 16 * width, code // 16 * height
+        sdlgfx.characterRGBA(
+            renderer.sdlrenderer, x, y, bytes([code]), 255, 255, 255, 255
+        )
+    renderer.present()
+    pitch = surface.contents.pitch // 4
+    pixels = np.ctypeslib.as_array(
+        ctypes.cast(surface.contents.pixels, ctypes.POINTER(ctypes.c_uint32)),
+        (16 * height, pitch),
+    )
+    # The coverage is in the alpha channel
+    coverage = np.ascontiguousarray(pixels[:, : 16 * width] & 0xFF, np.uint8)
+    release_renderer(renderer)
+    sdl2.SDL_FreeSurface(surface)
+    return coverage
+
+
+def create_coverage_texture(pixels, width, height):
+    """
+    Texture with one byte of coverage per pixel, in the red channel.
+    """
+    texture = gl.glGenTextures(1)
+    gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+    gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+    gl.glTexImage2D(
+        gl.GL_TEXTURE_2D,
+        0,
+        gl.GL_R8,
+        width,
+        height,
+        0,
+        gl.GL_RED,
+        gl.GL_UNSIGNED_BYTE,
+        pixels,
+    )
+    gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 4)
+    gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+    gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+    return texture
+
+
+def normalized_color(color):
+    color = sdl2.ext.convert_to_color(color)
+    return (color.r / 255, color.g / 255, color.b / 255, color.a / 255)
+
+
+def quad_vertices(rects, color, texture_rects=None):
+    """
+    Two triangles for each rectangle (x, y, w, h), textured with the matching
+    rectangle (u, v, w, h) of texture_rects, or with a single one for all of them.
+    """
+    rects = np.asarray(rects, np.float32).reshape(-1, 4)
+    vertices = np.zeros((len(rects), 6, VERTEX_FLOATS), np.float32)
+    vertices[:, :, 0:2] = rects[:, None, 0:2] + QUAD_CORNERS * rects[:, None, 2:4]
+    if texture_rects is not None:
+        texture_rects = np.asarray(texture_rects, np.float32).reshape(-1, 4)
+        vertices[:, :, 2:4] = (
+            texture_rects[:, None, 0:2] + QUAD_CORNERS * texture_rects[:, None, 2:4]
+        )
+    vertices[:, :, 4:] = color
+    return vertices.reshape(-1, VERTEX_FLOATS)
+
+
+class GlyphAtlas:
+    def __init__(self, pixels, width, height):
+        self.width = width
+        self.height = height
+        self.texture = create_coverage_texture(pixels, 16 * width, 16 * height)
+
+    def text_vertices(self, texts, color):
+        """
+        Quads of strings, as (x, y, text) with the text as bytes of glyph indexes.
+        """
+        batches = []
+        for x, y, text in texts:
+            codes = np.frombuffer(text, np.uint8)
+            rects = np.empty((len(codes), 4), np.float32)
+            rects[:, 0] = x + np.arange(len(codes)) * self.width
+            rects[:, 1] = y
+            rects[:, 2:] = (self.width, self.height)
+            cells = np.empty((len(codes), 4), np.float32)
+            cells[:, 0] = codes % 16
+            cells[:, 1] = codes // 16
+            cells[:, 2:] = 1
+            batches.append(quad_vertices(rects, color, cells / 16))
+        return np.concatenate(batches)
+
+    def destroy(self):
+        gl.glDeleteTextures([self.texture])
+
+
+class SpriteAtlas:
+    """
+    Sprites of a source with their coverage (see StarSprites), in the red channel,
+    drawn as quads tinted by the color of each sprite.
+    """
+
+    def __init__(self, sprites):
+        self.width = sprites.width
+        self.height = sprites.height
+        self.texture = create_coverage_texture(
+            sprites.coverage(), self.width, self.height
+        )
+
+    def sprite_vertices(self, size, copies):
+        copies = np.asarray(copies, np.float32)
+        vertices = np.empty((len(copies), 6, VERTEX_FLOATS), np.float32)
+        vertices[:, :, 0:2] = copies[:, None, 2:4] + QUAD_CORNERS * size
+        vertices[:, :, 2:4] = copies[:, None, 0:2] + QUAD_CORNERS * size
+        vertices[:, :, 2:4] /= (self.width, self.height)
+        vertices[:, :, 4:] = copies[:, None, 4:8] / 255
+        return vertices.reshape(-1, VERTEX_FLOATS)
+
+    def destroy(self):
+        gl.glDeleteTextures([self.texture])
+
+
+class SurfaceTexture:
+    """
+    Texture of a widget surface, uploaded again when the surface is redrawn.
+    """
+
+    def __init__(self, surface, owner):
+        self.owner = owner
+        self.version = None
+        self.texture = gl.glGenTextures(1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture)
+        gl.glTexImage2D(
+            gl.GL_TEXTURE_2D,
+            0,
+            gl.GL_RGBA8,
+            surface.contents.w,
+            surface.contents.h,
+            0,
+            gl.GL_RGBA,
+            gl.GL_UNSIGNED_BYTE,
+            None,
+        )
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+
+    def upload(self, surface):
+        converted = None
+        upload_format = SURFACE_FORMATS.get(surface.contents.format.contents.format)
+        if upload_format is None:
+            pixel_format = sdl2.SDL_PIXELFORMAT_RGBA8888
+            converted = sdl2.SDL_ConvertSurfaceFormat(surface, pixel_format, 0)
+            if not converted:
+                raise_sdl_err("converting a surface")
+            surface = converted
+            upload_format = SURFACE_FORMATS[pixel_format]
+        contents = surface.contents
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture)
+        gl.glPixelStorei(gl.GL_UNPACK_ROW_LENGTH, contents.pitch // 4)
+        gl.glTexSubImage2D(
+            gl.GL_TEXTURE_2D,
+            0,
+            0,
+            0,
+            contents.w,
+            contents.h,
+            *upload_format,
+            ctypes.c_void_p(contents.pixels),
+        )
+        gl.glPixelStorei(gl.GL_UNPACK_ROW_LENGTH, 0)
+        if converted:
+            sdl2.SDL_FreeSurface(converted)
+
+    def destroy(self):
+        gl.glDeleteTextures([self.texture])
+
+
+class GLBackend:
+    name = "gl33"
+
+    def __init__(self, window, font_loader, logical_size, vsync=False, textures=None):
+        self.window = window
+        self.font_loader = font_loader
+        self.width, self.height = logical_size
+        self.textures = textures if textures is not None else TextureCache()
+        self.gl_context = None
+        self.create_context()
+        try:
+            self.init_resources(vsync)
+        except Exception:
+            sdl2.SDL_GL_DeleteContext(self.gl_context)
+            raise
+
+    def init_resources(self, vsync):
+        if sdl2.SDL_GL_SetSwapInterval(1 if vsync else 0) != 0:
+            log.warning("Failed to set the swap interval")
+        self.program = compile_program(VERTEX_SHADER, FRAGMENT_SHADER)
+        self.viewport_location = gl.glGetUniformLocation(self.program, "viewport")
+        self.mode_location = gl.glGetUniformLocation(self.program, "mode")
+        self.vao = gl.glGenVertexArrays(1)
+        self.vbo = gl.glGenBuffers(1)
+        gl.glBindVertexArray(self.vao)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        for location, size, offset in ((0, 2, 0), (1, 2, 2), (2, 4, 4)):
+            gl.glEnableVertexAttribArray(location)
+            gl.glVertexAttribPointer(
+                location,
+                size,
+                gl.GL_FLOAT,
+                gl.GL_FALSE,
+                VERTEX_STRIDE,
+                ctypes.c_void_p(offset * 4),
+            )
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        # The screen is drawn in OpenGL, only widget surfaces have SDL renderers
+        self.renderer = None
+        self.commands = CommandBuffer(
+            self.font_loader, (self.width, self.height), self.textures
+        )
+        # Widget surfaces are only redrawn when their commands change
+        self.targets = OffscreenTargets()
+        # {surface key: SurfaceTexture}
+        self.surface_textures = {}
+        # Glyph atlases by (font name, page), the page being None for the glyphs
+        # of the font itself and the index of the Unicode page for glyph pages
+        self.atlases = {}
+        # Sprite atlases by the content key of their source
+        self.sprite_atlases = {}
+        # When the last frame was drawn, before swapping buffers
+        self.drawn_ns = 0
+
+    def create_context(self):
+        gl_attributes = {
+            # Use OpenGL 3.3 (core context)
+            sdl2.SDL_GL_CONTEXT_MAJOR_VERSION: 3,
+            sdl2.SDL_GL_CONTEXT_MINOR_VERSION: 3,
+            sdl2.SDL_GL_CONTEXT_PROFILE_MASK: sdl2.SDL_GL_CONTEXT_PROFILE_CORE,
+            # Double buffering and depth buffer size
+            sdl2.SDL_GL_DOUBLEBUFFER: 1,
+            sdl2.SDL_GL_DEPTH_SIZE: 24,
+        }
+        for attr, value in gl_attributes.items():
+            if sdl2.SDL_GL_SetAttribute(attr, value) != 0:
+                raise_sdl_err("setting OpenGL attributes")
+        self.gl_context = sdl2.SDL_GL_CreateContext(self.window.window)
+        if not self.gl_context:
+            raise_sdl_err("creating OpenGL context")
+        log.info("OpenGL version: %s", gl.glGetString(gl.GL_VERSION).decode())
+        log.info("OpenGL renderer: %s", gl.glGetString(gl.GL_RENDERER).decode())
+        # Number of vertex attributes supported
+        log.debug("GL_MAX_VERTEX_ATTRIBS: %s", gl.glGetInteger(gl.GL_MAX_VERTEX_ATTRIBS))
+
+    def begin_frame(self):
+        self.commands.reset()
+        self.commands.clear(colors.BLACK)
+
+    def draw_starfield(self, starfield):
+        starfield.draw(self.commands)
+
+    def draw_text_line(self, text_line):
+        text_line.render(self.commands)
+
+    def glyph_atlas(self, font_name, page=None):
+        key = (font_name, page)
+        atlas = self.atlases.get(key)
+        if atlas is None:
+            if page is not None:
+                glyph_pages = self.font_loader.get_glyph_pages(font_name)
+                width, height = glyph_pages.width, glyph_pages.height
+                pixels = build_glyph_atlas(glyph_pages.page(page), width, height)
+            else:
+                if font_name not in self.font_loader.font_data:
+                    self.font_loader.load_font(font_name)
+                width, height, font_data = self.font_loader.font_data[font_name]
+                if font_data is None:
+                    pixels = render_glyph_atlas(
+                        self.font_loader, font_name, width, height
+                    )
+                else:
+                    pixels = build_glyph_atlas(font_data, width, height)
+            atlas = self.atlases[key] = GlyphAtlas(pixels, width, height)
+        return atlas
+
+    def sprite_atlas(self, source):
+        key = source.content_key()
+        atlas = self.sprite_atlases.get(key)
+        if atlas is None:
+            atlas = self.sprite_atlases[key] = SpriteAtlas(source)
+        return atlas
+
+    def surface_texture(self, surface, owner):
+        """
+        Texture of a widget surface, uploaded again if it was redrawn since.
+        """
+        address = surface_address(surface)
+        # A new surface may be allocated where a freed one was
+        contents = surface.contents
+        key = (address, contents.w, contents.h, contents.format.contents.format)
+        version = self.commands.surface_versions[address]
+        entry = self.surface_textures.get(key)
+        if entry is None:
+            entry = self.surface_textures[key] = SurfaceTexture(surface, owner)
+        if entry.version != version:
+            entry.upload(surface)
+            entry.version = version
+        return entry.texture
+
+    def release_owner(self, owner):
+        self.commands.release_owner(owner)
+        for key, entry in list(self.surface_textures.items()):
+            if entry.owner is owner:
+                del self.surface_textures[key]
+                entry.destroy()
+            else:
+                # The versions of the surfaces left may have been forgotten
+                entry.version = None
+
+    def set_viewport(self):
+        # Letterbox the logical size into the drawable, like SDL_RenderSetLogicalSize
+        drawable_width, drawable_height = ctypes.c_int(), ctypes.c_int()
+        sdl2.SDL_GL_GetDrawableSize(self.window.window, drawable_width, drawable_height)
+        drawable_width, drawable_height = drawable_width.value, drawable_height.value
+        scale = min(drawable_width / self.width, drawable_height / self.height)
+        width, height = int(self.width * scale), int(self.height * scale)
+        gl.glViewport(
+            (drawable_width - width) // 2, (drawable_height - height) // 2, width, height
+        )
+
+    def draw_vertices(self, primitive, vertices, mode, texture=None):
+        if not len(vertices):
+            return
+        if texture is not None:
+            gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+        gl.glUniform1i(self.mode_location, mode)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, vertices.nbytes, vertices, gl.GL_STREAM_DRAW)
+        gl.glDrawArrays(primitive, 0, len(vertices))
+
+    def draw_points(self, points, color):
+        vertices = np.zeros((len(points), VERTEX_FLOATS), np.float32)
+        # Offset by half a pixel to hit the pixel centers, like SDL does
+        vertices[:, :2] = np.asarray(points, np.float32).reshape(-1, 2) + 0.5
+        vertices[:, 4:] = normalized_color(color)
+        self.draw_vertices(gl.GL_POINTS, vertices, MODE_FLAT)
+
+    def draw_texts(self, font_name, texts, color):
+        """
+        Draw strings of a font, as bytes or Unicode strings, with one draw call per
+        glyph atlas.
+        """
+        glyph_pages = self.font_loader.get_glyph_pages(font_name)
+        # {page: [(x, y, bytes)]}, see glyph_atlas
+        runs = {}
+        unicode_texts = []
+        for x, y, text in texts:
+            if isinstance(text, str):
+                if glyph_pages:
+                    unicode_texts.append((x, y, text))
+                    continue
+                text = text.encode("latin-1", "replace")
+            runs.setdefault(None, []).append((x, y, text))
+        if unicode_texts:
+            for page, page_runs in glyph_pages.runs_by_page(unicode_texts).items():
+                runs.setdefault(page, []).extend(page_runs)
+        color = normalized_color(color)
+        for page, page_texts in runs.items():
+            atlas = self.glyph_atlas(font_name, page)
+            vertices = atlas.text_vertices(page_texts, color)
+            self.draw_vertices(gl.GL_TRIANGLES, vertices, MODE_GLYPHS, atlas.texture)
+
+    def execute_batch(self, state, args):
+        op = state[0]
+        if op == OP_CLEAR:
+            # Like SDL_RenderClear, clears replace the pixels
+            gl.glDisable(gl.GL_BLEND)
+            rect = (0, 0, self.width, self.height)
+            vertices = quad_vertices(rect, normalized_color(state[1]))
+            self.draw_vertices(gl.GL_TRIANGLES, vertices, MODE_FLAT)
+            gl.glEnable(gl.GL_BLEND)
+        elif op == OP_BLIT:
+            for source, surface in args:
+                sdl2.SDL_BlitSurface(source, None, surface, None)
+        elif op == OP_POINTS:
+            self.draw_points([point for points in args for point in points], state[1])
+        elif op == OP_LINE:
+            vertices = np.zeros((len(args) * 2, VERTEX_FLOATS), np.float32)
+            vertices[:, :2] = np.asarray(args, np.float32).reshape(-1, 2) + 0.5
+            vertices[:, 4:] = normalized_color(state[1])
+            self.draw_vertices(gl.GL_LINES, vertices, MODE_FLAT)
+            # OpenGL leaves out the last pixel of a line, SDL draws it
+            self.draw_vertices(gl.GL_POINTS, vertices[1::2], MODE_FLAT)
+        elif op == OP_RECT:
+            # Outlines as four quads that do not overlap at the corners
+            rects = []
+            for x, y, w, h in args:
+                side = max(h - 2, 0)
+                rects += [
+                    (x, y, w, 1),
+                    (x, y + h - 1, w, 1),
+                    (x, y + 1, 1, side),
+                    (x + w - 1, y + 1, 1, side),
+                ]
+            vertices = quad_vertices(rects, normalized_color(state[1]))
+            self.draw_vertices(gl.GL_TRIANGLES, vertices, MODE_FLAT)
+        elif op == OP_BOX:
+            rects = [rect_from_corners(*corners) for corners in args]
+            vertices = quad_vertices(rects, normalized_color(state[1]))
+            self.draw_vertices(gl.GL_TRIANGLES, vertices, MODE_FLAT)
+        elif op == OP_TEXT:
+            _, font_name, color = state
+            self.draw_texts(font_name, args, color)
+        elif op == OP_COPY:
+            source = args[0][0]
+            if not isinstance(source, TextLine):
+                raise TypeError(f"Copies of {type(source).__name__} are not supported")
+            # Text lines are drawn from the glyph atlas rather than from a texture
+            texts = [(rect[0], rect[1], source.text) for _, rect, _ in args]
+            self.draw_texts(source.font, texts, source.fg)
+        elif op == OP_SPRITES:
+            atlas = self.sprite_atlas(args[0][0])
+            sprites = [sprite for _, batch, _ in args for sprite in batch]
+            vertices = atlas.sprite_vertices(state[2], sprites)
+            self.draw_vertices(gl.GL_TRIANGLES, vertices, MODE_GLYPHS, atlas.texture)
+        elif op == OP_COPY_SURFACE:
+            surface, _, owner = args[0]
+            texture = self.surface_texture(surface, owner)
+            rects = [rect for _, rect, _ in args]
+            vertices = quad_vertices(rects, (1, 1, 1, 1), (0, 0, 1, 1))
+            self.draw_vertices(gl.GL_TRIANGLES, vertices, MODE_TEXTURE, texture)
+
+    def present(self):
+        commands = self.commands
+        commands.sort()
+        # Widget surfaces are only redrawn, and uploaded, when their commands change
+        changed_targets, _ = self.targets.update(commands)
+        commands.execute_offscreen(changed_targets)
+        gl.glClearColor(0, 0, 0, 1)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        self.set_viewport()
+        gl.glUseProgram(self.program)
+        gl.glUniform2f(self.viewport_location, self.width, self.height)
+        gl.glBindVertexArray(self.vao)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        for batch, group in itertools.groupby(commands.screen_commands(), key=batch_key):
+            args = [command[5] for command in group]
+            self.execute_batch(batch[3], args)
+            commands.executed += len(args)
+            commands.batches += 1
+        self.drawn_ns = time.perf_counter_ns()
+        sdl2.SDL_GL_SwapWindow(self.window.window)
+        return True
+
+    def invalidate(self):
+        pass
+
+    def set_render_scale(self, scale):
+        # Frames are drawn at the window resolution
+        pass
+
+    def destroy(self):
+        log.info(f"Texture cache: {self.textures.summary()}")
+        self.textures.clear()
+        for atlas in self.atlases.values():
+            atlas.destroy()
+        for atlas in self.sprite_atlases.values():
+            atlas.destroy()
+        for entry in self.surface_textures.values():
+            entry.destroy()
+        gl.glDeleteBuffers(1, [self.vbo])
+        gl.glDeleteVertexArrays(1, [self.vao])
+        gl.glDeleteProgram(self.program)
+        sdl2.SDL_GL_DeleteContext(self.gl_context)
@@ -0,0 +1,120 @@
+import logging
+from collections import OrderedDict
+
+from sdl2 import sdlgfx
+
+log = logging.getLogger(__name__)
+
+PAGE_SIZE = 256
+
+
+def rasterize_page(font, page, width, height):
+    """
+    Rasterize 256 codepoints of a bdfparser font into SDL_gfx font data: one glyph
+    after the other, each row padded to whole bytes with the leftmost pixel in the
+    most significant bit. Missing glyphs are left blank.
+    """
+    row_bytes = (width + 7) // 8
+    padding = row_bytes * 8 - width
+    blank = bytes(row_bytes * height)
+    data = bytearray()
+    first = page * PAGE_SIZE
+    for codepoint in range(first, first + PAGE_SIZE):
+        if codepoint not in font.glyphs:
+            data += blank
+            continue
+        # Draw the glyph in the font bounding box, so that all cells line up
+        glyph = font.glyphbycp(codepoint)
+        for row in glyph.draw(0).todata(5)[:height]:
+            data += (row << padding).to_bytes(row_bytes, "big")
+    return bytes(data)
+
+
+class GlyphPages:
+    """
+    Unicode glyphs of a (possibly very large) BDF font, rasterized on demand.
+
+    Codepoints are grouped in pages of 256, each one rasterized the first time one
+    of its codepoints is drawn. Pages are kept in LRU order and the least recently
+    used ones are evicted when the cache goes over its memory budget.
+    """
+
+    def __init__(self, path, budget_bytes=1 << 20):
+        from bdfparser import Font
+
+        self.font = Font(str(path))
+        self.width = self.font.headers["fbbx"]
+        self.height = self.font.headers["fbby"]
+        self.page_bytes = (self.width + 7) // 8 * self.height * PAGE_SIZE
+        self.budget_bytes = max(budget_bytes, self.page_bytes)
+        self.pages = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        log.info(
+            f"Loaded {len(self.font.glyphs)} glyphs from {path} "
+            f"({self.width}x{self.height})"
+        )
+
+    @property
+    def bytes_resident(self):
+        return len(self.pages) * self.page_bytes
+
+    def page(self, index):
+        data = self.pages.get(index)
+        if data is not None:
+            self.hits += 1
+            self.pages.move_to_end(index)
+            return data
+        self.misses += 1
+        data = rasterize_page(self.font, index, self.width, self.height)
+        self.pages[index] = data
+        while self.bytes_resident > self.budget_bytes:
+            evicted, _ = self.pages.popitem(last=False)
+            self.evictions += 1
+            log.debug("Evicted glyph page %#x", evicted)
+        return data
+
+    def runs_by_page(self, texts):
+        """
+        Split strings, as (x, y, text), into runs of consecutive characters that
+        share a page. Returns {page index: [(x, y, run)]}, with the runs as bytes of
+        the codepoints within the page, in the order the pages are first used.
+        """
+        runs = {}
+        for x, y, text in texts:
+            start = 0
+            while start < len(text):
+                index = ord(text[start]) // PAGE_SIZE
+                end = start + 1
+                while end < len(text) and ord(text[end]) // PAGE_SIZE == index:
+                    end += 1
+                run = bytes(ord(char) % PAGE_SIZE for char in text[start:end])
+                runs.setdefault(index, []).append((x + start * self.width, y, run))
+                start = end
+        return runs
+
+    def draw_text(self, sdlrenderer, x, y, text, color):
+        self.draw_texts(sdlrenderer, [(x, y, text)], color)
+
+    def draw_texts(self, sdlrenderer, texts, color):
+        """
+        Draw strings of the same color. Setting the SDL_gfx font drops all the glyph
+        textures it cached, so the runs of consecutive characters that share a page
+        are grouped by page over all the strings, and each page is set only once.
+        """
+        for index, page_runs in self.runs_by_page(texts).items():
+            sdlgfx.gfxPrimitivesSetFont(self.page(index), self.width, self.height)
+            for run_x, run_y, run in page_runs:
+                if b"\0" in run:
+                    # SDL_gfx strings are NUL terminated, draw those runs char by char
+                    for i, char in enumerate(run):
+                        sdlgfx.characterRGBA(
+                            sdlrenderer,
+                            run_x + i * self.width,
+                            run_y,
+                            bytes([char]),
+                            *color,
+                        )
+                else:
+                    sdlgfx.stringRGBA(sdlrenderer, run_x, run_y, run, *color)
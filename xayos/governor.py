@@ -0,0 +1,111 @@
+"""
+Adaptive quality.
+
+Quality levels set how much the shell draws: the number of stars, the detail of
+the menu model and whether it is drawn as a wireframe or a point cloud, how often
+animations advance (every frame, or every few frames, which leaves the frames in
+between without damage), and the scale of the composited frame.
+
+The quality governor watches the time that presented frames take to draw, up to
+presenting them (which may wait for vsync), against the frame budget, over windows
+of frames. A window whose 90th percentile is over budget steps the level
+down right away. Stepping up takes several windows in a row well within budget,
+and twice as many after each step down, so that the level settles instead of
+going back and forth between two levels.
+"""
+
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class QualityLevel:
+    __slots__ = ["name", "stars", "mesh", "wireframe", "animation_step", "render_scale"]
+
+    def __init__(self, name, stars, mesh, wireframe, animation_step, render_scale):
+        self.name = name
+        self.stars = stars
+        # Segments and rings of the menu sphere
+        self.mesh = mesh
+        self.wireframe = wireframe
+        # Animations advance every animation_step frames, by as many steps
+        self.animation_step = animation_step
+        self.render_scale = render_scale
+
+
+QUALITY_LEVELS = (
+    QualityLevel("low", 100, 8, False, 3, 0.5),
+    QualityLevel("medium", 200, 16, False, 2, 0.75),
+    QualityLevel("high", 400, 24, False, 1, 1.0),
+    QualityLevel("ultra", 800, 32, True, 1, 1.0),
+)
+DEFAULT_QUALITY = "high"
+
+
+def quality_level(name):
+    for level in QUALITY_LEVELS:
+        if level.name == name:
+            return level
+    raise ValueError(f"Unknown quality level: {name}")
+
+
+class QualityGovernor:
+    def __init__(
+        self,
+        target_ms,
+        level=DEFAULT_QUALITY,
+        window=30,
+        headroom=0.6,
+        up_windows=4,
+        max_up_windows=64,
+    ):
+        self.target_ms = target_ms
+        self.index = QUALITY_LEVELS.index(quality_level(level))
+        self.window = window
+        # Frames have headroom under this fraction of the budget
+        self.headroom = headroom
+        # Windows with headroom in a row needed to step up
+        self.up_windows = up_windows
+        self.max_up_windows = max_up_windows
+        self.calm_windows = 0
+        self.samples = []
+        self.changes = 0
+
+    @property
+    def level(self):
+        return QUALITY_LEVELS[self.index]
+
+    def add_frame(self, frame_ms):
+        """
+        Record the time of a frame. Returns the new level when it changes.
+        """
+        self.samples.append(frame_ms)
+        if len(self.samples) < self.window:
+            return None
+        samples = sorted(self.samples)
+        self.samples.clear()
+        p90 = samples[len(samples) * 9 // 10]
+        if p90 > self.target_ms:
+            self.calm_windows = 0
+            if self.index == 0:
+                return None
+            # Stepping back up takes longer after each step down
+            self.up_windows = min(self.up_windows * 2, self.max_up_windows)
+            return self.step(-1, p90)
+        if p90 > self.target_ms * self.headroom or self.index == len(QUALITY_LEVELS) - 1:
+            self.calm_windows = 0
+            return None
+        self.calm_windows += 1
+        if self.calm_windows < self.up_windows:
+            return None
+        self.calm_windows = 0
+        return self.step(1, p90)
+
+    def step(self, direction, p90):
+        self.index += direction
+        self.changes += 1
+        log.info(
+            f"Quality {'up' if direction > 0 else 'down'} to {self.level.name}, "
+            f"90% of frames in {p90:.1f} ms for a budget of {self.target_ms:.1f} ms"
+        )
+        return self.level
@@ -7,6 +7,8 @@ from xayos.gamepad import (
     BUTTON_TRIGGERLEFT,
     BUTTON_TRIGGERRIGHT,
     BUTTON_LEFTSHOULDER,
+    BUTTON_RIGHTSHOULDER,
+    BUTTON_BACK,
     BUTTON_A,
     BUTTON_X,
     BUTTON_Y,
@@ -16,6 +18,7 @@ from xayos.gamepad import (
     BUTTON_DPAD_UP,
     BUTTON_DPAD_RIGHT,
 )
+from xayos.predict import LETTER_GROUPS, PredictiveDictionary
 
 log = logging.getLogger(__name__)
 
@@ -98,7 +101,7 @@ class TextController:
         BUTTON_DPAD_UP: L8_KEYS,
     }
 
-    def __init__(self, gamepad, widget):
+    def __init__(self, gamepad, widget, dictionary=None):
         self.gamepad = gamepad
         # self.gamepad.set_callbacks(
         #     on_button_press=self.on_button_press,
@@ -110,11 +113,36 @@ class TextController:
         self.uppercase = False
         self.caps_lock = False
         self.status_cycle = ""
+        self.status_key = None
+        self.status_line = ""
+        # Predictive mode: one press per letter, words are picked from a dictionary
+        self.dictionary = dictionary or PredictiveDictionary()
+        self.predictive = False
+        self.groups = []
+        self.candidates = []
+        self.candidate_index = 0
 
     def get_status_line(self):
+        # The status line is rebuilt only when something it shows has changed
+        key = (
+            self.status_cycle,
+            self.uppercase,
+            self.predictive,
+            self.dictionary.loaded,
+            self.gamepad.is_pressed(BUTTON_TRIGGERRIGHT),
+            self.gamepad.is_pressed(BUTTON_TRIGGERLEFT),
+        )
+        if key != self.status_key:
+            self.status_key = key
+            self.status_line = self.build_status_line()
+        return self.status_line
+
+    def build_status_line(self):
         # Help line
         if not self.status_cycle:
             help_line = ""
+            if self.predictive:
+                help_line = "T9 " if self.dictionary.loaded else "T9... "
             cycles = self.S_CYCLES
             if self.gamepad.is_pressed(BUTTON_TRIGGERRIGHT):
                 cycles = [("New Line",), ("Space",), ("Delete Line",), ("Backspace",)]
@@ -150,7 +178,13 @@ class TextController:
     def on_controller_button_down(self, button):
         if button == BUTTON_LEFTSHOULDER:
             self.toggle_uppercase()
-            log.debug(f"Uppercase: {self.uppercase}")
+            log.debug("Uppercase: %s", self.uppercase)
+            return
+        if button == BUTTON_BACK:
+            self.toggle_predictive()
+            return
+        if button == BUTTON_RIGHTSHOULDER:
+            self.next_candidate()
             return
 
         if self.gamepad.is_pressed(BUTTON_TRIGGERRIGHT):
@@ -160,6 +194,8 @@ class TextController:
             elif button == BUTTON_X:
                 self.flush_char()
                 self.active_widget.put_char(" ")
+            elif button == BUTTON_B and self.groups:
+                self.remove_group()
             elif button == BUTTON_B:
                 self.flush_char()
                 self.active_widget.backspace()
@@ -167,20 +203,23 @@ class TextController:
                 self.flush_char()
                 self.active_widget.delete()
             else:
-                log.debug(f"Unhandled button: {button}")
+                log.debug("Unhandled button: %s", button)
             return
         if self.gamepad.is_pressed(BUTTON_TRIGGERLEFT):
             mapping = self.L_MAPPING
             if button in mapping:
                 self.cycle(chars=mapping[button])
             else:
-                log.debug(f"Unhandled button: {button}")
+                log.debug("Unhandled button: %s", button)
             return
         mapping = self.S_MAPPING
-        if button in mapping:
+        # Until the dictionary is loaded, predictive mode falls back to multi-tap
+        if button in mapping and self.predictive and self.dictionary.loaded:
+            self.add_group(self.S_CYCLES.index(mapping[button]))
+        elif button in mapping:
             self.cycle(chars=mapping[button])
         else:
-            log.debug(f"Unhandled button: {button}")
+            log.debug("Unhandled button: %s", button)
 
     def on_controller_button_up(self, button):
         if button == sdl2.SDL_CONTROLLER_BUTTON_LEFTSHOULDER:
@@ -209,6 +248,7 @@ class TextController:
                 self.flush_char()
 
     def flush_char(self):
+        self.flush_word()
         if self.current_char:
             current_char = self.current_char
             if self.uppercase:
@@ -241,6 +281,7 @@ class TextController:
         self.cycled_elapsed = 0
 
     def cycle(self, chars):
+        self.flush_word()
         if self.current_char is None:
             pos = 0
         elif self.current_char in chars:
@@ -251,7 +292,7 @@ class TextController:
             pos = 0
         self.current_char = chars[pos]
         self.cycled_elapsed = 0
-        log.debug(f"Cycling char: {self.current_char}")
+        log.debug("Cycling char: %s", self.current_char)
         if self.active_widget:
             self.update_cursor_char()
         self.update_status_cycle(chars)
@@ -266,3 +307,70 @@ class TextController:
         self.status_cycle = f" ".join(
             ((f"[{c}]" if i == pos else c) for i, c in enumerate(cycle_chars))
         )
+
+    def toggle_predictive(self):
+        self.flush_char()
+        self.predictive = not self.predictive
+        log.debug("Predictive mode: %s", self.predictive)
+        if self.predictive:
+            self.learn_text()
+
+    def dictionary_loaded(self):
+        if self.predictive:
+            self.learn_text()
+
+    def learn_text(self):
+        # Words already in the buffer are likely to be typed again
+        if self.dictionary.loaded:
+            self.dictionary.learn_text(self.active_widget.get_text())
+
+    def add_group(self, group):
+        self.groups.append(group)
+        self.update_candidates()
+
+    def remove_group(self):
+        self.groups.pop()
+        self.update_candidates()
+
+    def update_candidates(self):
+        self.candidate_index = 0
+        if not self.groups:
+            self.candidates = []
+            self.status_cycle = ""
+            return
+        self.candidates = self.dictionary.candidates(self.groups)
+        if not self.candidates:
+            # Unknown word, fall back to the first letter of each group
+            self.candidates = ["".join(LETTER_GROUPS[group][0] for group in self.groups)]
+        self.update_status_candidates()
+
+    def next_candidate(self):
+        if self.candidates:
+            self.candidate_index = (self.candidate_index + 1) % len(self.candidates)
+            self.update_status_candidates()
+
+    def update_status_candidates(self):
+        self.status_cycle = " ".join(
+            (f"[{word}]" if i == self.candidate_index else word)
+            for i, word in enumerate(self.candidates)
+        )
+
+    def flush_word(self):
+        if not self.groups:
+            return
+        word = self.candidates[self.candidate_index]
+        self.dictionary.learn(word)
+        if self.caps_lock:
+            word = word.upper()
+        elif self.uppercase:
+            word = word.capitalize()
+        for char in word:
+            self.active_widget.put_char(char)
+        self.groups.clear()
+        self.candidates = []
+        self.candidate_index = 0
+        if self.gamepad.is_pressed(BUTTON_LEFTSHOULDER):
+            self.caps_lock = True
+        elif not self.caps_lock:
+            self.disable_uppercase()
+        self.update_status_cycle()
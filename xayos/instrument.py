@@ -0,0 +1,202 @@
+"""
+Draw call instrumentation.
+
+Counting proxies for sdl2.ext.Renderer and for the SDL, SDL_gfx and OpenGL entry
+points that xayos draws with. Once installed, the modules that draw see the
+proxies instead of sdl2, sdlgfx and OpenGL.GL, and every call is counted in the
+frame telemetry (DrawStats) with the pixels it covers, the bytes it uploads and the
+textures it creates. The command buffer wraps the renderers it executes on, and
+sets the source of each batch it executes.
+"""
+
+import ctypes
+import logging
+import sys
+
+import sdl2
+
+log = logging.getLogger(__name__)
+
+# Modules that draw, and the names under which they import the drawing APIs
+INSTRUMENTED_MODULES = ("commands", "compositor", "text", "fonts", "glyphs", "glbackend")
+
+
+def rect_area(rect):
+    if rect is None:
+        return 0
+    return rect.w * rect.h
+
+
+def line_length(x1, y1, x2, y2):
+    return max(abs(x2 - x1), abs(y2 - y1)) + 1
+
+
+def renderer_area(sdlrenderer):
+    width, height = ctypes.c_int(), ctypes.c_int()
+    sdl2.SDL_GetRendererOutputSize(sdlrenderer, width, height)
+    return width.value * height.value
+
+
+def surface_area(surface):
+    if not isinstance(surface, sdl2.SDL_Surface):
+        surface = surface.contents
+    return surface.w * surface.h
+
+
+def texture_height(texture):
+    height = ctypes.c_int()
+    sdl2.SDL_QueryTexture(texture, None, None, None, height)
+    return height.value
+
+
+class CountingModule:
+    """
+    Proxy of a module, whose counted functions report each call.
+    """
+
+    def __init__(self, module, stats, counters):
+        self._module = module
+        self._stats = stats
+        self._counters = counters
+
+    def __getattr__(self, name):
+        value = getattr(self._module, name)
+        counter = self._counters.get(name)
+        if counter is not None:
+            stats, function = self._stats, value
+
+            def counted(*args):
+                stats.count(name, *counter(*args))
+                return function(*args)
+
+            value = counted
+        # Cached, so that later lookups skip __getattr__
+        setattr(self, name, value)
+        return value
+
+
+class CountingRenderer:
+    """
+    Proxy of an sdl2.ext.Renderer, counting its drawing methods.
+    """
+
+    def __init__(self, renderer, stats):
+        self._renderer = renderer
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._renderer, name)
+
+    def clear(self, color=None):
+        self._stats.count("Renderer.clear", renderer_area(self._renderer.sdlrenderer))
+        return self._renderer.clear(color)
+
+    def draw_point(self, points, color=None):
+        self._stats.count("Renderer.draw_point", len(points))
+        return self._renderer.draw_point(points, color)
+
+    def draw_line(self, points, color=None):
+        self._stats.count("Renderer.draw_line", len(points))
+        return self._renderer.draw_line(points, color)
+
+    def draw_rect(self, rects, color=None):
+        pixels = sum(2 * (w + h) for _, _, w, h in rects)
+        self._stats.count("Renderer.draw_rect", pixels)
+        return self._renderer.draw_rect(rects, color)
+
+    def fill(self, rects, color=None):
+        pixels = sum(w * h for _, _, w, h in rects)
+        self._stats.count("Renderer.fill", pixels)
+        return self._renderer.fill(rects, color)
+
+    def copy(self, texture, srcrect=None, dstrect=None, *args, **kwargs):
+        pixels = dstrect[2] * dstrect[3] if dstrect else 0
+        self._stats.count("Renderer.copy", pixels)
+        return self._renderer.copy(texture, srcrect, dstrect, *args, **kwargs)
+
+
+class Instrumentation:
+    def __init__(self, stats):
+        self.stats = stats
+        self.installed = []
+        # Character size of the current SDL_gfx font
+        self.char_size = (8, 8)
+
+    def sdl_counters(self):
+        return {
+            "SDL_RenderCopy": lambda r, texture, src, dst: (rect_area(dst),),
+            "SDL_RenderGeometry": lambda r, texture, vertices, count, *indices: (),
+            "SDL_RenderDrawLine": lambda r, *line: (line_length(*line),),
+            "SDL_RenderFillRect": lambda r, rect: (rect_area(rect),),
+            "SDL_RenderClear": lambda r: (renderer_area(r),),
+            "SDL_BlitSurface": lambda src, srcrect, dst, dstrect: (
+                rect_area(srcrect) if srcrect else surface_area(src),
+            ),
+            "SDL_CreateTexture": lambda *args: (0, 0, 1),
+            "SDL_CreateTextureFromSurface": lambda r, surface: (
+                0,
+                surface.contents.h * surface.contents.pitch,
+                1,
+            ),
+            "SDL_UpdateTexture": lambda texture, rect, pixels, pitch: (
+                0,
+                pitch * (rect.h if rect else texture_height(texture)),
+            ),
+        }
+
+    def gfx_counters(self):
+        def set_font(font_data, width, height):
+            self.char_size = (width, height) if font_data else (8, 8)
+            return ()
+
+        def text_pixels(r, x, y, text, *color):
+            return (len(text) * self.char_size[0] * self.char_size[1],)
+
+        return {
+            "stringRGBA": text_pixels,
+            "characterRGBA": lambda *args: (self.char_size[0] * self.char_size[1],),
+            "boxRGBA": lambda r, x1, y1, x2, y2, *color: (
+                (abs(x2 - x1) + 1) * (abs(y2 - y1) + 1),
+            ),
+            "pixelRGBA": lambda *args: (1,),
+            "gfxPrimitivesSetFont": set_font,
+        }
+
+    def gl_counters(self):
+        return {
+            "glDrawArrays": lambda mode, first, count: (),
+            "glBufferData": lambda target, size, data, usage: (0, size),
+            "glTexSubImage2D": lambda target, level, x, y, w, h, *args: (0, w * h * 4),
+        }
+
+    def install(self):
+        """
+        Replace the drawing APIs of the modules that draw by counting proxies. Only
+        modules already imported are instrumented, e.g. not the OpenGL backend when
+        the SDL one is used.
+        """
+        counters = {
+            "sdl2": self.sdl_counters(),
+            "sdlgfx": self.gfx_counters(),
+            "gl": self.gl_counters(),
+        }
+        package = __name__.rpartition(".")[0]
+        for module_name in INSTRUMENTED_MODULES:
+            module = sys.modules.get(f"{package}.{module_name}")
+            if module is None:
+                continue
+            for name, module_counters in counters.items():
+                original = module.__dict__.get(name)
+                if original is not None:
+                    proxy = CountingModule(original, self.stats, module_counters)
+                    setattr(module, name, proxy)
+                    self.installed.append((module, name, original))
+        log.info("Draw call instrumentation installed")
+
+    def uninstall(self):
+        for module, name, original in self.installed:
+            setattr(module, name, original)
+        self.installed.clear()
+
+    def wrap(self, renderer):
+        return CountingRenderer(renderer, self.stats)
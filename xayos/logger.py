@@ -1,7 +1,32 @@
+"""
+Logging setup.
+
+Records are written by a listener thread, behind a queue, so that a slow terminal
+or serial console never stalls the frame loop. The flight recorder keeps the last
+debug records in memory, unformatted, and writes them to disk when the shell
+crashes or on demand, from a writer thread: full debug context after a failure,
+without paying for debug output during normal runs. Hot paths should log with
+%-style arguments, which are only formatted when a record is written.
+"""
+
+import atexit
+import copy
 import logging
+import logging.handlers
 import json
+import os
+import queue
+import signal
 import sys
+import threading
+import time
 import warnings
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+# Flight recorder of the process, once logging is set up
+flight_recorder = None
 
 
 class JsonFormatter(logging.Formatter):
@@ -12,14 +37,16 @@ class JsonFormatter(logging.Formatter):
             "level": record.levelname,
             "pathname": record.pathname,
             "lineno": record.lineno,
-            "msg": record.msg,
-            "args": record.args,
-            "exc_info": record.exc_info,
+            "msg": record.getMessage(),
+            "exc_info": (
+                self.formatException(record.exc_info) if record.exc_info else None
+            ),
             "func": record.funcName,
+            "thread": record.threadName,
             "time": self.formatTime(record, self.datefmt),
         }
         # Serialize the dictionary to a JSON-formatted string
-        return json.dumps(record_dict)
+        return json.dumps(record_dict, default=str)
 
 
 class PrettyFormatter(logging.Formatter):
@@ -55,13 +82,144 @@ class PrettyFormatter(logging.Formatter):
         return super().format(record)
 
 
-def setup_logging(verbose: bool = False):
+# Arguments of these types cannot change once the logging call returns
+IMMUTABLE_ARGS = (str, bytes, int, float, type(None))
+
+
+def has_mutable_args(record):
+    args = record.args
+    if isinstance(args, dict):
+        args = args.values()
+    return bool(args) and not all(isinstance(arg, IMMUTABLE_ARGS) for arg in args)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves the formatting of records to the listener thread.
+    Messages are only merged with their arguments on the calling thread when some
+    of the arguments could change before the listener gets to them.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if has_mutable_args(record):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+class FlightRecorder(logging.Handler):
+    """
+    Ring buffer of the last records, which are only formatted when dumped. As for
+    the queue, messages are merged with their arguments when a record is kept if
+    some of the arguments could change by then.
+    """
+
+    def __init__(self, capacity=2000, directory="."):
+        super().__init__(logging.DEBUG)
+        self.records = deque(maxlen=capacity)
+        self.directory = directory
+        self.dumps = 0
+        self.setFormatter(JsonFormatter())
+
+    def emit(self, record):
+        if has_mutable_args(record):
+            # The record is shared with the other handlers
+            record = copy.copy(record)
+            try:
+                record.msg = record.getMessage()
+            except Exception:
+                self.handleError(record)
+                return
+            record.args = None
+        self.records.append(record)
+
+    def dump(self, reason="request", background=True):
+        """
+        Write the records, one JSON object per line, to a new file, by default from
+        another thread so that the frame loop goes on.
+        """
+        # The records are copied now, the ring keeps changing
+        records = list(self.records)
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        self.dumps += 1
+        path = os.path.join(
+            self.directory, f"flight-{timestamp}-{self.dumps}-{reason}.jsonl"
+        )
+
+        def write():
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w") as f:
+                for record in records:
+                    try:
+                        line = self.format(record)
+                    except Exception:
+                        self.handleError(record)
+                        continue
+                    f.write(line + "\n")
+            log.info(f"Flight recorder: {len(records)} records written to {path}")
+
+        if not background:
+            write()
+            return None
+        writer = threading.Thread(target=write, name="flight-recorder-writer")
+        writer.start()
+        return writer
+
+
+def dump_flight_recorder(reason="request", background=True):
+    if flight_recorder:
+        return flight_recorder.dump(reason, background)
+    return None
+
+
+def install_crash_hooks():
+    """
+    Dump the flight recorder on uncaught exceptions, and on SIGUSR1.
+    """
+    excepthook = sys.excepthook
+    thread_excepthook = threading.excepthook
+
+    def handle_exception(*exc_info):
+        log.critical("Uncaught exception", exc_info=exc_info)
+        dump_flight_recorder("crash", background=False)
+        excepthook(*exc_info)
+
+    def handle_thread_exception(args):
+        log.critical(
+            "Uncaught exception in thread %s",
+            args.thread.name if args.thread else "?",
+            exc_info=(args.exc_type, args.exc_value, args.exc_traceback),
+        )
+        dump_flight_recorder("crash", background=False)
+        thread_excepthook(args)
+
+    sys.excepthook = handle_exception
+    threading.excepthook = handle_thread_exception
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: dump_flight_recorder())
+
+
+def setup_logging(
+    verbose: bool = False,
+    log_file: str = None,
+    log_file_bytes: int = 10 << 20,
+    flight_records: int = 2000,
+    flight_dir: str = ".",
+):
+    """
+    Log to the console, and optionally to a rotating file of JSON lines, from a
+    listener thread. With a flight recorder, debug records are always kept in
+    memory, even when only info records are written.
+    """
+    global flight_recorder
+    level = logging.DEBUG if verbose else logging.INFO
     logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+    logger.setLevel(logging.DEBUG if verbose or flight_records else logging.INFO)
     logging.captureWarnings(True)
 
     console_handler = logging.StreamHandler(stream=sys.stdout)
-    console_handler.setLevel(logging.DEBUG if verbose else logging.INFO)
+    console_handler.setLevel(level)
     console_handler.setFormatter(
         PrettyFormatter(
             fmt=(
@@ -72,4 +230,25 @@ def setup_logging(verbose: bool = False):
             datefmt="%H:%M:%S",
         )
     )
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=log_file_bytes, backupCount=3
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    # Records below the level of the output are not even queued
+    queue_handler = LazyQueueHandler(queue.SimpleQueue())
+    queue_handler.setLevel(level)
+    listener = logging.handlers.QueueListener(
+        queue_handler.queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    logger.addHandler(queue_handler)
+
+    if flight_records:
+        flight_recorder = FlightRecorder(flight_records, flight_dir)
+        logger.addHandler(flight_recorder)
+        install_crash_hooks()
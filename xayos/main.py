@@ -1,19 +1,31 @@
 import argparse
+import importlib
 import logging
+import random
 import time
+from collections import OrderedDict
 from pathlib import Path
 
 import sdl2
 import sdl2.ext
-from sdl2.ext import raise_sdl_err
-from OpenGL import GL as gl
 
-from . import colors
+from . import assets, colors, startup, trace
+from .backend import GL_BACKEND, create_backend
+from .events import EventPump
 from .fonts import FontLoader
-from .gamepad import GamepadHandler, BUTTON_START, BUTTON_LEFTSTICK, BUTTON_RIGHTSTICK
+from .gamepad import (
+    GamepadHandler,
+    BUTTON_BACK,
+    BUTTON_GUIDE,
+    BUTTON_START,
+    BUTTON_LEFTSTICK,
+    BUTTON_RIGHTSTICK,
+)
 from .gamepad_viewer import GamepadViewer
+from .governor import DEFAULT_QUALITY, QUALITY_LEVELS, QualityGovernor, quality_level
 from .input import MenuController, TextController
-from .logger import setup_logging
+from .instrument import Instrumentation
+from .logger import dump_flight_recorder, setup_logging
 from .menu import Menu
 from .psudo3d import (
     generate_sphere,
@@ -22,15 +34,35 @@ from .psudo3d import (
     render_point_cloud,
     load_obj,
 )
+from .profiling import (
+    AllocationProfiler,
+    ProfileCapture,
+    freeze_heap,
+    set_gc_thresholds,
+)
+from .replay import InputRecorder, InputReplayer
 from .starfield import StarField
-from .starpad import StarpadApp
+from .tasks import BackgroundTicker, TaskScheduler
+from .telemetry import DrawStats, Histogram, InputLatencyTracker
 from .text import TextEditor, TextLine
-from .voyager import Voyager
+from .tracking import tracker
 
 log = logging.getLogger(__name__)
 
-HERE = Path(__file__).parent
-RESOURCES_PATH = HERE / "resources"
+CAPTURE_PATH = assets.cache_path("profiles")
+
+# Applications by menu entry: module and class, imported when first launched
+APPLICATIONS = {
+    "Starpad": ("starpad", "StarpadApp"),
+    "Voyager": ("voyager", "Voyager"),
+}
+
+
+def import_application(name):
+    module_name, class_name = APPLICATIONS[name]
+    with trace.span(f"{name}.import", "startup"):
+        module = importlib.import_module(f".{module_name}", __package__)
+    return getattr(module, class_name)
 
 
 class XayosRootApplication:
@@ -75,7 +107,14 @@ class XayosRootApplication:
             fg=colors.GREY,
         )
         # self.model_v, self.model_e = load_obj("teapot.obj")
-        self.model_v, self.model_e = generate_sphere(1.0, 24, 24)
+        self.mesh = 24
+        self.model_v, self.model_e = generate_sphere(1.0, self.mesh, self.mesh)
+        self.wireframe = False
+        # The model rotates every animation_step frames, by the time elapsed since it
+        # last did
+        self.animation_step = 1
+        self.animation_frame = 0
+        self.animation_ms = 0
         self.menu_controller = MenuController(self.menu)
         self.load_application = load_application
         self.rotate_speed = [0.01, 0.04, 0.03]
@@ -89,34 +128,52 @@ class XayosRootApplication:
             else:
                 self.load_application(self.menu.chosen)
                 self.menu.chosen = None
+        self.animation_ms += elapsed_ms
+        self.animation_frame += 1
+        if self.animation_frame % self.animation_step:
+            return
         x_rot, y_rot, z_rot = self.rotate_speed
-        x_angle_delta = x_rot * elapsed_ms
-        y_angle_delta = y_rot * elapsed_ms
-        z_angle_delta = z_rot * elapsed_ms
+        x_angle_delta = x_rot * self.animation_ms
+        y_angle_delta = y_rot * self.animation_ms
+        z_angle_delta = z_rot * self.animation_ms
+        self.animation_ms = 0
         self.model_v = rotate_model(
             self.model_v, x_angle_delta, y_angle_delta, z_angle_delta
         )
 
-    def render(self, renderer):
-        # render_wireframe(
-        #     renderer,
-        #     self.sphere_v,
-        #     self.sphere_e,
-        #     self.width // 3,
-        #     self.height,
-        #     scale=80,
-        #     color=colors.WHITE,
-        # )
-        render_point_cloud(
-            renderer,
-            self.model_v,
-            self.width,
-            self.height // 3,
-            scale=50,
-            color=colors.LIGHT_GREY_1,
-        )
-        self.menu.render(renderer)
-        self.status_line.render(renderer.sdlrenderer)
+    def render(self, commands):
+        if self.wireframe:
+            render_wireframe(
+                commands,
+                self.model_v,
+                self.model_e,
+                self.width,
+                self.height // 3,
+                scale=50,
+                color=colors.LIGHT_GREY_1,
+            )
+        else:
+            render_point_cloud(
+                commands,
+                self.model_v,
+                self.width,
+                self.height // 3,
+                scale=50,
+                color=colors.LIGHT_GREY_1,
+            )
+        self.menu.render(commands)
+        self.status_line.render(commands)
+
+    def destroy(self):
+        self.menu.destroy()
+
+    def set_quality(self, level):
+        if level.mesh != self.mesh:
+            self.mesh = level.mesh
+            self.model_v, self.model_e = generate_sphere(1.0, self.mesh, self.mesh)
+        self.wireframe = level.wireframe
+        self.animation_step = level.animation_step
+        self.animation_frame = 0
 
     def handle_input(self, button, state):
         self.menu_controller.handle_input(button, state)
@@ -136,24 +193,130 @@ class XayosLunarShell:
         software_renderer=False,
         vsync=False,
         fps_target=None,
+        task_budget_ms=4,
+        background_rate_hz=4,
+        background_budget_ms=1,
+        show_latency=False,
+        latency_path=None,
+        seed=None,
+        record_path=None,
+        replay_path=None,
+        uncapped=False,
+        full_redraw=False,
+        pause_stars=False,
+        texture_budget_mb=32,
+        texture_cap_mb=None,
+        suspend_budget_mb=16,
+        count_draws=False,
+        debug_leaks=False,
+        profile_allocations=False,
+        gc_freeze=False,
+        gc_thresholds=None,
+        capture_path=CAPTURE_PATH,
+        capture_frames=300,
+        capture_mode="cprofile",
+        trace_path=None,
+        startup_profile=False,
+        quality="auto",
     ):
         # SDL2 objects
         self.window = None
+        self.backend = None
         self.context = None
+        self.commands = None
         # Application configuration
         self.fps_target = fps_target
+        self.show_latency = show_latency
+        self.latency_path = latency_path
+        self.record_path = record_path
+        self.uncapped = uncapped
+        self.full_redraw = full_redraw
+        self.texture_budget = int(texture_budget_mb * 1024 * 1024)
+        self.texture_cap = int(texture_cap_mb * 1024 * 1024) if texture_cap_mb else None
+        self.draw_stats = DrawStats() if count_draws else None
+        # Leaked SDL resources raise instead of being reported
+        tracker.strict = debug_leaks
+        self.allocations = AllocationProfiler() if profile_allocations else None
+        self.gc_freeze = gc_freeze
+        # An application was released since the heap was last frozen
+        self.heap_released = False
+        self.gc_thresholds = gc_thresholds
+        # Profiles are captured on demand with the Back+L3 chord (F10+Left Alt)
+        self.capture = ProfileCapture(Path(capture_path), capture_frames, capture_mode)
+        # Trace events are written on exit, or with the Back+R3 chord (F10+Right Alt)
+        self.trace_path = trace_path
+        if trace_path:
+            trace.tracer.enable()
+        # Chords of the shell, whose buttons are not seen by the applications
+        self.chords = (
+            ((BUTTON_LEFTSTICK, BUTTON_RIGHTSTICK), self.toggle_fullscreen),
+            ((BUTTON_BACK, BUTTON_LEFTSTICK), self.capture.start),
+            ((BUTTON_BACK, BUTTON_RIGHTSTICK), self.dump_trace),
+            ((BUTTON_BACK, BUTTON_GUIDE), dump_flight_recorder),
+        )
+        # Timestamp of a Back press held back from the application, and buttons of
+        # chords whose release is not dispatched either
+        self.held_back = None
+        self.consumed = set()
+        self.startup_profile = startup_profile
+        self.phase = None
+        self.phase_start = 0
+        self.instrumentation = None
+        # Replays run with a fixed timestep, so that updates are deterministic
+        self.fixed_timestep_ms = 1000 / (fps_target or 60)
+        self.recorder = None
+        self.replayer = InputReplayer(replay_path) if replay_path else None
+        if self.replayer:
+            seed = self.replayer.seed
+        elif record_path and seed is None:
+            seed = random.randrange(2**31)
+        self.seed = seed
+        # The quality adapts to the frame times, unless fixed. Replays run at a fixed
+        # quality, the frame times would make them diverge
+        self.governor = None
+        if quality == "auto" and self.replayer:
+            log.info(f"Replaying at {DEFAULT_QUALITY} quality")
+            quality = DEFAULT_QUALITY
+        if quality == "auto":
+            self.governor = QualityGovernor(1000 / (fps_target or 60))
+            self.quality = self.governor.level
+        else:
+            self.quality = quality_level(quality)
         # Application state
         self.running = True
+        self.frame = 0
         self.fps_avg = 0
+        self.fps_shown = None
+        self.clock_second = None
         self.renderer_backend = renderer_backend or self.renderer_backend
         self.renderer_flags |= sdl2.SDL_RENDERER_SOFTWARE if software_renderer else 0
         self.renderer_flags |= sdl2.SDL_RENDERER_PRESENTVSYNC if vsync else 0
+        self.vsync = vsync
         # Application objects
         self.width, self.height = self.logical_size
         self.font_loader = FontLoader()
-        self.gamepad = GamepadHandler(on_input=self.handle_input)
-        self.gamepad_watcher = GamepadViewer(self.gamepad)
-        self.starfield = StarField(self.width, self.height)
+        self.gamepad = GamepadHandler(
+            on_input=self.handle_input, on_snapshot=self.handle_snapshot
+        )
+        self.scheduler = TaskScheduler(budget_ms=task_budget_ms)
+        self.ticker = BackgroundTicker(background_rate_hz, background_budget_ms)
+        self.event_pump = EventPump()
+        self.event_pump.register(sdl2.SDL_QUIT, self.handle_quit)
+        # The whole frame is redrawn after window changes or lost render targets
+        for event_type in (
+            sdl2.SDL_WINDOWEVENT,
+            sdl2.SDL_RENDER_TARGETS_RESET,
+            sdl2.SDL_RENDER_DEVICE_RESET,
+        ):
+            self.event_pump.register(event_type, self.handle_invalidate)
+        # Live input is ignored while replaying a recording
+        if not self.replayer:
+            self.event_pump.register_all(self.gamepad.event_handlers)
+            self.event_pump.register(sdl2.SDL_KEYDOWN, self.handle_key_down)
+        # Widgets and the first application are created once the window is shown
+        self.pause_stars = pause_stars
+        self.gamepad_watcher = None
+        self.starfield = None
         self.date_time = TextLine(
             self.font_loader,
             x=self.width - len("YYYY-mm-dd HH:MM:SS") * 9 - 10,
@@ -170,146 +333,462 @@ class XayosLunarShell:
             font_name="9x18B",
             fg=colors.DARK_GREY_2,
         )
+        self.latency = InputLatencyTracker()
+        self.latency_counter = TextLine(
+            self.font_loader,
+            x=self.width - len("lat 000/000/000 ms") * 9 - 10,
+            y=10 + 18,
+            text=b"",
+            font_name="9x18B",
+            fg=colors.DARK_GREY_2,
+        )
+        self.draw_counter = TextLine(
+            self.font_loader,
+            x=self.width - len("0000 calls 0000k px 0000 KiB") * 9 - 10,
+            y=10 + 36,
+            text=b"",
+            font_name="9x18B",
+            fg=colors.DARK_GREY_2,
+        )
+        # Current application, and the suspended ones by name, least recently used
+        # first, kept within a memory budget
         self.application = None
-        self.load_application("Voyager")
-        if not self.application:
-            self.load_root_application()
+        self.application_name = None
+        self.suspended = OrderedDict()
+        self.suspend_budget = int(suspend_budget_mb * 1024 * 1024)
 
     def init_sdl(self):
         sdl2.ext.init(joystick=True, controller=True)
         self.window = sdl2.ext.Window(
             self.window_title, size=self.window_size, flags=self.window_flags
         )
-        self.context = sdl2.ext.Renderer(
-            self.window, backend=self.renderer_backend, flags=self.renderer_flags
+        self.backend = create_backend(
+            self.window,
+            self.font_loader,
+            self.logical_size,
+            renderer_backend=self.renderer_backend,
+            renderer_flags=self.renderer_flags,
+            vsync=self.vsync,
+            compositor=not self.full_redraw,
+            texture_budget=self.texture_budget,
+            texture_cap=self.texture_cap,
         )
-        self.renderer_info(self.context.sdlrenderer)
+        # Applications and widgets record their drawing in the frame command buffer
+        self.context = self.backend.renderer
+        self.commands = self.backend.commands
+        if self.draw_stats:
+            self.instrumentation = Instrumentation(self.draw_stats)
+            self.instrumentation.install()
+            self.commands.instrumentation = self.instrumentation
         if self.fps_target:
             log.info(f"Frame rate limited to {self.fps_target} FPS")
-        sdl2.SDL_RenderSetLogicalSize(self.context.sdlrenderer, *self.logical_size)
         self.window.show()
 
-    def init_opengl(self):
-        gl_attributes = {
-            # Use OpenGL 3.3 (core context)
-            sdl2.SDL_GL_CONTEXT_MAJOR_VERSION: 3,
-            sdl2.SDL_GL_CONTEXT_MINOR_VERSION: 3,
-            sdl2.SDL_GL_CONTEXT_PROFILE_MASK: sdl2.SDL_GL_CONTEXT_PROFILE_CORE,
-            # Double buffering and depth buffer size
-            sdl2.SDL_GL_DOUBLEBUFFER: 1,
-            sdl2.SDL_GL_DEPTH_SIZE: 24,
-        }
-        for attr, value in gl_attributes.items():
-            if sdl2.SDL_GL_SetAttribute(attr, value) != 0:
-                raise_sdl_err("setting OpenGL attributes")
-        gl_context = sdl2.SDL_GL_CreateContext(self.window.window)
-        if not gl_context:
-            raise_sdl_err("creating OpenGL context")
-        log.info("OpenGL version: %s", gl.glGetString(gl.GL_VERSION).decode())
-        log.info("OpenGL renderer: %s", gl.glGetString(gl.GL_RENDERER).decode())
-        # Number of vertex attributes supported
-        log.debug("GL_MAX_VERTEX_ATTRIBS: %s", gl.glGetInteger(gl.GL_MAX_VERTEX_ATTRIBS))
-        return gl_context
+    def init_widgets(self):
+        self.gamepad_watcher = GamepadViewer(self.gamepad)
+        self.starfield = StarField(
+            self.width, self.height, num_stars=self.quality.stars, seed=self.seed
+        )
+        if self.pause_stars:
+            self.starfield.set_speed(0)
+        self.set_quality(self.quality)
 
     def main(self):
         self.init_sdl()
-        # self.gl_context = self.init_opengl()
+        startup.profile.mark("SDL and window")
         self.setup_gamepads()
+        startup.profile.mark("gamepads")
+        self.init_widgets()
+        startup.profile.mark("widgets")
+        # Applications are imported when they are first launched from the menu
+        self.load_root_application()
+        startup.profile.mark("application")
+        if self.gc_thresholds:
+            set_gc_thresholds(self.gc_thresholds)
+        # Everything loaded so far lives as long as the shell or the application
+        self.freeze_heap()
+        if self.allocations:
+            self.allocations.start()
 
         ticks = sdl2.SDL_GetTicks()
+        if self.record_path:
+            self.recorder = InputRecorder(self.record_path, self.seed, ticks)
+        frame_times = Histogram()
+        start_time = time.perf_counter()
         while self.running:
             # Calculate the elapsed time since the last frame
             last_ticks, ticks = ticks, sdl2.SDL_GetTicks()
             elapsed_ms = ticks - last_ticks
             self.calculate_fps(elapsed_ms)
+            if self.replayer:
+                elapsed_ms = self.fixed_timestep_ms
+            self.frame += 1
+            frame_start = time.perf_counter_ns()
 
-            # Handle events
-            events = sdl2.ext.get_events()
-            self.handle_events(events)
+            # Handle events, then dispatch the input of this frame in a single batch
+            self.enter_phase("events")
+            self.event_pump.pump()
+            if self.replayer:
+                self.replayer.inject(self.frame, self.gamepad, ticks)
+                if self.replayer.finished(self.frame):
+                    self.running = False
+            self.gamepad.flush()
 
-            # Update the date/time and FPS counter
-            self.date_time.set_text(time.strftime("%Y-%m-%d %H:%M:%S").encode())
-            self.fps_counter.set_text(f"{self.fps_avg:3.0f}".encode())
+            # Update the date/time and FPS counter, only when the shown values change
+            self.enter_phase("update")
+            self.update_clock()
+            self.update_fps_counter()
+            if self.show_latency and self.latency.updated:
+                self.latency_counter.set_text(self.latency.summary().encode())
+                self.latency.updated = False
             # Update the application
             if self.application:
                 if self.application.running:
-                    self.application.update(elapsed_ms)
+                    name = type(self.application).__name__
+                    with tracker.owning(self.application), trace.span(f"{name}.update"):
+                        self.application.update(elapsed_ms)
                 else:
                     self.unload_application()
+            # Tick suspended applications, then run background tasks, each within
+            # their budget
+            self.enter_phase("background")
+            self.ticker.run(self.suspended, ticks, self.tick_background)
+            self.enter_phase("tasks")
+            self.scheduler.run()
 
             # Render the scene
-            self.context.clear(color=colors.BLACK)
-            self.starfield.draw(self.context)
+            self.enter_phase("render")
+            self.backend.begin_frame()
+            with self.commands.drawing("StarField"):
+                self.backend.draw_starfield(self.starfield)
+            self.commands.next_layer()
             if self.application:
-                self.application.render(self.context)
-            self.gamepad_watcher.render(self.context)
-            self.date_time.render(self.context.sdlrenderer)
-            self.fps_counter.render(self.context.sdlrenderer)
+                # Textures recorded by the application are released when it unloads
+                name = type(self.application).__name__
+                with self.commands.drawing(name, owner=self.application):
+                    with tracker.owning(self.application), trace.span(f"{name}.render"):
+                        self.application.render(self.commands)
+            self.commands.next_layer()
+            with self.commands.drawing("GamepadViewer"):
+                self.gamepad_watcher.render(self.commands)
+            with self.commands.drawing("Overlay"):
+                self.backend.draw_text_line(self.date_time)
+                self.backend.draw_text_line(self.fps_counter)
+                if self.show_latency:
+                    self.backend.draw_text_line(self.latency_counter)
+                if self.draw_stats:
+                    self.backend.draw_text_line(self.draw_counter)
             # Update the window
-            self.context.present()
-            self.limit_frame_rate(ticks)
+            self.enter_phase("present")
+            presented = self.backend.present()
+            if self.draw_stats:
+                self.draw_stats.end_frame()
+                self.draw_counter.set_text(self.draw_stats.frame_summary().encode())
+            if self.allocations:
+                self.allocations.end_frame()
+            self.capture.end_frame()
+            self.enter_phase(None)
+            if self.frame == 1:
+                startup.profile.mark("first frame")
+                if self.startup_profile:
+                    startup.profile.finish()
+            if trace.tracer.enabled:
+                trace.tracer.complete(
+                    "frame",
+                    "frame",
+                    frame_start,
+                    time.perf_counter_ns(),
+                    {"frame": self.frame},
+                )
+            if not presented and self.vsync and not self.fps_target:
+                # Nothing changed, wait for the next refresh as vsync would have
+                sdl2.SDL_Delay(int(self.fixed_timestep_ms))
+            # The governor times the work of presented frames, not the waits for
+            # vsync of presenting or skipping them
+            if self.governor and presented:
+                frame_ms = (self.backend.drawn_ns - frame_start) / 1e6
+                level = self.governor.add_frame(frame_ms)
+                if level:
+                    self.set_quality(level)
+            # Inputs of skipped frames wait for the next frame that is presented
+            if presented:
+                self.latency.frame_presented(sdl2.SDL_GetTicks())
+            frame_times.add(sdl2.SDL_GetTicks() - ticks)
+            if not self.uncapped:
+                self.limit_frame_rate(ticks)
+
+        self.scheduler.close()
+        self.capture.close()
+        if self.governor and self.governor.changes:
+            log.info(
+                f"Quality: {self.governor.changes} changes, "
+                f"ended at {self.governor.level.name}"
+            )
+        if self.ticker.ticks:
+            log.info(f"Background: {self.ticker.summary()}")
+        if self.draw_stats:
+            log.info(f"Draw calls: {self.draw_stats.summary()}")
+        if self.allocations:
+            log.info(f"Allocations: {self.allocations.summary()}")
+            self.allocations.stop()
+        if self.application:
+            self.release_application(self.application)
+        while self.suspended:
+            self.release_application(self.suspended.popitem()[1])
+        self.backend.destroy()
+        if self.instrumentation:
+            self.instrumentation.uninstall()
+        self.gamepad_watcher.destroy()
+        tracker.release(None)
+        log.info(f"SDL resources: {tracker.summary()}")
+        if self.trace_path:
+            trace.tracer.write(self.trace_path, background=False)
+        if self.latency_path:
+            self.latency.dump(self.latency_path)
+        if self.recorder:
+            self.recorder.close(self.frame)
+        if self.replayer:
+            self.report_benchmark(frame_times, time.perf_counter() - start_time)
 
     def load_root_application(self):
-        assert self.application is None, "Application already loaded"
-        self.application = XayosRootApplication(
-            self.font_loader,
-            self.gamepad,
-            self.width,
-            self.height,
-            load_application=self.load_application,
+        self.switch_application(
+            "XayosRootApplication",
+            lambda: XayosRootApplication(
+                self.font_loader,
+                self.gamepad,
+                self.width,
+                self.height,
+                load_application=self.load_application,
+            ),
         )
 
     def load_application(self, app_name):
-        if app_name == "Starpad":
-            self.application = StarpadApp(self.font_loader, self.gamepad, 960, 540)
-        elif app_name == "Voyager":
-            self.application = Voyager(self.font_loader, self.gamepad, 960, 540)
-        else:
+        if app_name not in APPLICATIONS:
             log.error(f"Unknown application: {app_name}")
+            return
+        self.switch_application(
+            app_name,
+            lambda: import_application(app_name)(
+                self.font_loader, self.gamepad, 960, 540, self.scheduler
+            ),
+        )
+
+    def switch_application(self, name, factory):
+        """
+        Make an application current: resume it if it is suspended, create it with
+        factory otherwise. The current application is suspended.
+        """
+        previous = self.application
+        application = self.suspended.pop(name, None)
+        if application is None:
+            application = self.create_application(name, factory)
+        else:
+            self.resume_application(name, application)
+        self.application, previous_name = application, self.application_name
+        self.application_name = name
+        self.set_application_quality()
+        if previous is not None and previous is not application:
+            self.suspend_application(previous_name, previous)
+            self.freeze_heap()
+
+    def set_quality(self, level):
+        """
+        Apply a quality level to the shell widgets, the backend and the application.
+        """
+        trace.instant("quality", level=level.name)
+        self.quality = level
+        self.starfield.set_star_count(level.stars)
+        self.starfield.animation_step = level.animation_step
+        self.backend.set_render_scale(level.render_scale)
+        self.set_application_quality()
+
+    def set_application_quality(self):
+        set_quality = getattr(self.application, "set_quality", None)
+        if set_quality:
+            # Restart the animations together, so that they change the same frames
+            self.starfield.frame = 0
+            with tracker.owning(self.application):
+                set_quality(self.quality)
+
+    def tick_background(self, name, application, elapsed_ms):
+        with tracker.owning(application), trace.span(f"{name}.background"):
+            application.background_update(elapsed_ms)
+
+    def go_home(self):
+        if not isinstance(self.application, XayosRootApplication):
+            self.load_root_application()
 
     def unload_application(self):
         # If the menu application is unloaded, then quit the shell
         if isinstance(self.application, XayosRootApplication):
             self.running = False
             return
+        self.release_application(self.application)
         self.application = None
+        self.application_name = None
         self.load_root_application()
+        self.freeze_heap()
 
-    def handle_events(self, events):
-        if sdl2.ext.quit_requested(events):
-            self.running = False
+    def suspend_application(self, name, application):
+        """
+        Keep an application in the background, with its state and textures, until
+        it is resumed or evicted to stay within the budget of suspended applications.
+        """
+        trace.instant(f"{name}.suspend")
+        suspend = getattr(application, "suspend", None)
+        if suspend:
+            with tracker.owning(application):
+                suspend()
+        self.suspended[name] = application
+        sizes = {key: tracker.owned_bytes(app) for key, app in self.suspended.items()}
+        total = sum(sizes.values())
+        while self.suspended and total > self.suspend_budget:
+            evicted_name, evicted = self.suspended.popitem(last=False)
+            total -= sizes[evicted_name]
+            size = sizes[evicted_name] / 1024
+            log.info(f"Evicting suspended {evicted_name}, {size:.0f} KiB")
+            self.release_application(evicted)
 
-        for event in events:
-            # Handle all gamepad events
-            if event.type == sdl2.SDL_KEYDOWN:
-                # Check for the F11 key to toggle fullscreen mode
-                if event.key.keysym.sym == sdl2.SDLK_F11:
-                    self.toggle_fullscreen()
-            # Handle all gamepad events and some keyboard events
-            self.gamepad.handle_event(event)
+    def resume_application(self, name, application):
+        trace.instant(f"{name}.resume")
+        log.info(f"Resuming {name}")
+        resume = getattr(application, "resume", None)
+        if resume:
+            with tracker.owning(application):
+                resume()
 
-    def handle_input(self, button, state):
-        if (
-            button == BUTTON_LEFTSTICK
-            and self.gamepad.is_pressed(BUTTON_RIGHTSTICK)
-            and state
-            or button == BUTTON_RIGHTSTICK
-            and self.gamepad.is_pressed(BUTTON_LEFTSTICK)
-            and state
-        ):
+    def create_application(self, name, factory):
+        """
+        Create an application, which owns the SDL resources created on its behalf.
+        """
+        with tracker.owning(name), trace.span(f"{name}.load"):
+            application = factory()
+        tracker.transfer(name, application)
+        return application
+
+    def release_application(self, application):
+        """
+        Free the textures and SDL resources of an application, and report those it
+        did not free itself.
+        """
+        trace.instant(f"{type(application).__name__}.unload")
+        if self.backend:
+            self.backend.release_owner(application)
+        application.destroy()
+        tracker.release(application)
+        # Its reference cycles are only collected once the heap is thawed
+        self.heap_released = True
+
+    def freeze_heap(self):
+        """
+        Freeze the objects created since the last freeze. The whole heap is thawed
+        first if an application was released, so that its cycles are collected: a
+        full collection, which takes around 10 ms with a couple of applications
+        loaded, only when switching or unloading applications.
+        """
+        if self.gc_freeze:
+            freeze_heap(thaw=self.heap_released)
+            self.heap_released = False
+
+    def enter_phase(self, phase):
+        """
+        Mark the start of a phase of the frame loop (None for its end), for the
+        profilers and the trace.
+        """
+        if trace.tracer.enabled:
+            now = time.perf_counter_ns()
+            if self.phase:
+                trace.tracer.complete(self.phase, "frame", self.phase_start, now)
+            self.phase, self.phase_start = phase, now
+        if self.allocations:
+            source = type(self.application).__name__ if self.application else None
+            self.allocations.enter(phase, source)
+
+    def handle_quit(self, event):
+        self.running = False
+
+    def handle_invalidate(self, event):
+        if self.backend:
+            self.backend.invalidate()
+
+    def handle_key_down(self, event):
+        key = event.key
+        # Check for the F11 key to toggle fullscreen mode
+        if key.keysym.sym == sdl2.SDLK_F11:
             self.toggle_fullscreen()
+        # Some keyboard keys are mapped to gamepad buttons
+        self.gamepad.handle_key_down(key)
+
+    def is_chord(self, button, state, chord):
+        """
+        Whether pressing button completes a chord, with the other buttons held.
+        """
+        return (
+            state
+            and button in chord
+            and all(self.gamepad.is_pressed(other) for other in chord if other != button)
+        )
+
+    def handle_input(self, button, state, timestamp=0):
+        for chord, action in self.chords:
+            if self.is_chord(button, state, chord):
+                action()
+                # The button that completed the chord is not dispatched, nor Back if
+                # it was held back, but the releases of buttons already dispatched are
+                self.consumed.add(button)
+                if self.held_back is not None:
+                    self.held_back = None
+                    self.consumed.add(BUTTON_BACK)
+                return
+        if not state and button in self.consumed:
+            self.consumed.discard(button)
+            return
+        if button == BUTTON_BACK and state:
+            # Back starts chords, the application only sees it pressed once it is
+            # released or another button is pressed
+            self.held_back = timestamp
+            return
+        if self.held_back is not None:
+            held_back, self.held_back = self.held_back, None
+            self.dispatch_input(BUTTON_BACK, True, held_back)
+        if button == BUTTON_GUIDE and state:
+            # Guide goes back to the menu, and the application stays suspended
+            self.go_home()
+            return
+        self.dispatch_input(button, state, timestamp)
+
+    def dispatch_input(self, button, state, timestamp):
         if self.application:
             self.application.handle_input(button, state)
+            # The input is reflected by the next frame to be presented
+            self.latency.input_dispatched(timestamp)
 
-    def renderer_info(self, sdlrenderer):
-        info = sdl2.render.SDL_RendererInfo()
-        sdl2.SDL_GetRendererInfo(sdlrenderer, info)
-        log.info(f"Renderer: {info.name.decode()}")
+    def dump_trace(self):
+        """
+        Start tracing, or write the events traced so far next to the profiles.
+        """
+        if not trace.tracer.enabled:
+            trace.tracer.enable()
+            return
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        trace.tracer.write(str(self.capture.directory / f"trace-{timestamp}.json"))
+
+    def handle_snapshot(self, snapshot):
+        if self.recorder:
+            self.recorder.record_snapshot(snapshot)
+        handle_snapshot = getattr(self.application, "handle_snapshot", None)
+        if handle_snapshot:
+            handle_snapshot(snapshot)
 
     def setup_gamepads(self, mapping_file="gamecontrollerdb.txt"):
-        path = str(RESOURCES_PATH / mapping_file)
-        log.info("Loading game controller mappings from %s", path)
-        if sdl2.SDL_GameControllerAddMappingsFromFile(path.encode()) != 0:
+        log.info("Loading game controller mappings from %s", mapping_file)
+        data = assets.read_bytes("resources", mapping_file)
+        if (
+            sdl2.SDL_GameControllerAddMappingsFromRW(
+                sdl2.SDL_RWFromConstMem(data, len(data)), 1
+            )
+            < 0
+        ):
             log.error("Failed to load game controller mappings")
         num_joysticks = sdl2.SDL_NumJoysticks()
         for i in range(num_joysticks):
@@ -336,6 +815,29 @@ class XayosLunarShell:
             if wait_time > 0:
                 sdl2.SDL_Delay(int(wait_time))
 
+    def report_benchmark(self, frame_times, wall_seconds):
+        log.info(
+            f"Replay finished: {self.frame} frames in {wall_seconds:.2f} s "
+            f"({self.frame / wall_seconds:.1f} FPS), frame time "
+            f"p50 {frame_times.percentile(50)} ms, "
+            f"p95 {frame_times.percentile(95)} ms, max {frame_times.max} ms"
+        )
+        if self.draw_stats:
+            log.info(f"Replay draw calls: {self.draw_stats.summary()}")
+
+    def update_clock(self):
+        now = int(time.time())
+        if now != self.clock_second:
+            self.clock_second = now
+            text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+            self.date_time.set_text(text.encode())
+
+    def update_fps_counter(self):
+        fps = round(self.fps_avg)
+        if fps != self.fps_shown:
+            self.fps_shown = fps
+            self.fps_counter.set_text(f"{fps:3d}".encode())
+
     def calculate_fps(self, elapsed):
         # Calculate the frame rate
         if elapsed > 0:
@@ -344,6 +846,13 @@ class XayosLunarShell:
             self.fps_avg = fps * 0.1 + self.fps_avg * 0.9 if self.fps_avg > 0 else fps
 
 
+def parse_thresholds(value):
+    thresholds = [int(threshold) for threshold in value.split(",")]
+    if not 1 <= len(thresholds) <= 3:
+        raise argparse.ArgumentTypeError("expected 1 to 3 thresholds")
+    return thresholds
+
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Xayos Lunar Shell")
     parser.add_argument(
@@ -352,7 +861,10 @@ def parse_args():
     parser.add_argument(
         "--backend",
         type=str,
-        help="Use the specified renderer backend (e.g. 'opengl', 'software')",
+        help=(
+            "Use the specified renderer backend (e.g. 'opengl', 'software'), or "
+            f"'{GL_BACKEND}' for the OpenGL 3.3 core backend"
+        ),
     )
     parser.add_argument(
         "--software",
@@ -367,16 +879,210 @@ def parse_args():
         type=int,
         help="Limit the frame rate to the specified frames per second",
     )
+    parser.add_argument(
+        "--task-budget",
+        type=float,
+        default=4,
+        help="Time budget in milliseconds for background tasks in each frame",
+    )
+    parser.add_argument(
+        "--background-rate",
+        type=float,
+        default=4,
+        metavar="HZ",
+        help="Rate at which suspended applications are ticked (0 to never tick them)",
+    )
+    parser.add_argument(
+        "--background-budget",
+        type=float,
+        default=1,
+        metavar="MS",
+        help="Time budget in milliseconds for ticking suspended applications, in total",
+    )
+    parser.add_argument(
+        "--show-latency",
+        action="store_true",
+        help="Show input-to-photon latency (p50/p95/max) in the overlay",
+    )
+    parser.add_argument(
+        "--latency-json",
+        type=str,
+        metavar="FILE",
+        help="Write the input-to-photon latency histogram to a JSON file on exit",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Seed for the random generators (e.g. the star field)",
+    )
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument(
+        "--record",
+        type=str,
+        metavar="FILE",
+        help="Record every input event, with its frame number, to a file",
+    )
+    replay.add_argument(
+        "--replay",
+        type=str,
+        metavar="FILE",
+        help="Replay a recorded file at the same frames, with a fixed timestep",
+    )
+    parser.add_argument(
+        "--uncapped",
+        action="store_true",
+        help="Do not limit the frame rate (--fps still sets the replay timestep)",
+    )
+    parser.add_argument(
+        "--full-redraw",
+        action="store_true",
+        help="Redraw the whole frame every time, instead of only the damaged parts",
+    )
+    parser.add_argument(
+        "--pause-stars",
+        action="store_true",
+        help="Keep the star field still",
+    )
+    parser.add_argument(
+        "--texture-budget",
+        type=float,
+        default=32,
+        metavar="MB",
+        help="Memory budget of the texture cache, for textures not in use",
+    )
+    parser.add_argument(
+        "--texture-cap",
+        type=float,
+        metavar="MB",
+        help="Hard cap on the memory of the texture cache, for low-memory devices",
+    )
+    parser.add_argument(
+        "--suspend-budget",
+        type=float,
+        default=16,
+        metavar="MB",
+        help="Memory of the applications kept in the background (0 to close them)",
+    )
+    parser.add_argument(
+        "--count-draws",
+        action="store_true",
+        help="Count draw calls, pixels and uploads per frame and source (slower)",
+    )
+    parser.add_argument(
+        "--debug-leaks",
+        action="store_true",
+        help="Fail when an application leaves SDL resources behind on unload",
+    )
+    parser.add_argument(
+        "--profile-allocations",
+        action="store_true",
+        help="Trace allocations and GC pauses by frame phase and application (slow)",
+    )
+    parser.add_argument(
+        "--gc-freeze",
+        action="store_true",
+        help="Freeze long-lived objects out of garbage collections",
+    )
+    parser.add_argument(
+        "--gc-threshold",
+        type=parse_thresholds,
+        metavar="N[,N,N]",
+        help="Garbage collection thresholds, for generation 0 and optionally 1 and 2",
+    )
+    parser.add_argument(
+        "--capture-dir",
+        type=str,
+        default=str(CAPTURE_PATH),
+        metavar="DIR",
+        help="Directory of the profiles captured with Back+L3 (F10+Left Alt)",
+    )
+    parser.add_argument(
+        "--capture-frames",
+        type=int,
+        default=300,
+        metavar="N",
+        help="Number of frames in a profile capture",
+    )
+    parser.add_argument(
+        "--capture-mode",
+        choices=ProfileCapture.modes,
+        default="cprofile",
+        help="Capture with cProfile (pstats) or a stack sampler (collapsed stacks)",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        metavar="FILE",
+        help="Trace frame phases, tasks and I/O, and write Chrome trace events on exit",
+    )
+    parser.add_argument(
+        startup.FLAG,
+        action="store_true",
+        help="Report the time spent importing and initializing up to the first frame",
+    )
+    parser.add_argument(
+        "--quality",
+        choices=("auto", *(level.name for level in QUALITY_LEVELS)),
+        default="auto",
+        help="Quality of the star field, menu model and render scale; auto adapts it "
+        f"to the frame times, from {DEFAULT_QUALITY}",
+    )
+    parser.add_argument(
+        "--log-file",
+        type=str,
+        metavar="FILE",
+        help="Also log to a rotating file, as JSON lines",
+    )
+    parser.add_argument(
+        "--flight-records",
+        type=int,
+        default=2000,
+        metavar="N",
+        help="Debug records kept in memory and written on crashes, SIGUSR1 or "
+        "Back+Guide (F10+F12), next to the profiles; 0 to disable",
+    )
     return parser.parse_args()
 
 
 def main():
+    startup.profile.mark("imports")
     args = parse_args()
-    setup_logging(verbose=args.verbose)
+    setup_logging(
+        verbose=args.verbose,
+        log_file=args.log_file,
+        flight_records=args.flight_records,
+        flight_dir=args.capture_dir,
+    )
     app = XayosLunarShell(
         renderer_backend=args.backend,
         software_renderer=args.software,
         vsync=args.vsync,
         fps_target=args.fps,
+        task_budget_ms=args.task_budget,
+        background_rate_hz=args.background_rate,
+        background_budget_ms=args.background_budget,
+        show_latency=args.show_latency,
+        latency_path=args.latency_json,
+        seed=args.seed,
+        record_path=args.record,
+        replay_path=args.replay,
+        uncapped=args.uncapped,
+        full_redraw=args.full_redraw,
+        pause_stars=args.pause_stars,
+        texture_budget_mb=args.texture_budget,
+        texture_cap_mb=args.texture_cap,
+        suspend_budget_mb=args.suspend_budget,
+        count_draws=args.count_draws,
+        debug_leaks=args.debug_leaks,
+        profile_allocations=args.profile_allocations,
+        gc_freeze=args.gc_freeze,
+        gc_thresholds=args.gc_threshold,
+        capture_path=args.capture_dir,
+        capture_frames=args.capture_frames,
+        capture_mode=args.capture_mode,
+        trace_path=args.trace,
+        startup_profile=args.startup_profile,
+        quality=args.quality,
     )
+    startup.profile.mark("logging and shell")
     app.main()
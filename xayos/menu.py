@@ -1,9 +1,9 @@
 import logging
 import sdl2.ext
-from sdl2 import sdlgfx
 
 from xayos import colors
 from xayos.gamepad import BUTTON_DPAD_DOWN, BUTTON_DPAD_UP, BUTTON_A, BUTTON_B
+from xayos.tracking import create_renderer, create_surface, destroy_renderer, free_surface
 
 log = logging.getLogger(__name__)
 
@@ -29,14 +29,17 @@ class Menu:
         self.background = background
         self.width = width
         self.height = height
-        self.surface = sdl2.SDL_CreateRGBSurface(
-            0, width, height, 32, 0xFF000000, 0x00FF0000, 0x0000FF00, 0x000000FF
-        )
+        self.surface = create_surface(width, height)
+        self.surface_renderer = create_renderer(self.surface)
         self.entries = entries
         self._current_selection = 0
         self.active = active
         self.chosen = None
 
+    def destroy(self):
+        destroy_renderer(self.surface_renderer)
+        free_surface(self.surface)
+
     def reset_selection(self):
         self._current_selection = 0
         self.chosen = None
@@ -48,45 +51,46 @@ class Menu:
             on_button_release=self.on_button_release,
         )
 
-    def render(self, renderer):
-        surface_renderer = sdl2.ext.Renderer(self.surface)
-        surface_renderer.clear(self.background)
-        # draw a line in the edges of the surface
-        border = (0, 0, self.width, self.height)
-        title_border = (0, 32, self.width, 32)
-        footer_border = (0, self.height - 32, self.width, 32)
-        surface_renderer.draw_rect(border, colors.LIGHT_GREY_3)
-        surface_renderer.draw_line(title_border, colors.LIGHT_GREY_3)
-        # surface_renderer.draw_line(footer_border, colors.LIGHT_GREY_2)
-
-        self.font_loader.set_font(self.title_font)
-        # font_size = self.font_loader.get_font_size(self.font)
-        font_pos = (8, 8)
-        menu_string = self.title.encode()
-        sdlgfx.stringRGBA(
-            surface_renderer.sdlrenderer,
-            font_pos[0],
-            font_pos[1],
-            menu_string,
-            *colors.LIGHT_GREY_3,
-        )
-        self.draw_entries(surface_renderer.sdlrenderer)
-        texture = sdl2.ext.Texture(renderer.sdlrenderer, self.surface)
-        screen_center = (renderer.logical_size[0] // 2, renderer.logical_size[1] // 2)
-        renderer.rcopy(texture, loc=screen_center, align=(0.5, 0.5))
-
-    def draw_entries(self, sdlrenderer):
+    def render(self, commands):
+        with commands.offscreen(self.surface_renderer):
+            commands.clear(self.background)
+            # draw a line in the edges of the surface
+            border = (0, 0, self.width, self.height)
+            title_border = (0, 32, self.width, 32)
+            footer_border = (0, self.height - 32, self.width, 32)
+            commands.draw_rect(border, colors.LIGHT_GREY_3)
+            commands.draw_line(title_border, colors.LIGHT_GREY_3)
+            # commands.draw_line(footer_border, colors.LIGHT_GREY_2)
+
+            # font_size = self.font_loader.get_font_size(self.font)
+            font_pos = (8, 8)
+            menu_string = self.title.encode()
+            commands.text(
+                self.title_font,
+                font_pos[0],
+                font_pos[1],
+                menu_string,
+                colors.LIGHT_GREY_3,
+            )
+            self.draw_entries(commands)
+        # The menu covers whatever was drawn before it
+        commands.next_layer()
+        screen_width, screen_height = commands.logical_size
+        x = screen_width // 2 - self.width // 2
+        y = screen_height // 2 - self.height // 2
+        commands.copy_surface(self.surface, (x, y, self.width, self.height))
+
+    def draw_entries(self, commands):
         y = 32 + 12
         spacing = 24
         for i, entry in enumerate(self.entries):
-            self.font_loader.set_font(self.font)
             color = colors.LIGHT_GREY_3 if i == self._current_selection else colors.GREY
-            sdlgfx.stringRGBA(
-                sdlrenderer,
+            commands.text(
+                self.font,
                 16,
                 y,
                 entry.encode(),
-                *color,
+                color,
             )
             y += spacing
 
@@ -109,7 +113,7 @@ class Menu:
     def choose(self):
         self.chosen = self.entries[self._current_selection]
         self.active = False
-        log.debug(f"Chosen menu item: {self.chosen}")
+        log.debug("Chosen menu item: %s", self.chosen)
 
     def cancel(self):
         self.active = False
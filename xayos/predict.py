@@ -0,0 +1,233 @@
+"""
+Predictive text input for the multi-tap text controller.
+
+Words are indexed by the sequence of letter groups that type them (like T9 on
+phone keypads), so that a single press per letter is enough to find candidates.
+The dictionary is a prebuilt binary word list, read in a worker thread when the
+text editor starts (or on first use otherwise). To build it
+from a text file with one word per line, optionally followed by a frequency:
+
+    python -m xayos.predict words.txt xayos/resources/words.t9
+"""
+
+import argparse
+import logging
+import re
+import struct
+import sys
+import time
+from pathlib import Path
+
+from . import assets
+
+log = logging.getLogger(__name__)
+
+HERE = Path(__file__).parent
+DICTIONARY_PATH = HERE / "resources" / "words.t9"
+DICTIONARY_RESOURCE = ("resources", "words.t9")
+
+# Same letter groups as the multi-tap cycles of the text controller
+LETTER_GROUPS = ("abc", "def", "ghi", "jkl", "mno", "pqrs", "tuv", "wxyz")
+GROUP_OF_LETTER = {
+    letter: group for group, letters in enumerate(LETTER_GROUPS) for letter in letters
+}
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+HEADER = struct.Struct("<4sI")
+MAGIC = b"XT9D"
+ENTRY = struct.Struct("<IB")
+
+
+def word_groups(word):
+    return tuple(GROUP_OF_LETTER[letter] for letter in word)
+
+
+class TrieNode:
+    __slots__ = ["children", "words", "top"]
+
+    def __init__(self):
+        self.children = {}
+        # Words that end at this node, with their frequencies
+        self.words = {}
+        # Most frequent (frequency, word) pairs of the whole subtree, best first
+        self.top = []
+
+
+class PredictiveDictionary:
+    """
+    Trie of words keyed by letter group, ranked by frequency. Each node keeps the
+    best words of its subtree, so that a lookup only walks the group sequence.
+    """
+
+    def __init__(self, path=None, max_candidates=5):
+        # By default, the dictionary is a resource of the package
+        self.path = Path(path) if path else None
+        self.max_candidates = max_candidates
+        self.root = TrieNode()
+        self.loaded = False
+
+    def read(self):
+        """
+        Parse the dictionary into a new trie and return its root. It only reads the
+        dictionary file, so it can run in a worker thread.
+        """
+        root = TrieNode()
+        start = time.perf_counter()
+        if self.path:
+            source = self.path
+            data = self.path.read_bytes() if self.path.exists() else None
+        else:
+            source = "/".join(DICTIONARY_RESOURCE)
+            data = None
+            if assets.exists(*DICTIONARY_RESOURCE):
+                data = assets.read_bytes(*DICTIONARY_RESOURCE)
+        if data is None:
+            log.info(f"No predictive dictionary at {source}, starting empty")
+            return root
+        magic, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"Not a predictive dictionary: {source}")
+        offset = HEADER.size
+        max_candidates = self.max_candidates
+        # Words are stored by descending frequency, so the best words of a subtree
+        # are simply the first ones to reach it
+        for _ in range(count):
+            frequency, length = ENTRY.unpack_from(data, offset)
+            offset += ENTRY.size
+            word = data[offset : offset + length].decode("ascii")
+            offset += length
+            entry = (frequency, word)
+            node = root
+            if len(node.top) < max_candidates:
+                node.top.append(entry)
+            for letter in word:
+                children = node.children
+                group = GROUP_OF_LETTER[letter]
+                node = children.get(group)
+                if node is None:
+                    node = children[group] = TrieNode()
+                if len(node.top) < max_candidates:
+                    node.top.append(entry)
+            node.words[word] = frequency
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        log.info(f"Loaded {count} words from {source} in {elapsed_ms:.0f} ms")
+        return root
+
+    def load(self, root=None):
+        """
+        Use a trie returned by read(), or read the dictionary now.
+        """
+        self.root = self.read() if root is None else root
+        self.loaded = True
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def add(self, word, frequency=1):
+        """
+        Add frequency to a word, inserting it if needed. Returns the new frequency.
+        """
+        node = self.root
+        path = [node]
+        for group in word_groups(word):
+            node = node.children.setdefault(group, TrieNode())
+            path.append(node)
+        frequency += node.words.get(word, 0)
+        node.words[word] = frequency
+        for node in path:
+            self.update_top(node, word, frequency)
+        return frequency
+
+    def update_top(self, node, word, frequency):
+        top = [entry for entry in node.top if entry[1] != word]
+        if len(top) >= self.max_candidates and frequency <= top[-1][0]:
+            return
+        top.append((frequency, word))
+        top.sort(key=lambda entry: (-entry[0], entry[1]))
+        node.top = top[: self.max_candidates]
+
+    def learn(self, word):
+        """
+        Learn an accepted word, making it rank higher in future lookups.
+        """
+        self.ensure_loaded()
+        if WORD_PATTERN.fullmatch(word):
+            self.add(word)
+
+    def learn_text(self, text):
+        """
+        Add the words of a text that are not known yet, without changing the ranking
+        of known words.
+        """
+        self.ensure_loaded()
+        for word in set(WORD_PATTERN.findall(text.lower())):
+            node = self.find(word_groups(word))
+            if node is None or word not in node.words:
+                self.add(word)
+
+    def find(self, groups):
+        node = self.root
+        for group in groups:
+            node = node.children.get(group)
+            if node is None:
+                return None
+        return node
+
+    def candidates(self, groups):
+        """
+        Candidate words for a sequence of letter groups: exact matches first, then
+        longer words starting with the sequence, each ranked by frequency.
+        """
+        self.ensure_loaded()
+        node = self.find(groups)
+        if node is None:
+            return []
+        exact = sorted(node.words.items(), key=lambda item: (-item[1], item[0]))
+        words = [word for word, _ in exact[: self.max_candidates]]
+        for _, word in node.top:
+            if len(words) >= self.max_candidates:
+                break
+            if word not in node.words:
+                words.append(word)
+        return words
+
+
+def read_word_list(path):
+    frequencies = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            word = parts[0].lower()
+            if not WORD_PATTERN.fullmatch(word) or len(word) > 255:
+                continue
+            frequency = int(parts[1]) if len(parts) > 1 else 1
+            frequencies[word] = frequencies.get(word, 0) + frequency
+    return frequencies
+
+
+def write_dictionary(frequencies, path):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(frequencies)))
+        # Sorted by descending frequency, as expected by the loader
+        entries = sorted(frequencies.items(), key=lambda item: (-item[1], item[0]))
+        for word, frequency in entries:
+            encoded = word.encode("ascii")
+            f.write(ENTRY.pack(min(frequency, 0xFFFFFFFF), len(encoded)))
+            f.write(encoded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a predictive text dictionary")
+    parser.add_argument("word_list", help="Text file with one word per line")
+    parser.add_argument("output", nargs="?", default=str(DICTIONARY_PATH))
+    args = parser.parse_args()
+    frequencies = read_word_list(args.word_list)
+    write_dictionary(frequencies, args.output)
+    print(f"Wrote {len(frequencies)} words to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Frame loop profiling.
+
+The allocation profiler attributes Python allocations to the phases of the frame
+loop (events, update, tasks, render, present) and to the application running, with
+tracemalloc: for each phase, the bytes allocated at its peak, the bytes it kept and
+the number of blocks it kept. Garbage collections are timed through gc callbacks,
+with their generation and the phase they interrupted, and the traced memory is
+watched for steady growth across frames, which is reported with the allocation
+sites that grew.
+
+The garbage collector itself can be tuned around the frame loop: long-lived objects
+(fonts, widgets, the loaded application) can be frozen out of collections, and the
+collection thresholds changed, so that fewer and shorter pauses hit frames.
+
+Profile captures record a number of frames on demand, e.g. from a button chord, with
+cProfile or with a thread sampling the stack of the frame loop, and write them in
+the background: a pstats file for cProfile, collapsed stacks (one "a;b;c count"
+line per stack, as flame graph tools read them) for the sampler.
+"""
+
+import cProfile
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+
+def set_gc_thresholds(thresholds):
+    gc.set_threshold(*thresholds)
+    log.info(f"Garbage collection thresholds set to {gc.get_threshold()}")
+
+
+def freeze_heap(thaw=False):
+    """
+    Collect, then move every object left to the permanent generation, which is
+    ignored by later collections. Objects that are no longer referenced are still
+    freed, but cycles among frozen objects are not: thaw collects the whole heap
+    first, for the cycles dropped since the last freeze, at the cost of a pause
+    that grows with the heap.
+    """
+    start = time.perf_counter()
+    if thaw:
+        gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+    pause_ms = (time.perf_counter() - start) * 1000
+    log.debug(f"{gc.get_freeze_count()} objects frozen in {pause_ms:.1f} ms")
+
+
+class AllocationProfiler:
+    def __init__(self, traceback_frames=1, window=60, growth_windows=5, pause_ms=2):
+        self.traceback_frames = traceback_frames
+        # Growth is reported after growth_windows windows of frames in a row
+        self.window = window
+        self.growth_windows = growth_windows
+        # GC pauses longer than this are logged
+        self.pause_ms = pause_ms
+        # Current phase of the frame loop, and the memory when it started
+        self.phase = None
+        self.phase_memory = 0
+        self.phase_blocks = 0
+        # Allocations by (phase, source)
+        self.phases = {}
+        # Collections by generation: count, total and longest pause
+        self.collections = Counter()
+        self.pause_total = Counter()
+        self.pause_max = Counter()
+        self.pauses_by_phase = Counter()
+        self.gc_start = None
+        # Traced memory summed over the current window, the mean of the last one
+        # and the number of windows in a row it grew, since the snapshot
+        self.frames = 0
+        self.window_total = 0
+        self.window_mean = None
+        self.growing = 0
+        self.growth_snapshot = None
+        self.growth_start = 0
+
+    def start(self):
+        tracemalloc.start(self.traceback_frames)
+        gc.callbacks.append(self.gc_callback)
+        log.info("Allocation profiler started")
+
+    def stop(self):
+        self.enter(None)
+        gc.callbacks.remove(self.gc_callback)
+        tracemalloc.stop()
+
+    def enter(self, phase, source=None):
+        """
+        End the current phase of the frame, and start another one (None for none).
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        if self.phase is not None:
+            stats = self.phases.get(self.phase)
+            if stats is None:
+                stats = self.phases[self.phase] = Counter()
+            stats["count"] += 1
+            stats["allocated"] += peak - self.phase_memory
+            stats["kept"] += current - self.phase_memory
+            stats["blocks"] += sys.getallocatedblocks() - self.phase_blocks
+        if phase is None:
+            self.phase = None
+            return
+        self.phase = (phase, source)
+        tracemalloc.reset_peak()
+        self.phase_memory, _ = tracemalloc.get_traced_memory()
+        self.phase_blocks = sys.getallocatedblocks()
+
+    def end_frame(self):
+        self.enter(None)
+        self.frames += 1
+        self.window_total += tracemalloc.get_traced_memory()[0]
+        if self.frames % self.window == 0:
+            mean = self.window_total / self.window
+            self.window_total = 0
+            self.check_growth(mean)
+
+    def check_growth(self, mean):
+        previous, self.window_mean = self.window_mean, mean
+        if previous is None or mean <= previous:
+            self.growing = 0
+            self.growth_snapshot = None
+            return
+        self.growing += 1
+        if self.growing == 1:
+            # Allocation sites are compared from where the growth started
+            self.growth_snapshot = self.take_snapshot()
+            self.growth_start = previous
+        elif self.growing >= self.growth_windows:
+            growth = (mean - self.growth_start) / 1024
+            frames = self.growing * self.window
+            log.warning(f"Traced memory grew by {growth:.0f} KiB over {frames} frames")
+            snapshot = self.take_snapshot()
+            for stat in snapshot.compare_to(self.growth_snapshot, "lineno")[:5]:
+                log.warning(f"  {stat}")
+            self.growing = 1
+            self.growth_snapshot = snapshot
+            self.growth_start = mean
+
+    def take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+
+    def gc_callback(self, phase, info):
+        if phase == "start":
+            self.gc_start = time.perf_counter()
+            return
+        if self.gc_start is None:
+            return
+        pause_ms = (time.perf_counter() - self.gc_start) * 1000
+        self.gc_start = None
+        generation = info["generation"]
+        self.collections[generation] += 1
+        self.pause_total[generation] += pause_ms
+        self.pause_max[generation] = max(self.pause_max[generation], pause_ms)
+        loop_phase = self.phase[0] if self.phase else "idle"
+        self.pauses_by_phase[loop_phase] += 1
+        if pause_ms >= self.pause_ms:
+            log.info(
+                f"GC pause of {pause_ms:.1f} ms in generation {generation} during "
+                f"{loop_phase}, {info['collected']} objects collected"
+            )
+
+    def summary(self, top=8):
+        """
+        Allocations of each phase and application, on average per frame.
+        """
+        phases = sorted(
+            self.phases.items(), key=lambda item: item[1]["allocated"], reverse=True
+        )
+        by_phase = ", ".join(
+            f"{phase}{f' ({source})' if source else ''} "
+            f"{stats['allocated'] / stats['count'] / 1024:.1f} KiB allocated "
+            f"{stats['kept'] / stats['count']:+.0f} B "
+            f"{stats['blocks'] / stats['count']:+.1f} blocks kept"
+            for (phase, source), stats in phases[:top]
+        )
+        collections = ", ".join(
+            f"gen{generation} {count} ({self.pause_total[generation] / count:.2f} ms "
+            f"avg, {self.pause_max[generation]:.2f} ms max)"
+            for generation, count in sorted(self.collections.items())
+        )
+        interrupted = ", ".join(
+            f"{phase} {count}" for phase, count in self.pauses_by_phase.most_common()
+        )
+        return (
+            f"per frame {by_phase or 'nothing'}; collections {collections or 'none'}; "
+            f"collections during {interrupted or 'nothing'}"
+        )
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of a thread at an interval, counting each distinct stack.
+    """
+
+    def __init__(self, thread_id, interval_ms=1):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+class ProfileCapture:
+    modes = ("cprofile", "sample")
+
+    def __init__(self, directory, frames=300, mode="cprofile"):
+        assert mode in self.modes, f"Unknown profiling mode: {mode}"
+        self.directory = directory
+        self.frames = frames
+        self.mode = mode
+        self.profiler = None
+        self.remaining = 0
+        self.writers = []
+
+    @property
+    def active(self):
+        return self.profiler is not None
+
+    def start(self):
+        if self.active:
+            log.info(f"Profile capture already running, {self.remaining} frames left")
+            return
+        log.info(f"Capturing a {self.mode} profile of {self.frames} frames")
+        self.remaining = self.frames
+        if self.mode == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = StackSampler(threading.get_ident())
+            self.profiler.start()
+
+    def end_frame(self):
+        if self.active:
+            self.remaining -= 1
+            if self.remaining <= 0:
+                self.finish()
+
+    def finish(self):
+        """
+        Stop capturing, and write the profile in the background.
+        """
+        profiler, self.profiler = self.profiler, None
+        if self.mode == "cprofile":
+            profiler.disable()
+            target = self.write_pstats
+        else:
+            profiler.stopped.set()
+            target = self.write_stacks
+        frames = self.frames - self.remaining
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        path = self.directory / f"profile-{timestamp}-{frames}f"
+        writer = threading.Thread(
+            target=target, args=(profiler, path), name="profile-writer"
+        )
+        writer.start()
+        self.writers = [thread for thread in self.writers if thread.is_alive()]
+        self.writers.append(writer)
+
+    def write_pstats(self, profiler, path):
+        path = path.with_suffix(".prof")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(path)
+        log.info(f"Profile written to {path}")
+
+    def write_stacks(self, sampler, path):
+        sampler.join()
+        path = path.with_suffix(".folded")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        samples = sum(sampler.stacks.values())
+        log.info(f"Profile written to {path}, {samples} samples")
+
+    def close(self):
+        if self.active:
+            self.finish()
+        for writer in self.writers:
+            writer.join()
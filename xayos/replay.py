@@ -0,0 +1,78 @@
+import logging
+import struct
+
+log = logging.getLogger(__name__)
+
+# File header: magic, format version, the random seed of the session and its length
+# in frames, written when the recording is closed
+HEADER = struct.Struct("<4sBqI")
+MAGIC = b"XREC"
+VERSION = 2
+# One record per input change: frame, milliseconds since start, button and state
+RECORD = struct.Struct("<IIBB")
+
+
+class InputRecorder:
+    """
+    Writes every input change dispatched by the gamepad handler to a compact binary
+    file, together with the frame number in which it was dispatched, and the number
+    of frames of the session once it ends.
+    """
+
+    def __init__(self, path, seed, start_ticks=0):
+        self.path = path
+        self.seed = seed
+        self.start_ticks = start_ticks
+        self.count = 0
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, 0))
+        log.info(f"Recording input to {path} (seed {seed})")
+
+    def record(self, frame, button, state, timestamp):
+        relative_ms = max(timestamp - self.start_ticks, 0)
+        self.file.write(RECORD.pack(frame, relative_ms, button, bool(state)))
+        self.count += 1
+
+    def record_snapshot(self, snapshot):
+        for button, state, timestamp in snapshot.changes:
+            self.record(snapshot.frame, button, state, timestamp)
+
+    def close(self, frames):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.seed, frames))
+        self.file.close()
+        log.info(f"Recorded {self.count} input events in {frames} frames to {self.path}")
+
+
+class InputReplayer:
+    """
+    Reads a file written by InputRecorder and injects its input changes into the
+    gamepad handler at the same frame numbers, until the frame the session ended.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, self.seed, frames = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a supported input recording: {path}")
+        self.records = list(RECORD.iter_unpack(data[HEADER.size :]))
+        self.position = 0
+        # A recording that was not closed ends with its last input
+        last_input = self.records[-1][0] if self.records else 0
+        self.frames = frames or last_input + 1
+        log.info(
+            f"Replaying {len(self.records)} input events in {self.frames} frames "
+            f"from {path}"
+        )
+
+    def finished(self, frame):
+        return self.position >= len(self.records) and frame >= self.frames
+
+    def inject(self, frame, gamepad, timestamp=0):
+        records = self.records
+        while self.position < len(records) and records[self.position][0] <= frame:
+            _, _, button, state = records[self.position]
+            gamepad.set_button(button, bool(state), timestamp)
+            self.position += 1
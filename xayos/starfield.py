@@ -1,11 +1,18 @@
+import ctypes
 import math
-from random import randrange
+import random
 
-from sdl2 import sdlgfx
+import sdl2
+
+# Radii of the star sprites, from a single pixel for the farthest stars, by steps
+SPRITE_RADII = (0.5, 0.75, 1.0, 1.25)
+RADIUS_STEP = 0.25
+# Sprites are centered in square cells, large enough for the largest one
+SPRITE_SIZE = 5
 
 
 class Star:
-    __slots__ = ["x", "y", "z", "id", "radius", "fill"]
+    __slots__ = ["x", "y", "z", "id", "radius", "fill", "screen_x", "screen_y"]
 
     def __init__(self, x, y, z) -> None:
         super().__init__()
@@ -14,52 +21,142 @@ class Star:
         self.z = z
         self.radius = 1
         self.fill = 0
+        self.screen_x = 0
+        self.screen_y = 0
+
+
+class StarSprites:
+    """
+    Atlas of antialiased star sprites, one per radius, side by side: white, with
+    their coverage in the alpha channel, so that they are tinted by the brightness
+    of each star when drawn.
+    """
+
+    width = SPRITE_SIZE * len(SPRITE_RADII)
+    height = SPRITE_SIZE
+
+    def coverage(self):
+        """
+        Coverage of each pixel of the atlas, by row, as bytes.
+        """
+        center = SPRITE_SIZE // 2
+        pixels = bytearray()
+        for y in range(self.height):
+            for radius in SPRITE_RADII:
+                for x in range(SPRITE_SIZE):
+                    # The edge of a sprite fades out over a pixel
+                    distance = math.hypot(x - center, y - center)
+                    alpha = min(max(radius + 0.5 - distance, 0), 1)
+                    pixels.append(round(alpha * 255))
+        return bytes(pixels)
+
+    def create_texture(self, sdlrenderer):
+        pixels = (ctypes.c_uint32 * (self.width * self.height))(
+            *[alpha << 24 | 0xFFFFFF for alpha in self.coverage()]
+        )
+        texture = sdl2.SDL_CreateTexture(
+            sdlrenderer,
+            sdl2.SDL_PIXELFORMAT_ARGB8888,
+            sdl2.SDL_TEXTUREACCESS_STATIC,
+            self.width,
+            self.height,
+        )
+        sdl2.SDL_UpdateTexture(texture, None, pixels, self.width * 4)
+        sdl2.SDL_SetTextureBlendMode(texture, sdl2.SDL_BLENDMODE_BLEND)
+        return texture
+
+    def content_key(self):
+        return ("stars", SPRITE_SIZE, SPRITE_RADII)
 
 
 class StarField:
-    def __init__(self, width, height, depth=32, num_stars=400, speed=0.05):
+    def __init__(self, width, height, depth=32, num_stars=400, speed=0.05, seed=None):
+        # A seeded generator makes the star field reproducible across runs
+        self.random = random.Random(seed)
         self.fov = 180 * math.pi / 180
         self.view_distance = 0
         self.stars = []
+        self.sprites = StarSprites()
         self.width = width
         self.height = height
         self.max_depth = depth
         self.z_speed = speed
+        # The stars move every animation_step frames, by as many steps
+        self.animation_step = 1
+        self.frame = 0
+        self.set_star_count(num_stars)
 
-        for x in range(num_stars):
+    def set_speed(self, speed):
+        self.z_speed = speed
+
+    def set_star_count(self, num_stars):
+        """
+        Drop stars, or add new ones at random positions.
+        """
+        del self.stars[num_stars:]
+        while len(self.stars) < num_stars:
             star = Star(
-                x=randrange(-self.width, self.width),
-                y=randrange(-self.height, self.height),
-                z=randrange(0, self.max_depth),
+                x=self.random.randrange(-self.width, self.width),
+                y=self.random.randrange(-self.height, self.height),
+                z=self.random.randrange(0, self.max_depth),
             )
             self.stars.append(star)
 
-    def set_speed(self, speed):
-        self.z_speed = speed
+    def advance(self):
+        """
+        Move on to the next frame, moving the stars on the frames they animate.
+        """
+        self.frame += 1
+        if self.frame % self.animation_step == 0:
+            self.update_positions(self.animation_step)
 
-    def draw(self, renderer):
+    def update_positions(self, steps=1):
         for star in self.stars:
             # Move the star closer to the screen.
-            star.z -= self.z_speed
+            star.z -= self.z_speed * steps
             star.radius = (1 - float(star.z) / self.max_depth) * 1.2
             star.fill = int((1 - float(star.z) / self.max_depth) * 255)
 
             # If the star has moved out of the screen, we reposition it far away.
             if star.z <= 0:
-                star.x = randrange(-self.width, self.width)
-                star.y = randrange(-self.height, self.height)
+                star.x = self.random.randrange(-self.width, self.width)
+                star.y = self.random.randrange(-self.height, self.height)
                 star.z = self.max_depth
                 star.radius = 0
                 star.fill = 0
 
             # Transforms this 3D point to 2D using a perspective projection.
             factor = self.fov / (self.view_distance + star.z)
-            x = int(star.x * factor + self.width / 2)
-            y = int(-star.y * factor + self.height / 2)
-            sdlgfx.pixelRGBA(
-                renderer.sdlrenderer, x, y, star.fill, star.fill, star.fill, 255
+            star.screen_x = int(star.x * factor + self.width / 2)
+            star.screen_y = int(-star.y * factor + self.height / 2)
+
+    def sprite_copies(self):
+        """
+        Copy of a sprite for each star, sized by its depth, as the position of the
+        sprite in the atlas, the position of its copy and its color.
+        """
+        offset = SPRITE_SIZE // 2
+        last = len(SPRITE_RADII) - 1
+        copies = []
+        for star in self.stars:
+            size = round((star.radius - SPRITE_RADII[0]) / RADIUS_STEP)
+            size = min(max(size, 0), last)
+            fill = star.fill
+            copies.append(
+                (
+                    size * SPRITE_SIZE,
+                    0,
+                    star.screen_x - offset,
+                    star.screen_y - offset,
+                    fill,
+                    fill,
+                    fill,
+                    255,
+                )
             )
-            # if star.radius > 1:
-            #     sdlgfx.filledCircleRGBA(
-            #         renderer, x, y, int(star.radius), star.fill, star.fill, star.fill, 255
-            #     )
+        return copies
+
+    def draw(self, commands):
+        self.advance()
+        # All the stars in one batch
+        commands.copy_sprites(self.sprites, SPRITE_SIZE, self.sprite_copies())
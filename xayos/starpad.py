@@ -1,14 +1,12 @@
 import argparse
 import logging
 import time
-from pathlib import Path
 
 import sdl2
 import sdl2.ext
 from sdl2.ext import raise_sdl_err
-from OpenGL import GL as gl
 
-from . import colors
+from . import assets, colors, trace
 from .fonts import FontLoader
 from .gamepad import GamepadHandler, BUTTON_START, BUTTON_LEFTSTICK, BUTTON_RIGHTSTICK
 from .gamepad_viewer import GamepadViewer
@@ -20,8 +18,8 @@ from .text import TextEditor, TextLine
 
 log = logging.getLogger(__name__)
 
-HERE = Path(__file__).parent
-OUTDIR = HERE / "out"
+OUTDIR = assets.output_path()
+AUTOSAVE_PATH = OUTDIR / "starpad-autosave.txt"
 
 
 class StarpadApp:
@@ -41,11 +39,13 @@ class StarpadApp:
         "About": "Show information about this program",
         "Quit": "Exit the program",
     }
+    AUTOSAVE_MS = 10_000
 
-    def __init__(self, font_loader, gamepad, width, height):
+    def __init__(self, font_loader, gamepad, width, height, scheduler):
         self.running = True
         self.font_loader = font_loader
         self.gamepad = gamepad
+        self.scheduler = scheduler
         self.menu = Menu(
             self.font_loader,
             200,
@@ -63,8 +63,14 @@ class StarpadApp:
             y=18,
             fg=colors.LIGHT_GREY_2,
         )
+        # Unsaved changes are saved to the autosave file while in the background
+        self.saved_text = self.text_editor.get_text()
+        self.autosave_ms = 0
         self.open_file()
         self.text_controller = TextController(self.gamepad, self.text_editor)
+        # The predictive dictionary takes a while to parse, multi-tap is used until
+        # it is ready
+        self.scheduler.spawn(self.load_dictionary(), name="starpad-dictionary")
         self.status_line = TextLine(
             self.font_loader,
             x=10,
@@ -73,26 +79,46 @@ class StarpadApp:
             font_name="9x18B",
             fg=colors.GREY,
         )
+        self.status_text = None
 
     def update(self, elapsed_ms):
         self.handle_menu()
         if not self.menu.active:
-            self.status_line.set_text(self.text_controller.get_status_line().encode())
+            status = self.text_controller.get_status_line()
+            if status is not self.status_text:
+                self.status_text = status
+                self.status_line.set_text(status.encode())
         else:
+            self.status_text = None
             help_text = self.MENU_HELP.get(self.menu.selected)
             self.status_line.set_text(help_text.encode() if help_text else b"")
 
         if self.text_controller:
             self.text_controller.update(elapsed_ms)
 
-    def render(self, renderer):
-        self.text_editor.render_cursor(renderer.sdlrenderer)
-        self.text_editor.render(renderer.sdlrenderer)
+    def background_update(self, elapsed_ms):
+        self.autosave_ms += elapsed_ms
+        if self.autosave_ms < self.AUTOSAVE_MS:
+            return
+        self.autosave_ms = 0
+        text = self.text_editor.get_text()
+        if text != self.saved_text:
+            self.saved_text = text
+            self.scheduler.spawn(
+                self.write_file(AUTOSAVE_PATH, text), name="starpad-autosave"
+            )
+
+    def render(self, commands):
+        self.text_editor.render_cursor(commands)
+        self.text_editor.render(commands)
 
         if self.menu.active:
-            self.menu.render(renderer)
+            self.menu.render(commands)
+
+        self.status_line.render(commands)
 
-        self.status_line.render(renderer.sdlrenderer)
+    def destroy(self):
+        self.menu.destroy()
 
     def handle_input(self, button, state):
         if button == BUTTON_START and state:
@@ -123,20 +149,41 @@ class StarpadApp:
         #    self.menu.reset_selection()
 
     def open_file(self):
-        # Get the latest file from the out directory
-        files = sorted(OUTDIR.glob("starpad-*.txt"))
-        if files:
-            filename = files[-1]
-            with open(filename, "rt") as f:
-                text = f.read()
-                self.text_editor.set_text(text)
-                log.info(f"Opened text file: {filename}")
+        self.scheduler.spawn(self.read_latest_file(), name="starpad-open")
 
     def save_file(self):
         template = "starpad-{timestamp}.txt"
-        OUTDIR.mkdir(parents=True, exist_ok=True)
         filename = OUTDIR / template.format(timestamp=time.strftime("%Y%m%d-%H%M%S"))
         text = self.text_editor.get_text()
-        with open(filename, "wt") as f:
-            f.write(text)
+        self.saved_text = text
+        self.scheduler.spawn(self.write_file(filename, text), name="starpad-save")
+
+    async def load_dictionary(self):
+        dictionary = self.text_controller.dictionary
+        root = await self.scheduler.run_in_thread(dictionary.read)
+        dictionary.load(root)
+        self.text_controller.dictionary_loaded()
+
+    async def read_latest_file(self):
+        # Get the latest file from the out directory, saved or autosaved
+        files = await self.scheduler.run_in_thread(files_by_date, OUTDIR, "starpad-*.txt")
+        if files:
+            filename = files[-1]
+            text = await self.scheduler.run_in_thread(filename.read_text)
+            self.text_editor.set_text(text)
+            self.saved_text = text
+            log.info(f"Opened text file: {filename}")
+
+    async def write_file(self, filename, text):
+        await self.scheduler.run_in_thread(write_text, filename, text)
+        trace.instant("starpad.saved", "io", path=str(filename), size=len(text))
         log.info(f"Saved text file: {filename}")
+
+
+def write_text(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def files_by_date(directory, pattern):
+    return sorted(directory.glob(pattern), key=lambda path: path.stat().st_mtime)
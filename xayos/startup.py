@@ -0,0 +1,120 @@
+"""
+Startup profiling.
+
+Times the phases from launch to the first presented frame: imports, SDL and window
+setup, widgets, the first application and the first frame. With --startup-profile,
+the import of each module is timed as well, by a finder that wraps the loaders of
+the modules imported after it. The finder has to be installed before the modules
+it times are imported, so this module checks the command line itself, and main
+imports it first.
+"""
+
+import importlib.abc
+import logging
+import sys
+import time
+
+log = logging.getLogger(__name__)
+
+FLAG = "--startup-profile"
+
+
+class TimedLoader:
+    """
+    Loader proxy, timing the execution of the module it loads.
+    """
+
+    def __init__(self, loader, timer):
+        self.loader = loader
+        self.timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.timer.stack.append(0)
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - start
+            nested = self.timer.stack.pop()
+            if self.timer.stack:
+                self.timer.stack[-1] += total
+            self.timer.modules[module.__name__] = (total - nested, total)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    def __init__(self):
+        # Time spent importing by module: by itself, and with what it imported
+        self.modules = {}
+        # Time spent in the imports nested in the ones running
+        self.stack = []
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, "find_spec", None)
+            if finder is self or find_spec is None:
+                continue
+            spec = find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+class StartupProfile:
+    def __init__(self, import_timer=None):
+        self.origin = time.perf_counter()
+        self.import_timer = import_timer
+        self.phases = []
+        self.last = self.origin
+        self.done = False
+
+    def mark(self, name):
+        """
+        End a phase, which started at the end of the previous one.
+        """
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def finish(self, top=15):
+        """
+        Report the phases and the slowest imports, once.
+        """
+        if self.done:
+            return
+        self.done = True
+        total = (time.perf_counter() - self.origin) * 1000
+        log.info(f"Startup: first frame presented after {total:.0f} ms")
+        for name, seconds in self.phases:
+            log.info(f"  {name:<24} {seconds * 1000:8.1f} ms")
+        if not self.import_timer:
+            return
+        self.import_timer.uninstall()
+        modules = sorted(
+            self.import_timer.modules.items(), key=lambda item: item[1][1], reverse=True
+        )
+        log.info(f"Startup: {len(modules)} modules imported, slowest (self, total):")
+        for name, (own, total) in modules[:top]:
+            log.info(f"  {name:<40} {own * 1000:8.1f} {total * 1000:8.1f} ms")
+
+
+import_timer = None
+if FLAG in sys.argv:
+    import_timer = ImportTimer()
+    import_timer.install()
+
+profile = StartupProfile(import_timer)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+
+from . import trace
+
+log = logging.getLogger(__name__)
+
+
+class TaskScheduler:
+    """
+    Cooperative task scheduler hosted inside the SDL frame loop.
+
+    It owns an asyncio event loop that never runs on its own: the shell calls run()
+    once per frame, after the application update and before rendering, and ready
+    tasks are executed until there is nothing left to do or the frame budget is
+    spent. Blocking work (file or network I/O) should be awaited through
+    run_in_thread(), so that it happens outside of the frame loop.
+    """
+
+    def __init__(self, budget_ms=4):
+        self.budget_ms = budget_ms
+        self.loop = asyncio.new_event_loop()
+        self.tasks = set()
+        self.frame_waiters = []
+
+    def spawn(self, coro, name=None):
+        """
+        Schedule a coroutine to run as a task. Returns the asyncio task.
+        """
+        if trace.tracer.enabled:
+            coro = traced_task(coro, name or coro.__qualname__)
+        task = self.loop.create_task(coro, name=name)
+        self.tasks.add(task)
+        task.add_done_callback(self.task_done)
+        return task
+
+    def task_done(self, task):
+        self.tasks.discard(task)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            log.error("Task %s failed", task.get_name(), exc_info=exc)
+
+    async def run_in_thread(self, func, *args):
+        """
+        Run a blocking function in a worker thread and wait for its result.
+        """
+        if trace.tracer.enabled:
+            func = trace.traced("io")(func)
+        return await self.loop.run_in_executor(None, func, *args)
+
+    async def yield_now(self):
+        """
+        Give control back to the scheduler. The task resumes in the same frame if
+        there is budget left, otherwise in the next one.
+        """
+        await asyncio.sleep(0)
+
+    async def next_frame(self):
+        """
+        Wait until the next frame starts.
+        """
+        future = self.loop.create_future()
+        self.frame_waiters.append(future)
+        await future
+
+    def pending(self):
+        # asyncio has no public API to peek at the ready queue
+        return bool(self.tasks or self.loop._ready)
+
+    def run_once(self):
+        # Run a single iteration of the event loop: poll for I/O without blocking
+        # and run the callbacks that are ready at this point
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+
+    def run(self, budget_ms=None):
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        waiters, self.frame_waiters = self.frame_waiters, []
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+        if not self.pending():
+            return
+        deadline = time.perf_counter() + budget_ms / 1000
+        self.run_once()
+        while self.loop._ready and time.perf_counter() < deadline:
+            self.run_once()
+
+    def close(self):
+        if self.tasks:
+            log.info("Cancelling %d pending tasks", len(self.tasks))
+            for task in self.tasks:
+                task.cancel()
+            self.loop.run_until_complete(
+                asyncio.gather(*self.tasks, return_exceptions=True)
+            )
+        self.loop.run_until_complete(self.loop.shutdown_default_executor())
+        self.loop.close()
+
+
+class BackgroundTicker:
+    """
+    Ticks suspended applications at a reduced rate, within a CPU budget per frame
+    that they share.
+
+    Applications opt in with background_update(elapsed_ms), which is given the time
+    since their last tick and must not draw: they are not rendered while in the
+    background. Those waiting the longest go first. A tick cannot be interrupted,
+    so the time a frame spends over the budget is taken from the next frames, which
+    tick nothing until it is paid back.
+    """
+
+    def __init__(self, rate_hz=4, budget_ms=1):
+        self.interval_ms = 1000 / rate_hz if rate_hz else None
+        self.budget_ms = budget_ms
+        # Budget left, negative after an overrun
+        self.credit_ms = 0
+        # Time of the last tick of each application, by name
+        self.last_ticks = {}
+        self.ticks = 0
+        self.overruns = 0
+
+    def run(self, applications, now_ms, tick):
+        """
+        Call tick(name, application, elapsed_ms) for the applications that are due,
+        while there is budget left.
+        """
+        if self.interval_ms is None:
+            return
+        # Applications are due an interval after they were suspended
+        self.last_ticks = {
+            name: self.last_ticks.get(name, now_ms)
+            for name, application in applications.items()
+            if hasattr(application, "background_update")
+        }
+        self.credit_ms = min(self.credit_ms + self.budget_ms, self.budget_ms)
+        due = [
+            name
+            for name, last in self.last_ticks.items()
+            if now_ms - last >= self.interval_ms
+        ]
+        due.sort(key=self.last_ticks.get)
+        for name in due:
+            if self.credit_ms <= 0:
+                break
+            start = time.perf_counter()
+            tick(name, applications[name], now_ms - self.last_ticks[name])
+            self.credit_ms -= (time.perf_counter() - start) * 1000
+            self.last_ticks[name] = now_ms
+            self.ticks += 1
+            if self.credit_ms < 0:
+                self.overruns += 1
+
+    def summary(self):
+        return f"{self.ticks} background ticks, {self.overruns} over budget"
+
+
+async def traced_task(coro, name):
+    with trace.async_span(name):
+        return await coro
@@ -0,0 +1,162 @@
+import json
+import logging
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+
+class Histogram:
+    """
+    Histogram of millisecond durations, with 1 ms buckets up to max_ms and a last
+    bucket for everything above it.
+    """
+
+    def __init__(self, max_ms=250):
+        self.max_ms = max_ms
+        self.buckets = [0] * (max_ms + 2)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value_ms):
+        value_ms = max(int(value_ms), 0)
+        self.buckets[min(value_ms, self.max_ms + 1)] += 1
+        self.count += 1
+        self.total += value_ms
+        self.min = value_ms if self.min is None else min(self.min, value_ms)
+        self.max = value_ms if self.max is None else max(self.max, value_ms)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0
+        rank = percent / 100 * self.count
+        seen = 0
+        for value_ms, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return value_ms
+        return self.max_ms + 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            # Sparse buckets, the last one holds everything above max_ms
+            "buckets": {
+                str(value_ms): count
+                for value_ms, count in enumerate(self.buckets)
+                if count
+            },
+        }
+
+
+class InputLatencyTracker:
+    """
+    Measures input-to-photon latency: the time between the SDL timestamp of an input
+    event and the presentation of the first frame rendered after the input was
+    dispatched to the application.
+    """
+
+    def __init__(self, max_ms=250):
+        self.histogram = Histogram(max_ms)
+        self.pending = []
+        self.updated = False
+
+    def input_dispatched(self, timestamp):
+        if timestamp:
+            self.pending.append(timestamp)
+
+    def frame_presented(self, ticks):
+        if not self.pending:
+            return
+        for timestamp in self.pending:
+            self.histogram.add(ticks - timestamp)
+        self.pending.clear()
+        self.updated = True
+
+    def summary(self):
+        histogram = self.histogram
+        return (
+            f"lat {histogram.percentile(50)}/{histogram.percentile(95)}"
+            f"/{histogram.max or 0} ms"
+        )
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump({"input_to_photon_ms": self.histogram.to_dict()}, f, indent=2)
+        log.info(f"Input latency histogram written to {path}")
+
+
+class DrawStats:
+    """
+    Draw calls, pixels drawn, bytes uploaded and textures created in each frame, by
+    entry point and by source: the widget or application whose drawing is being
+    executed. Fed by the draw call instrumentation.
+    """
+
+    metrics = ("calls", "pixels", "bytes", "textures")
+
+    def __init__(self):
+        self.source = None
+        self.frame = Counter()
+        self.last_frame = Counter()
+        self.totals = Counter()
+        self.peaks = Counter()
+        self.frames = 0
+        # Over all frames, by entry point and by source
+        self.calls = Counter()
+        self.sources = {}
+
+    def count(self, name, pixels=0, uploaded=0, textures=0):
+        self.calls[name] += 1
+        source = self.sources.get(self.source)
+        if source is None:
+            source = self.sources[self.source] = Counter()
+        for counter in (self.frame, source):
+            counter["calls"] += 1
+            counter["pixels"] += pixels
+            counter["bytes"] += uploaded
+            counter["textures"] += textures
+
+    def end_frame(self):
+        self.frames += 1
+        self.totals.update(self.frame)
+        for metric, value in self.frame.items():
+            self.peaks[metric] = max(self.peaks[metric], value)
+        self.last_frame = self.frame
+        self.frame = Counter()
+
+    def frame_summary(self):
+        frame = self.last_frame
+        return (
+            f"{frame['calls']} calls {frame['pixels'] / 1000:.0f}k px "
+            f"{frame['bytes'] / 1024:.0f} KiB"
+        )
+
+    def summary(self, top=5):
+        frames = self.frames or 1
+        averages = ", ".join(
+            f"{self.totals[metric] / frames:.0f} {metric} (max {self.peaks[metric]})"
+            for metric in self.metrics
+        )
+        sources = sorted(
+            self.sources.items(), key=lambda item: item[1]["pixels"], reverse=True
+        )
+        by_source = ", ".join(
+            f"{source or 'shell'} {counts['calls'] / frames:.0f} calls "
+            f"{counts['pixels'] / frames / 1000:.0f}k px"
+            for source, counts in sources[:top]
+        )
+        calls = ", ".join(
+            f"{name} {count / frames:.0f}" for name, count in self.calls.most_common(top)
+        )
+        return f"per frame {averages}; by source {by_source}; calls {calls}"
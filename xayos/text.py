@@ -1,9 +1,18 @@
+import sdl2
 from sdl2 import sdlgfx
 
 from . import colors
 
 
 class TextLine:
+    """
+    A single line of text that is rendered once into a texture, and then copied to
+    the screen until its font, text or color change. The texture is kept in the
+    texture cache of the command buffer, keyed by its content: the font, text and
+    color it was drawn with, so that changing any of them draws a new one. The
+    texture of the previous text is destroyed the next time the line is drawn.
+    """
+
     def __init__(
         self,
         font_loader,
@@ -20,25 +29,51 @@ class TextLine:
         self.x = x
         self.y = y
         self.fg = fg
+        # Content key of the texture to destroy, that the line no longer draws
+        self.replaced_key = None
         self.font_loader.set_font(self.font)
 
     def set_text(self, text):
         assert isinstance(text, bytes), "Text must be a bytes object"
-        self.text = text
-
-    def render(self, sdlrenderer):
-        self.font_loader.set_font(self.font)
-        # font_size = self.font_loader.get_font_size(self.font)
-        sdlgfx.stringRGBA(
-            sdlrenderer,
-            self.x,
-            self.y,
-            self.text,
-            self.fg[0],
-            self.fg[1],
-            self.fg[2],
-            self.fg[3],
+        if text != self.text:
+            if self.replaced_key is None:
+                self.replaced_key = self.content_key()
+            self.text = text
+
+    def create_texture(self, sdlrenderer):
+        font_width, font_height = self.font_loader.get_font_size(self.font)
+        width = font_width * len(self.text)
+        surface = sdl2.SDL_CreateRGBSurface(
+            0, width, font_height, 32, 0xFF000000, 0x00FF0000, 0x0000FF00, 0x000000FF
         )
+        surface_renderer = sdl2.SDL_CreateSoftwareRenderer(surface)
+        sdl2.SDL_SetRenderDrawColor(surface_renderer, 0, 0, 0, 0)
+        sdl2.SDL_RenderClear(surface_renderer)
+        self.font_loader.set_font(self.font)
+        sdlgfx.stringRGBA(surface_renderer, 0, 0, self.text, *self.fg)
+        sdl2.SDL_RenderPresent(surface_renderer)
+        texture = sdl2.SDL_CreateTextureFromSurface(sdlrenderer, surface)
+        sdl2.SDL_SetTextureBlendMode(texture, sdl2.SDL_BLENDMODE_BLEND)
+        # SDL_gfx keeps the glyph textures it drew with until the font is set again,
+        # and would later destroy them through dangling pointers (by then possibly
+        # textures of the cache): drop them while their renderer is still alive
+        self.font_loader.set_font(None)
+        sdl2.SDL_DestroyRenderer(surface_renderer)
+        sdl2.SDL_FreeSurface(surface)
+        return texture
+
+    def content_key(self):
+        return (self.font, self.text, tuple(self.fg))
+
+    def render(self, commands):
+        if self.replaced_key is not None:
+            if self.replaced_key != self.content_key():
+                commands.discard(self.replaced_key)
+            self.replaced_key = None
+        if self.text:
+            font_width, font_height = self.font_loader.get_font_size(self.font)
+            rect = (self.x, self.y, font_width * len(self.text), font_height)
+            commands.copy(self, rect)
 
 
 class TextEditor:
@@ -106,43 +141,32 @@ class TextEditor:
     def set_cursor_color(self, color):
         self.cursor_color = color
 
-    def render_cursor(self, sdlrenderer):
+    def render_cursor(self, commands):
         font_size = self.font_loader.get_font_size(self.font)
         cursor_x = self.x + self.cursor_cx * font_size[0]
         cursor_y = self.y + self.cursor_cy * font_size[1]
-        sdlgfx.boxRGBA(
-            sdlrenderer,
+        commands.box(
             cursor_x,
             cursor_y + font_size[1] - 2,
             cursor_x + font_size[0],
             cursor_y + font_size[1],
-            *self.cursor_color,
+            self.cursor_color,
         )
         if self.cursor_char:
-            self.font_loader.set_font(self.font)
-            sdlgfx.stringRGBA(
-                sdlrenderer, cursor_x, cursor_y, self.cursor_char, *self.cursor_char_color
+            commands.text(
+                self.font, cursor_x, cursor_y, self.cursor_char, self.cursor_char_color
             )
 
-    def render(self, sdlrenderer):
+    def render(self, commands):
         text = self.text
-        if isinstance(text, str):
-            text = text.encode("utf-8")
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", "replace")
 
-        self.font_loader.set_font(self.font)
         font_size = self.font_loader.get_font_size(self.font)
 
         # Split text into lines
-        lines = text.split(b"\n")
+        lines = text.split("\n")
         for i, line in enumerate(lines):
             y = self.y + i * font_size[1] + i * self.line_spacing
-            sdlgfx.stringRGBA(
-                sdlrenderer,
-                self.x,
-                y,
-                line,
-                self.fg[0],
-                self.fg[1],
-                self.fg[2],
-                self.fg[3],
-            )
+            if line:
+                commands.text(self.font, self.x, y, line, self.fg)
@@ -0,0 +1,136 @@
+import ctypes
+import logging
+from collections import OrderedDict
+
+import sdl2
+
+from .tracking import tracker
+
+log = logging.getLogger(__name__)
+
+
+class CachedTexture:
+    __slots__ = ["texture", "size", "owner", "refcount"]
+
+    def __init__(self, texture, size, owner):
+        self.texture = texture
+        self.size = size
+        self.owner = owner
+        self.refcount = 0
+
+
+def texture_size(texture):
+    pixel_format = ctypes.c_uint32()
+    width, height = ctypes.c_int(), ctypes.c_int()
+    sdl2.SDL_QueryTexture(texture, pixel_format, None, width, height)
+    return width.value * height.value * sdl2.SDL_BYTESPERPIXEL(pixel_format.value)
+
+
+class TextureCache:
+    """
+    SDL textures by key, in LRU order, within a memory budget.
+
+    Entries with references are pinned, the other ones are evicted least recently
+    used first when the cache goes over its budget. With a hard cap, pinned entries
+    are evicted too when the cache would still be over it; users look textures up
+    every time they draw, so those are simply created again when needed. Each entry
+    remembers its owner (e.g. an application), whose entries are all released at
+    once when it goes away.
+    """
+
+    def __init__(self, budget_bytes=32 << 20, hard_cap_bytes=None):
+        self.budget_bytes = budget_bytes
+        self.hard_cap_bytes = hard_cap_bytes
+        self.entries = OrderedDict()
+        self.bytes_resident = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry.texture
+
+    def add(self, key, texture, owner=None, pinned=False):
+        """
+        Add a texture, which now belongs to the cache, and return it. A pinned
+        texture starts with a reference.
+        """
+        if key in self.entries:
+            self.remove(key)
+        entry = CachedTexture(texture, texture_size(texture), owner)
+        entry.refcount = int(pinned)
+        self.entries[key] = entry
+        tracker.add("texture", texture, lambda: self.remove(key), owner, entry.size)
+        self.bytes_resident += entry.size
+        self.evict()
+        return texture
+
+    def acquire(self, key):
+        self.entries[key].refcount += 1
+
+    def release(self, key):
+        entry = self.entries.get(key)
+        if entry and entry.refcount > 0:
+            entry.refcount -= 1
+
+    def release_owner(self, owner):
+        """
+        Destroy every texture added by an owner, referenced or not.
+        """
+        keys = [key for key, entry in self.entries.items() if entry.owner is owner]
+        for key in keys:
+            self.remove(key)
+        if keys:
+            log.debug(f"Released {len(keys)} textures of {type(owner).__name__}")
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        self.bytes_resident -= entry.size
+        tracker.remove(entry.texture)
+        sdl2.SDL_DestroyTexture(entry.texture)
+
+    def evict(self):
+        # The newest entry, still to be drawn, is kept in any case
+        keys = list(self.entries)[:-1]
+        if self.bytes_resident > self.budget_bytes:
+            for key in [key for key in keys if not self.entries[key].refcount]:
+                self.remove(key)
+                self.evictions += 1
+                if self.bytes_resident <= self.budget_bytes:
+                    break
+        if self.hard_cap_bytes is not None:
+            for key in keys:
+                if self.bytes_resident <= self.hard_cap_bytes:
+                    break
+                if key in self.entries:
+                    self.remove(key)
+                    self.evictions += 1
+
+    def clear(self):
+        for key in list(self.entries):
+            self.remove(key)
+
+    def stats(self):
+        return {
+            "textures": len(self.entries),
+            "bytes_resident": self.bytes_resident,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def summary(self):
+        return (
+            f"{len(self.entries)} textures, {self.bytes_resident / 1024:.0f} KiB "
+            f"resident, {self.hits} hits, {self.misses} misses, "
+            f"{self.evictions} evictions"
+        )
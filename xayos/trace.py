@@ -0,0 +1,194 @@
+"""
+Trace events.
+
+Spans (durations) and instant events on a single timeline, buffered in memory and
+written on demand as Chrome trace-event JSON, which chrome://tracing and Perfetto
+open. Events are recorded by thread, so frame phases, background tasks and the I/O
+of worker threads show up side by side. Tasks, which are suspended across frames,
+are recorded as async spans on tracks of their own.
+
+When tracing is disabled, span() returns a shared no-op context manager and the
+other functions return right away.
+"""
+
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ["tracer", "name", "category", "args", "start"]
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.complete(
+            self.name, self.category, self.start, time.perf_counter_ns(), self.args
+        )
+
+
+class AsyncSpan(Span):
+    __slots__ = ["id"]
+
+    def __enter__(self):
+        self.id = next(self.tracer.async_ids)
+        self.tracer.record("b", self.name, self.category, args=self.args, id=self.id)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record("e", self.name, self.category, id=self.id)
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    def __init__(self, capacity=500_000):
+        self.enabled = False
+        # The oldest events are dropped once the buffer is full
+        self.events = deque(maxlen=capacity)
+        self.thread_names = {}
+        self.async_ids = itertools.count(1)
+        self.pid = os.getpid()
+        self.origin = time.perf_counter_ns()
+
+    def enable(self):
+        self.enabled = True
+        log.info(f"Tracing enabled, keeping the last {self.events.maxlen} events")
+
+    def timestamp(self, ns=None):
+        # Trace event timestamps are in microseconds
+        return ((ns or time.perf_counter_ns()) - self.origin) / 1000
+
+    def record(self, phase, name, category, ts=None, args=None, **fields):
+        tid = threading.get_ident()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        event = {
+            "ph": phase,
+            "name": name,
+            "cat": category,
+            "ts": self.timestamp() if ts is None else ts,
+            "pid": self.pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        event.update(fields)
+        self.events.append(event)
+
+    def complete(self, name, category, start_ns, end_ns, args=None):
+        """
+        Record a span that started and ended at the given perf_counter_ns() times.
+        """
+        self.record(
+            "X",
+            name,
+            category,
+            ts=self.timestamp(start_ns),
+            args=args,
+            dur=(end_ns - start_ns) / 1000,
+        )
+
+    def to_dict(self):
+        metadata = [
+            {
+                "ph": "M",
+                "name": "thread_name",
+                "pid": self.pid,
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in list(self.thread_names.items())
+        ]
+        return {"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}
+
+    def write(self, path, background=True):
+        """
+        Write the buffered events to a JSON file, by default from another thread so
+        that the frame loop goes on.
+        """
+        # The events are copied now, other threads keep adding more
+        trace = self.to_dict()
+
+        def write():
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(trace, f)
+            log.info(f"Trace of {len(trace['traceEvents'])} events written to {path}")
+
+        if not background:
+            write()
+            return None
+        writer = threading.Thread(target=write, name="trace-writer")
+        writer.start()
+        return writer
+
+
+tracer = Tracer()
+
+
+def span(name, category="shell", **args):
+    """
+    Context manager recording the duration of its block.
+    """
+    if not tracer.enabled:
+        return NULL_SPAN
+    return Span(tracer, name, category, args)
+
+
+def async_span(name, category="task", **args):
+    """
+    Context manager recording a span that may be suspended, e.g. in a task.
+    """
+    if not tracer.enabled:
+        return NULL_SPAN
+    return AsyncSpan(tracer, name, category, args)
+
+
+def instant(name, category="shell", **args):
+    if tracer.enabled:
+        tracer.record("i", name, category, args=args, s="t")
+
+
+def traced(category):
+    """
+    Decorator recording each call of a function as a span.
+    """
+
+    def decorator(function):
+        name = function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with Span(tracer, name, category, None):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
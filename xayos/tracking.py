@@ -0,0 +1,193 @@
+"""
+SDL resource accounting.
+
+Surfaces, renderers and textures are registered with the resource tracker when they
+are created, together with their owner: the application they were created for, or
+None for the shell. Widgets free their resources in destroy(), which applications
+call when they are unloaded. Whatever an application still owns after that is a
+leak: it is reported and freed, or raises ResourceLeakError in strict mode, so that
+entering and leaving applications never grows memory.
+"""
+
+import ctypes
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+import sdl2
+import sdl2.ext
+from sdl2 import sdlgfx, sdlimage
+from sdl2.ext import raise_sdl_err
+
+log = logging.getLogger(__name__)
+
+
+class ResourceLeakError(RuntimeError):
+    pass
+
+
+def owner_name(owner):
+    if owner is None:
+        return "shell"
+    if isinstance(owner, str):
+        return owner
+    return type(owner).__name__
+
+
+def handle_address(handle):
+    if isinstance(handle, ctypes.Structure):
+        return ctypes.addressof(handle)
+    return ctypes.addressof(handle.contents)
+
+
+class ResourceTracker:
+    def __init__(self, strict=False):
+        self.strict = strict
+        # Owner of the resources created now
+        self.owner = None
+        # Live resources by address: kind, owner, the function that frees them and
+        # their size in bytes, when known
+        self.live = {}
+        self.created = Counter()
+        self.freed = Counter()
+        self.leaked = Counter()
+
+    @contextmanager
+    def owning(self, owner):
+        """
+        Give the resources created in the block to owner.
+        """
+        previous, self.owner = self.owner, owner
+        try:
+            yield self
+        finally:
+            self.owner = previous
+
+    def transfer(self, owner, new_owner):
+        """
+        Give the resources of an owner to another one, e.g. from the name of an
+        application being created to the application itself.
+        """
+        for address, (kind, resource_owner, free, size) in self.live.items():
+            if resource_owner is owner:
+                self.live[address] = (kind, new_owner, free, size)
+
+    def add(self, kind, handle, free, owner=None, size=0):
+        owner = owner if owner is not None else self.owner
+        self.live[handle_address(handle)] = (kind, owner, free, size)
+        self.created[kind] += 1
+
+    def remove(self, handle):
+        """
+        Forget a resource that its user is about to free.
+        """
+        entry = self.live.pop(handle_address(handle), None)
+        if entry is None:
+            log.warning(f"Freeing an untracked resource at {handle_address(handle):#x}")
+            return
+        self.freed[entry[0]] += 1
+
+    def release(self, owner):
+        """
+        Free whatever an owner still has, which should be nothing after it was
+        destroyed. Returns the number of leaked resources.
+        """
+        leaks = [
+            (address, kind, free)
+            for address, (kind, resource_owner, free, _) in self.live.items()
+            if resource_owner is owner
+        ]
+        if not leaks:
+            return 0
+        # Renderers first, then the surfaces they drew on
+        for address, kind, free in sorted(leaks, key=lambda leak: leak[1] != "renderer"):
+            # Freeing may go through the user of the resource, which removes it
+            free()
+            self.live.pop(address, None)
+            self.leaked[kind] += 1
+        kinds = Counter(kind for _, kind, _ in leaks)
+        message = f"{owner_name(owner)} leaked " + ", ".join(
+            f"{count} {kind}s" for kind, count in sorted(kinds.items())
+        )
+        if self.strict:
+            raise ResourceLeakError(message)
+        log.warning(f"{message}, now freed")
+        return len(leaks)
+
+    def owned_bytes(self, owner):
+        return sum(
+            size
+            for _, resource_owner, _, size in self.live.values()
+            if resource_owner is owner
+        )
+
+    def summary(self):
+        created = sum(self.created.values())
+        freed = sum(self.freed.values())
+        leaked = sum(self.leaked.values())
+        return (
+            f"{created} created, {freed} freed, {leaked} leaked, "
+            f"{len(self.live)} still alive"
+        )
+
+
+tracker = ResourceTracker()
+
+
+def create_surface(width, height):
+    """
+    RGBA surface, owned by the current owner of the tracker.
+    """
+    surface = sdl2.SDL_CreateRGBSurface(
+        0, width, height, 32, 0xFF000000, 0x00FF0000, 0x0000FF00, 0x000000FF
+    )
+    if not surface:
+        raise_sdl_err("creating a surface")
+    size = surface.contents.h * surface.contents.pitch
+    tracker.add("surface", surface, lambda: sdl2.SDL_FreeSurface(surface), size=size)
+    return surface
+
+
+def load_image(data):
+    """
+    ARGB surface of an image, given the contents of its file.
+    """
+    image = sdlimage.IMG_Load_RW(sdl2.SDL_RWFromConstMem(data, len(data)), 1)
+    if not image:
+        raise_sdl_err("loading an image")
+    if image.contents.format.contents.format != sdl2.SDL_PIXELFORMAT_ARGB8888:
+        argb = sdl2.SDL_ConvertSurfaceFormat(image, sdl2.SDL_PIXELFORMAT_ARGB8888, 0)
+        sdl2.SDL_FreeSurface(image)
+        if not argb:
+            raise_sdl_err("converting an image")
+        image = argb
+    surface = image.contents
+    size = surface.h * surface.pitch
+    tracker.add("surface", surface, lambda: sdl2.SDL_FreeSurface(surface), size=size)
+    return surface
+
+
+def free_surface(surface):
+    tracker.remove(surface)
+    sdl2.SDL_FreeSurface(surface)
+
+
+def create_renderer(surface):
+    """
+    Software renderer drawing on a surface, to be destroyed before it.
+    """
+    renderer = sdl2.ext.Renderer(surface)
+    tracker.add("renderer", renderer.sdlrenderer, lambda: release_renderer(renderer))
+    return renderer
+
+
+def release_renderer(renderer):
+    # SDL_gfx keeps the glyph textures it last drew with, possibly on this renderer,
+    # and destroys them when the font is set again: drop them while it is alive
+    sdlgfx.gfxPrimitivesSetFont(None, 0, 0)
+    renderer.destroy()
+
+
+def destroy_renderer(renderer):
+    tracker.remove(renderer.sdlrenderer)
+    release_renderer(renderer)
@@ -1,14 +1,11 @@
 import logging
 
-import ignition
-import sdl2.ext
-from sdl2 import sdlgfx
-
-from . import colors
+from . import colors, trace
 from .gamepad import BUTTON_START, BUTTON_DPAD_DOWN, BUTTON_DPAD_UP
 from .gemtext import GemtextParser
 from .input import MenuController
 from .menu import Menu
+from .tracking import create_renderer, create_surface, destroy_renderer, free_surface
 from .utils import wrap_text
 
 log = logging.getLogger(__name__)
@@ -24,10 +21,11 @@ class Voyager:
         "Quit": "Exit the program",
     }
 
-    def __init__(self, font_loader, gamepad, width, height):
+    def __init__(self, font_loader, gamepad, width, height, scheduler):
         self.running = True
         self.font_loader = font_loader
         self.gamepad = gamepad
+        self.scheduler = scheduler
         self.menu = Menu(
             self.font_loader,
             200,
@@ -45,10 +43,14 @@ class Voyager:
     def update(self, elapsed_ms):
         self.handle_menu()
 
-    def render(self, renderer):
-        self.text_viewer.render(renderer, 10, 10)
+    def render(self, commands):
+        self.text_viewer.render(commands, 10, 10)
         if self.menu.active:
-            self.menu.render(renderer)
+            self.menu.render(commands)
+
+    def destroy(self):
+        self.menu.destroy()
+        self.text_viewer.destroy()
 
     def handle_menu(self):
         if self.menu.chosen:
@@ -77,8 +79,11 @@ class Voyager:
 
     def open_location(self):
         log.info("Open Location...")
-        with open("faq.gmi") as f:
-            data = f.read()
+        self.scheduler.spawn(self.fetch_location("faq.gmi"), name="voyager-fetch")
+
+    async def fetch_location(self, location):
+        data = await self.scheduler.run_in_thread(read_file, location)
+        trace.instant("voyager.fetched", "io", location=location, size=len(data))
         # Fetch capsule content
         # response = ignition.request("//geminiprotocol.net/docs/faq.gmi")
         # Get status from remote capsule
@@ -110,6 +115,11 @@ class Voyager:
         self.text_viewer.set_text(text)
 
 
+def read_file(path):
+    with open(path) as f:
+        return f.read()
+
+
 class TextViewer:
     def __init__(
         self,
@@ -121,10 +131,8 @@ class TextViewer:
         fg=colors.LIGHT_GREY_2,
         line_spacing=0,
     ):
-        self.surface = sdl2.SDL_CreateRGBSurface(
-            0, width, height, 32, 0xFF000000, 0x00FF0000, 0x0000FF00, 0x000000FF
-        )
-        self.renderer = sdl2.ext.Renderer(self.surface)
+        self.surface = create_surface(width, height)
+        self.renderer = create_renderer(self.surface)
         self.font_loader = font_loader
         self.font = font_name
         self.text = text
@@ -139,6 +147,10 @@ class TextViewer:
         self.height_chars = 0
         self.update_lines()
 
+    def destroy(self):
+        destroy_renderer(self.renderer)
+        free_surface(self.surface)
+
     def get_text(self):
         return self.text
 
@@ -151,14 +163,14 @@ class TextViewer:
         self.line_offset -= 1
         if self.line_offset < 0:
             self.line_offset = 0
-        log.debug(f"Scrolling up to {self.line_offset}")
+        log.debug("Scrolling up to %s", self.line_offset)
 
     def scroll_down(self):
         self.line_offset += 1
         max_offset = max(len(self.lines) - self.height_chars, 0)
         if self.line_offset > max_offset:
             self.line_offset = max_offset
-        log.debug(f"Scrolling down to {self.line_offset}")
+        log.debug("Scrolling down to %s", self.line_offset)
 
     def update_lines(self):
         # Calculate width and height in characters
@@ -167,25 +179,17 @@ class TextViewer:
         self.height_chars = self.height // font_size[1]
         self.lines = self.split_text_into_lines(self.text, self.width_chars)
 
-    def draw_to_surface(self):
-        self.renderer.clear(colors.TRANSPARENT)
+    def draw_to_surface(self, commands):
+        with commands.offscreen(self.renderer):
+            commands.clear(colors.TRANSPARENT)
 
-        self.font_loader.set_font(self.font)
-        font_size = self.font_loader.get_font_size(self.font)
+            font_size = self.font_loader.get_font_size(self.font)
 
-        lines = self.get_screen_lines()
-        for i, line in enumerate(lines):
-            y = i * font_size[1] + i * self.line_spacing
-            sdlgfx.stringRGBA(
-                self.renderer.sdlrenderer,
-                0,
-                y,
-                line,
-                self.fg[0],
-                self.fg[1],
-                self.fg[2],
-                self.fg[3],
-            )
+            lines = self.get_screen_lines()
+            for i, line in enumerate(lines):
+                y = i * font_size[1] + i * self.line_spacing
+                if line:
+                    commands.text(self.font, 0, y, line, self.fg)
 
     def get_screen_lines(self):
         return self.lines[self.line_offset : self.line_offset + self.height_chars]
@@ -193,10 +197,9 @@ class TextViewer:
     def split_text_into_lines(self, text, width_chars):
         lines = []
         for line in wrap_text(text, width_chars):
-            line = line.encode()
-            line = line.replace(b"\t", b" ")  # Replace tabs with 1 space for now
+            line = line.replace("\t", " ")  # Replace tabs with 1 space for now
             if not line:
-                lines.append(b"")
+                lines.append("")
                 continue
             while line:
                 if len(line) <= width_chars:
@@ -207,8 +210,6 @@ class TextViewer:
                     line = line[width_chars:]
         return lines
 
-    def render(self, renderer, x=0, y=0):
-        self.draw_to_surface()
-        texture = sdl2.ext.Texture(renderer, self.surface)
-        dstrect = sdl2.SDL_Rect(x, y, *texture.size)
-        sdl2.SDL_RenderCopy(renderer.sdlrenderer, texture.tx, None, dstrect)
+    def render(self, commands, x=0, y=0):
+        self.draw_to_surface(commands)
+        commands.copy_surface(self.surface, (x, y, self.width, self.height))